@@ -5,6 +5,21 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Les connexions longues des événements de messagerie (/api/user/events/,
+user.event_views) sont servies par ce point d'entrée (service ``events`` de
+docker-compose.yml), à côté de gunicorn (WSGI) pour le reste de l'API :
+
+    uvicorn EmunieBack.asgi:application --host 0.0.0.0 --port 8001
+
+nginx dirige /api/user/events/ vers ce service (nginx/nginx.conf :
+proxy_buffering off, proxy_read_timeout au-delà de
+MESSAGE_EVENTS_STREAM_SECONDS). Sous WSGI, ces vues répondent 501 plutôt que
+d'immobiliser un thread de worker gunicorn. Les messages
+étant envoyés par les workers gunicorn, REDIS_URL doit être défini pour que
+les événements traversent les processus (user.events.RedisStreamBroker) ;
+le broker en mémoire ne convient qu'à un processus unique servant toute
+l'API (développement).
 """
 
 import os
@@ -0,0 +1,98 @@
+"""
+Mise en cache des réponses des endpoints de référence.
+
+``cache_response(namespace)`` enveloppe une vue (fonction ``@api_view`` ou
+``dispatch`` d'une vue DRF via ``method_decorator``) :
+
+- la réponse rendue est stockée dans le cache Django par URL, hôte et en-tête
+  Accept, pour RESPONSE_CACHE_TIMEOUT secondes ;
+- elle porte un ETag fort (sha256 du contenu) et ``Cache-Control: public,
+  max-age=RESPONSE_CACHE_MAX_AGE`` ;
+- une requête conditionnelle (If-None-Match) dont l'ETag correspond reçoit un
+  304 Not Modified sans corps.
+
+``invalidate_response_cache(namespace)`` incrémente la génération de l'espace
+de noms : toutes ses entrées deviennent inaccessibles d'un coup (appelé par
+les signaux post_save/post_delete des modèles concernés).
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+GENERATION_KEY = 'response-cache:{namespace}:generation'
+
+
+def invalidate_response_cache(namespace):
+    """Périmer toutes les réponses en cache d'un espace de noms"""
+    key = GENERATION_KEY.format(namespace=namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def response_cache_key(namespace, request):
+    generation = cache.get(GENERATION_KEY.format(namespace=namespace), 0)
+    variant = '|'.join((
+        request.get_host(),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    digest = hashlib.sha1(variant.encode()).hexdigest()
+    return f'response-cache:{namespace}:{generation}:{digest}'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    # Comparaison faible (RFC 9110) : W/"x" correspond à "x"
+    candidates = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+    return '*' in candidates or etag in candidates
+
+
+def finalize(response, etag, max_age):
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def cache_response(namespace, timeout=None, max_age=None):
+    """Décorateur de mise en cache (GET/HEAD, réponses 200 uniquement)"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            client_max_age = settings.RESPONSE_CACHE_MAX_AGE if max_age is None else max_age
+            key = response_cache_key(namespace, request)
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response = response.render()
+                if response.status_code != 200:
+                    return response
+                entry = {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'etag': '"%s"' % hashlib.sha256(response.content).hexdigest(),
+                }
+                cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+
+            if etag_matches(request, entry['etag']):
+                return finalize(HttpResponseNotModified(), entry['etag'], client_max_age)
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            return finalize(response, entry['etag'], client_max_age)
+
+        return wrapped
+
+    return decorator
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
     'produit',
     'monetisation',
     'premium',
+    'jobs',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
@@ -87,9 +89,56 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
+        # Connexions persistantes : réutilisées par le thread pendant
+        # DB_CONN_MAX_AGE secondes (0 = une connexion par requête) et
+        # vérifiées en début de requête avant réutilisation.
+        # Dimensionnement de max_connections : voir gunicorn.conf.py
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# DB_ENGINE=sqlite : base locale (développement, jeux de données de charge
+# générés par seed_marketplace) dans SQLITE_PATH
+if config('DB_ENGINE', default='mysql') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+    }
+
+# Cache partagé : Redis si REDIS_URL est défini (ex: redis://redis:6379/1),
+# sinon fichiers (CACHE_FILE_PATH, partagé entre workers d'un même hôte),
+# sinon mémoire locale du processus (tests, développement)
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_FILE_PATH = config('CACHE_FILE_PATH', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'emunie',
+        }
+    }
+elif CACHE_FILE_PATH:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_FILE_PATH,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'emunie',
+        }
+    }
+
+# Réponses des endpoints de référence (EmunieBack.response_cache) : durée en
+# cache serveur (invalidée à chaque modification) et max-age côté client
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=86400, cast=int)
+RESPONSE_CACHE_MAX_AGE = config('RESPONSE_CACHE_MAX_AGE', default=300, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -183,6 +232,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Envoi d'images (produit.uploadhandlers) : durée maximale d'un envoi en
+# secondes et nombre maximal de pixels accepté (contrôlé avant décodage)
+UPLOAD_TIMEOUT = config('UPLOAD_TIMEOUT', default=60, cast=int)
+UPLOAD_MAX_IMAGE_PIXELS = config('UPLOAD_MAX_IMAGE_PIXELS', default=40_000_000, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -198,9 +252,45 @@ DEFAULT_FROM_EMAIL = f'Emunie Market <{config("EMAIL_HOST_USER", default="norepl
 # Frontend URL
 FRONTEND_URL = config('FRONTEND_URL', default='https://www.eburnie-market.com')
 
+# URL publique de l'API (URLs absolues générées hors requête)
+BACKEND_URL = config('BACKEND_URL', default='https://www.eburnie-market.com')
+
+# Instantané de la page d'accueil (produit.home_feed)
+HOME_FEED_FRESH_SECONDS = config('HOME_FEED_FRESH_SECONDS', default=60, cast=int)
+HOME_FEED_MAX_AGE = config('HOME_FEED_MAX_AGE', default=3600, cast=int)
+HOME_FEED_ASYNC_REFRESH = config('HOME_FEED_ASYNC_REFRESH', default=True, cast=bool)
+
+# Pools de tirage aléatoire (produit.sampling) : reconstruits en arrière-plan
+SAMPLING_ASYNC_REFRESH = config('SAMPLING_ASYNC_REFRESH', default=True, cast=bool)
+
+# Écritures différées (produit.buffering) : actives avec Redis seulement (add/incr
+# atomiques et partagés entre processus), sinon écriture directe en base ;
+# intervalle de vidage en secondes par worker gunicorn, 0 pour ne vider que
+# via la commande flush_buffers
+EVENT_BUFFERING = config('EVENT_BUFFERING', default=bool(REDIS_URL), cast=bool)
+EVENT_BUFFER_FLUSH_INTERVAL = config('EVENT_BUFFER_FLUSH_INTERVAL', default=5, cast=int)
+# Une même vue (annonce, IP, utilisateur) n'est comptée qu'une fois par période
+AD_VIEW_DEDUPE_TTL = config('AD_VIEW_DEDUPE_TTL', default=86400, cast=int)
+
+# File de tâches de fond (app jobs, worker : python manage.py run_jobs).
+# JOBS_EAGER exécute les tâches immédiatement, sans worker (tests, développement)
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+JOBS_RETRY_BASE_DELAY = config('JOBS_RETRY_BASE_DELAY', default=30, cast=int)
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=600, cast=int)
+
+# Événements de messagerie (user.events) : broker forcé (chemin pointé, vide =
+# Redis si REDIS_URL est défini, sinon en mémoire) et durée d'un flux SSE
+# avant reconnexion du client
+MESSAGE_EVENTS_BROKER = config('MESSAGE_EVENTS_BROKER', default='')
+MESSAGE_EVENTS_STREAM_SECONDS = config('MESSAGE_EVENTS_STREAM_SECONDS', default=300, cast=int)
+
 # Custom user model
 AUTH_USER_MODEL = 'user.CustomUser'
 
+# Recherche plein texte des annonces (vide = choix selon le moteur de BDD)
+# Ex: 'produit.search.MySQLFullTextBackend', 'produit.search.SimpleSearchBackend'
+AD_SEARCH_BACKEND = config('AD_SEARCH_BACKEND', default='')
+
 # Phone number configuration
 PHONENUMBER_DEFAULT_REGION = 'CI'
 
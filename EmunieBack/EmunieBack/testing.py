@@ -0,0 +1,21 @@
+"""Outils communs aux tests des applications."""
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+
+class TempMediaRootMixin:
+    """
+    MEDIA_ROOT temporaire pour toute la classe de tests : les fichiers écrits
+    (images, dérivés) sont supprimés à la fin de la classe.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        media_override.enable()
+        cls.addClassCleanup(media_override.disable)
@@ -0,0 +1,130 @@
+"""
+Mesure des endpoints critiques : nombre de requêtes SQL, temps passé en base
+et latence (p50/p95) par scénario, comparés à un budget versionné
+(benchmarks/budgets.json).
+
+Le nombre de requêtes est déterministe et vérifié strictement ; les temps
+dépendent de la machine et ne sont comparés que sur demande, avec une marge
+de tolérance.
+"""
+import json
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: object  # chaîne ou fonction(SeedResult) -> chaîne
+    authenticated: bool = False
+
+    def url(self, dataset):
+        return self.path(dataset) if callable(self.path) else self.path
+
+
+SCENARIOS = [
+    Scenario('ad_list', '/api/produit/ads/'),
+    Scenario('ad_list_filtered', '/api/produit/ads/?category=vehicules&city=abidjan&ordering=-price'),
+    Scenario('ad_list_cursor', '/api/produit/ads/?pagination=cursor'),
+    Scenario('ad_detail', lambda dataset: f'/api/produit/ads/{dataset.ad_ids[0]}/'),
+    Scenario('home_data', '/api/produit/home-data/'),
+    Scenario('favorites', '/api/produit/favorites/', authenticated=True),
+    Scenario('conversations', '/api/user/conversations/', authenticated=True),
+    Scenario('dashboard', '/api/monetisation/dashboard/', authenticated=True),
+]
+
+
+@dataclass
+class Measurement:
+    name: str
+    status: int
+    queries: int
+    db_ms: float
+    p50_ms: float
+    p95_ms: float
+
+    def as_budget(self):
+        return {'queries': self.queries, 'db_ms': round(self.db_ms, 1), 'p95_ms': round(self.p95_ms, 1)}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(int(round(fraction * len(ordered))) - 1, 0)]
+
+
+def measure(scenario, dataset, user=None, iterations=20, warmup=2):
+    """Exécuter un scénario ; requêtes et temps SQL relevés sur la dernière itération"""
+    client = APIClient()
+    if scenario.authenticated:
+        client.force_authenticate(user)
+    url = scenario.url(dataset)
+
+    for _ in range(warmup):  # caches (instantané d'accueil, pools de tirage) remplis
+        client.get(url)
+
+    durations = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            durations.append((time.perf_counter() - started) * 1000)
+
+    return Measurement(
+        name=scenario.name,
+        status=response.status_code,
+        queries=len(queries),
+        db_ms=sum(float(query['time']) for query in queries.captured_queries) * 1000,
+        p50_ms=statistics.median(durations),
+        p95_ms=percentile(durations, 0.95),
+    )
+
+
+def run_scenarios(dataset, user, iterations=20, names=None):
+    cache.clear()
+    return [
+        measure(scenario, dataset, user=user, iterations=iterations)
+        for scenario in SCENARIOS
+        if not names or scenario.name in names
+    ]
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_budgets(measurements, path=BUDGETS_PATH):
+    budgets = load_budgets(path) if Path(path).exists() else {}
+    budgets.update({m.name: m.as_budget() for m in measurements})
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(budgets, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def compare(measurements, budgets, check_timings=False, tolerance=0.25):
+    """Liste des dépassements (messages) ; vide si tout est dans le budget"""
+    failures = []
+    for m in measurements:
+        budget = budgets.get(m.name)
+        if m.status != 200:
+            failures.append(f'{m.name} : statut HTTP {m.status}')
+        if budget is None:
+            failures.append(f'{m.name} : aucun budget enregistré')
+            continue
+        if m.queries > budget['queries']:
+            failures.append(f"{m.name} : {m.queries} requêtes SQL (budget {budget['queries']})")
+        if check_timings:
+            for key, value in (('db_ms', m.db_ms), ('p95_ms', m.p95_ms)):
+                limit = budget[key] * (1 + tolerance)
+                if value > limit:
+                    failures.append(f'{m.name} : {key} {value:.1f} ms (budget {budget[key]} ms +{tolerance:.0%})')
+    return failures
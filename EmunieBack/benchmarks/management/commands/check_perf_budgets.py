@@ -0,0 +1,75 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.harness import SCENARIOS, compare, load_budgets, run_scenarios, save_budgets
+from benchmarks.seeding import SeedScale, load_dataset, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Générer un jeu de données dans une base de test, mesurer les endpoints "
+        "critiques (requêtes SQL, temps base, latence p50/p95) et les comparer au budget"
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedScale()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--ads', type=int, default=defaults.ads)
+        parser.add_argument('--views', type=int, default=defaults.views)
+        parser.add_argument('--favorites', type=int, default=defaults.favorites)
+        parser.add_argument('--conversations', type=int, default=defaults.conversations)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--iterations', type=int, default=20, help='Requêtes mesurées par scénario')
+        parser.add_argument(
+            '--scenario', action='append', choices=[s.name for s in SCENARIOS],
+            help='Limiter à un scénario (option répétable)'
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Conserver la base de test (et ses données)')
+        parser.add_argument('--update-budgets', action='store_true', help='Enregistrer les mesures comme budget')
+        parser.add_argument('--check-timings', action='store_true', help='Comparer aussi les temps au budget')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Marge sur les temps (0.25 = +25 %%)')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            failures = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError('Budget dépassé :\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Tous les scénarios respectent le budget.'))
+
+    def run(self, options):
+        dataset = load_dataset() if options['keepdb'] else None
+        if dataset is None:
+            started = time.monotonic()
+            dataset = seed_dataset(SeedScale(
+                users=options['users'], ads=options['ads'], views=options['views'],
+                favorites=options['favorites'], conversations=options['conversations'],
+                seed=options['seed'],
+            ))
+            self.stdout.write(f'Jeu de données {dataset.counts} généré en {time.monotonic() - started:.1f}s')
+        user = get_user_model().objects.get(pk=dataset.demo_user_id)
+
+        measurements = run_scenarios(dataset, user, iterations=options['iterations'], names=options['scenario'])
+        self.stdout.write(f"{'scénario':<20}{'statut':>7}{'requêtes':>10}{'base ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for m in measurements:
+            self.stdout.write(
+                f'{m.name:<20}{m.status:>7}{m.queries:>10}{m.db_ms:>10.1f}{m.p50_ms:>10.1f}{m.p95_ms:>10.1f}'
+            )
+
+        if options['update_budgets']:
+            save_budgets(measurements)
+            self.stdout.write('Budget mis à jour (benchmarks/budgets.json)')
+            return []
+        return compare(
+            measurements, load_budgets(),
+            check_timings=options['check_timings'], tolerance=options['tolerance'],
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmarks.seeding import SeedScale, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Remplir la base configurée d'un jeu de données synthétique (utilisateurs, annonces, "
+        "images, vues, favoris, conversations, transactions, coupons) pour les tests de charge"
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedScale()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--ads', type=int, default=defaults.ads)
+        parser.add_argument('--views', type=int, default=defaults.views)
+        parser.add_argument('--favorites', type=int, default=defaults.favorites)
+        parser.add_argument('--conversations', type=int, default=defaults.conversations)
+        parser.add_argument('--messages-per-conversation', type=int, default=defaults.messages_per_conversation)
+        parser.add_argument('--transactions', type=int, default=1000)
+        parser.add_argument('--coupons', type=int, default=20)
+        parser.add_argument('--no-images', action='store_true', help='Annonces sans images de remplacement')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--chunk-size', type=int, default=defaults.chunk_size, help='Lignes par INSERT')
+        parser.add_argument('--force', action='store_true', help='Autoriser l\'exécution avec DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'DEBUG=False : base de production ? Relancer avec --force pour générer les données quand même.'
+            )
+
+        scale = SeedScale(
+            users=options['users'], ads=options['ads'], views=options['views'],
+            favorites=options['favorites'], conversations=options['conversations'],
+            messages_per_conversation=options['messages_per_conversation'],
+            transactions=options['transactions'], coupons=options['coupons'],
+            images=not options['no_images'], seed=options['seed'], chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(f"Génération sur {connection.vendor} ({connection.settings_dict['NAME']}), graine {scale.seed}")
+
+        started = last = time.monotonic()
+
+        def progress(step, count):
+            nonlocal last
+            now = time.monotonic()
+            rate = count / (now - last) if now > last else 0
+            self.stdout.write(f'  {step:<13}{count:>10} ligne(s) en {now - last:6.1f}s ({rate:,.0f}/s)')
+            last = now
+
+        dataset = seed_dataset(scale, progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Jeu de données généré en {time.monotonic() - started:.1f}s ; '
+            f'utilisateur de démonstration : #{dataset.demo_user_id} (mot de passe « benchmark »)'
+        ))
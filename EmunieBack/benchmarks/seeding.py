@@ -0,0 +1,556 @@
+"""
+Jeu de données réaliste pour les mesures de performance et les tests de charge.
+
+Tout passe par des insertions par paquets de ``chunk_size`` lignes (ni save(),
+ni signaux ; executemany direct pour les tables volumineuses) et dépend
+uniquement de ``seed`` : deux exécutions avec les mêmes paramètres produisent
+les mêmes données (identifiants compris pour les annonces). La répartition
+suit ce qu'on observe en production : quelques catégories et villes
+concentrent l'essentiel des annonces, une minorité de vendeurs publie
+beaucoup et une minorité d'annonces concentre les vues.
+
+Les images sont des images de remplacement générées une fois par catégorie
+(avec leurs déclinaisons) et partagées par toutes les annonces : aucun
+fichier n'est écrit par annonce.
+"""
+import random
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from ipaddress import IPv4Address
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from PIL import Image
+
+from monetisation.models import Coupon, CouponUsage, Package, PaymentMethod, Transaction
+from produit.images import derivative_name, render_derivatives
+from produit.models import (
+    CATEGORY_CHOICES, CITY_CHOICES, Ad, AdImage, AdStatus, AdView, AdViewDailyStat, Favorite
+)
+from produit.search import build_search_document
+from produit.tracking import refresh_ad_view_totals
+from user.models import Conversation, ConversationParticipant, Message
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+USERNAME_PREFIX = 'bench'
+SLUG_PREFIX = 'bench-'
+ID_NAMESPACE = uuid.UUID('6f1c7c2e-4b0a-4d7e-9a51-2f0d3e8b9c10')
+PLACEHOLDER_DIR = 'ads/images/seed'
+TITLE_WORDS = [
+    'iPhone', 'Samsung', 'Toyota', 'Corolla', 'Yamaha', 'Appartement', 'Villa', 'Studio',
+    'Terrain', 'Canapé', 'Frigo', 'Télévision', 'Ordinateur', 'HP', 'Chaussures', 'Robe',
+    'Vélo', 'Moto', 'Climatiseur', 'Congélateur', 'Stage', 'Chauffeur', 'Cuisinier',
+]
+FIRST_NAMES = ['Awa', 'Koffi', 'Mariam', 'Yao', 'Fatou', 'Serge', 'Aya', 'Ibrahim', 'Adjoua', 'Moussa']
+MESSAGES = ['Bonjour, toujours disponible ?', 'Oui', 'Quel est votre dernier prix ?', 'Je suis intéressé']
+PLAIN_TYPES = {str, int, float, bool, type(None)}  # transmis tels quels au pilote
+
+
+@dataclass
+class SeedScale:
+    users: int = 200
+    ads: int = 1000
+    views: int = 5000
+    favorites: int = 2000
+    conversations: int = 300
+    messages_per_conversation: int = 8
+    transactions: int = 0
+    coupons: int = 0
+    images: bool = False
+    seed: int = 42
+    chunk_size: int = 2000
+
+
+@dataclass
+class SeedResult:
+    """Identifiants utiles aux scénarios de mesure"""
+    demo_user_id: int = None
+    ad_ids: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def skewed_picker(rng, choices, skew=1.2):
+    """
+    Tirage de type Zipf : la valeur de rang i sort ~ 1/i^skew fois moins que
+    la première. Poids cumulés calculés une fois (tirage en O(log n)).
+    """
+    choices = list(choices)
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(choices) + 1):
+        total += 1 / (rank ** skew)
+        cum_weights.append(total)
+    return lambda: rng.choices(choices, cum_weights=cum_weights)[0]
+
+
+def chunked_create(model, rows, chunk_size, raw=False, **kwargs):
+    """
+    bulk_create (ou raw_insert si ``raw``) par paquets depuis un générateur ;
+    renvoie le nombre de lignes
+    """
+    insert = (lambda batch: raw_insert(model, batch)) if raw else (
+        lambda batch: model.objects.bulk_create(batch, **kwargs)
+    )
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            insert(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        insert(batch)
+        total += len(batch)
+    return total
+
+
+def raw_insert(model, objs):
+    """
+    INSERT en executemany d'instances déjà complètes (clé primaire comprise si
+    elle n'est pas auto-incrémentée), sans la compilation SQL de bulk_create
+    ni la conversion de chaque valeur : seules celles qui ne sont pas des
+    types simples passent par get_db_prep_save. Trois à quatre fois plus rapide
+    pour les tables volumineuses (annonces, images, vues).
+    """
+    if not objs:
+        return 0
+    db = connections[DEFAULT_DB_ALIAS]  # résolu une fois : le proxy ``connection`` coûte à chaque accès
+    meta = model._meta
+    fields = [f for f in meta.local_concrete_fields if not (f.primary_key and getattr(objs[0], f.attname) is None)]
+    quote = db.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(meta.db_table), ', '.join(quote(f.column) for f in fields), ', '.join(['%s'] * len(fields))
+    )
+    prepare = [(f.attname, f.get_db_prep_save) for f in fields]
+    shared = {}  # valeurs JSON partagées (dérivés des images de remplacement) converties une fois
+
+    def convert(value, prep):
+        if type(value) in PLAIN_TYPES:
+            return value
+        if type(value) is dict:
+            key = id(value)
+            if key not in shared:
+                shared[key] = (value, prep(value, db))
+            return shared[key][1]
+        return prep(value, db)
+
+    rows = [[convert(getattr(obj, attname), prep) for attname, prep in prepare] for obj in objs]
+    with db.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Désactiver auto_now/auto_now_add pour conserver les dates générées"""
+    saved = []
+    for model in models:
+        for model_field in model._meta.concrete_fields:
+            if getattr(model_field, 'auto_now', False) or getattr(model_field, 'auto_now_add', False):
+                saved.append((model_field, model_field.auto_now, model_field.auto_now_add))
+                model_field.auto_now = model_field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for model_field, auto_now, auto_now_add in saved:
+            model_field.auto_now, model_field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def fast_inserts():
+    """
+    Réglages de session qui accélèrent les insertions massives (base jetable ou
+    de dev) : écritures SQLite non synchronisées, contrôles de clés étrangères
+    MySQL désactivés. Sans effet à l'intérieur d'une transaction (tests).
+    """
+    statements = []
+    if not connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('PRAGMA synchronous')
+                statements = ['PRAGMA synchronous = OFF', f'PRAGMA synchronous = {cursor.fetchone()[0]}']
+            elif connection.vendor == 'mysql':
+                statements = ['SET SESSION foreign_key_checks = 0', 'SET SESSION foreign_key_checks = 1']
+            if statements:
+                cursor.execute(statements[0])
+    try:
+        yield
+    finally:
+        if statements:
+            with connection.cursor() as cursor:
+                cursor.execute(statements[1])
+
+
+def random_datetime(rng, now, days):
+    return now - timedelta(seconds=rng.randrange(days * 86400))
+
+
+def seed_users(scale, rng, now):
+    password = make_password(PASSWORD)  # un seul hachage pour tous les comptes
+    pick_city = skewed_picker(rng, [label for _, label in CITY_CHOICES])
+    start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+
+    def rows():
+        for i in range(scale.users):
+            joined = random_datetime(rng, now, 365)
+            yield User(
+                username=f'{USERNAME_PREFIX}{start + i}',
+                email=f'{USERNAME_PREFIX}{start + i}@example.com',
+                password=password,
+                first_name=rng.choice(FIRST_NAMES),
+                location=pick_city(),
+                is_premium=rng.random() < 0.05,
+                date_joined=joined,
+                created_at=joined,
+                updated_at=joined,
+            )
+
+    chunked_create(User, rows(), scale.chunk_size)
+    return list(
+        User.objects.filter(username__startswith=USERNAME_PREFIX)
+        .order_by('pk').values_list('pk', flat=True)[start:start + scale.users]
+    )
+
+
+def placeholder_images():
+    """Une image de remplacement (et ses déclinaisons) par catégorie, créée si absente"""
+    storage = AdImage._meta.get_field('image').storage
+    placeholders = {}
+    for index, (category, _) in enumerate(CATEGORY_CHOICES):
+        name = f'{PLACEHOLDER_DIR}/{category}.jpg'
+        color = (40 + index * 23 % 200, 90 + index * 41 % 150, 160 - index * 17 % 120)
+        buffer = BytesIO()
+        Image.new('RGB', (1280, 960), color).save(buffer, 'JPEG', quality=80)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(buffer.getvalue()))
+        buffer.seek(0)
+        (width, height), rendered = render_derivatives(buffer)
+        derivatives = {}
+        for size_name, (derivative_width, derivative_height, encoded) in rendered.items():
+            entry = {'width': derivative_width, 'height': derivative_height}
+            for extension, content in encoded.items():
+                path = derivative_name(name, size_name, extension)
+                if not storage.exists(path):
+                    storage.save(path, ContentFile(content))
+                entry[extension] = path
+            derivatives[size_name] = entry
+        placeholders[category] = (name, width, height, derivatives)
+    return placeholders
+
+
+def seed_ads(scale, rng, user_ids, now):
+    """Annonces (et leurs images si scale.images) ; renvoie les identifiants"""
+    pick_category = skewed_picker(rng, [value for value, _ in CATEGORY_CHOICES])
+    pick_city = skewed_picker(rng, [value for value, _ in CITY_CHOICES])
+    pick_seller = skewed_picker(rng, user_ids, skew=0.8)
+    placeholders = placeholder_images() if scale.images else {}
+    run = Ad.objects.filter(slug__startswith=SLUG_PREFIX).count()  # préfixe propre à chaque génération
+    ad_ids, ads, images = [], [], []
+
+    def flush():
+        # Les images suivent toujours l'insertion de leurs annonces
+        raw_insert(Ad, ads)
+        raw_insert(AdImage, images)
+        ads.clear()
+        images.clear()
+
+    for i in range(scale.ads):
+        title = ' '.join(rng.sample(TITLE_WORDS, 3))
+        slug = f'{SLUG_PREFIX}{run}-{i}'
+        category = pick_category()
+        status = AdStatus.ACTIVE if rng.random() < 0.85 else rng.choice(
+            [AdStatus.EXPIRED, AdStatus.SOLD, AdStatus.SUSPENDED]
+        )
+        created_at = random_datetime(rng, now, 90)
+        if status == AdStatus.ACTIVE:
+            expires_at = now + timedelta(hours=rng.randrange(1, 24 * 30))
+        else:
+            expires_at = created_at + timedelta(days=30)
+        ad = Ad(
+            # Identifiant calculé : pas besoin de relire les annonces insérées
+            id=uuid.uuid5(ID_NAMESPACE, f'{scale.seed}:{slug}'),
+            user_id=pick_seller(),
+            title=title,
+            slug=slug,
+            description=f'{title} en bon état, disponible immédiatement.',
+            category=category,
+            city=pick_city(),
+            price=rng.randrange(5, 5000) * 1000,
+            status=status,
+            is_featured=rng.random() < 0.03,
+            is_urgent=rng.random() < 0.08,
+            views_count=int(rng.paretovariate(1.2)) * 3,
+            created_at=created_at,
+            updated_at=created_at,
+            published_at=created_at,
+            expires_at=expires_at,
+        )
+        ad.search_document = build_search_document(ad)
+        if placeholders:
+            name, width, height, derivatives = placeholders[category]
+            count = rng.choice((1, 1, 2, 3))
+            ad.primary_image_path, ad.primary_image_derivatives, ad.images_count = name, derivatives, count
+            images.extend(
+                AdImage(
+                    ad_id=ad.id, image=name, order=order, is_primary=(order == 0),
+                    width=width, height=height, derivatives=derivatives, created_at=created_at,
+                )
+                for order in range(count)
+            )
+        ads.append(ad)
+        ad_ids.append(ad.id)
+        if len(ads) >= scale.chunk_size:
+            flush()
+    flush()
+    return ad_ids
+
+
+def seed_views(scale, rng, ad_ids, user_ids, now):
+    """Vues brutes (AdView), cumuls journaliers et totaux des annonces cohérents"""
+    today = now.date()
+    pick_ad = skewed_picker(rng, ad_ids, skew=1.0)
+    seen = set()
+    daily = {}
+
+    def rows():
+        for _ in range(scale.views):
+            ad_id = pick_ad()
+            user_id = rng.choice(user_ids) if rng.random() < 0.3 else None
+            ip = str(IPv4Address(rng.getrandbits(32)))
+            if (ad_id, ip, user_id) in seen:
+                continue
+            seen.add((ad_id, ip, user_id))
+            created_at = random_datetime(rng, now, 30)
+            stat = daily.setdefault((ad_id, created_at.date()), [0, 0])
+            stat[0 if user_id else 1] += 1
+            yield AdView(ad_id=ad_id, user_id=user_id, ip_address=ip, created_at=created_at)
+
+    total = chunked_create(AdView, rows(), scale.chunk_size, raw=True)
+    chunked_create(AdViewDailyStat, (
+        AdViewDailyStat(
+            ad_id=ad_id, day=day, views=authenticated + anonymous, unique_ips=authenticated + anonymous,
+            authenticated=authenticated, anonymous=anonymous,
+        )
+        for (ad_id, day), (authenticated, anonymous) in daily.items()
+        if day <= today
+    ), scale.chunk_size, raw=True)
+    refresh_ad_view_totals(batch_size=scale.chunk_size)
+    return total
+
+
+def seed_favorites(scale, rng, ad_ids, user_ids, demo_user_id, now):
+    pick_ad = skewed_picker(rng, ad_ids, skew=1.0)
+    pairs = {(demo_user_id, ad_id) for ad_id in rng.sample(ad_ids, min(30, len(ad_ids)))}
+    for _ in range(scale.favorites):
+        pairs.add((rng.choice(user_ids), pick_ad()))
+    return chunked_create(Favorite, (
+        Favorite(user_id=user_id, ad_id=ad_id, created_at=random_datetime(rng, now, 60))
+        for user_id, ad_id in sorted(pairs, key=str)
+    ), scale.chunk_size, ignore_conflicts=True)
+
+
+def seed_conversations(scale, rng, user_ids, demo_user_id, now):
+    """Conversations à deux ; l'utilisateur de démonstration participe aux 20 premières"""
+    # Une conversation par paire (Conversation.participants_key est unique)
+    keys = set(Conversation.objects.exclude(participants_key=None).values_list('participants_key', flat=True))
+    couples = []
+    for _ in range(scale.conversations * 10):
+        if len(couples) == scale.conversations:
+            break
+        first = demo_user_id if len(couples) < 20 else rng.choice(user_ids)
+        second = rng.choice(user_ids)
+        key = Conversation.pair_key(first, second)
+        if first != second and key not in keys:
+            keys.add(key)
+            couples.append((first, second, key))
+
+    started = [random_datetime(rng, now, 60) for _ in couples]
+    conversations = chunked_create(Conversation, (
+        Conversation(participants_key=key, created_at=created_at, updated_at=created_at)
+        for (_, _, key), created_at in zip(couples, started)
+    ), scale.chunk_size)
+    conversation_ids = sorted(Conversation.objects.order_by('-pk').values_list('pk', flat=True)[:conversations])
+
+    pairs = [
+        (conversation_id, first, second, created_at)
+        for conversation_id, (first, second, _), created_at in zip(conversation_ids, couples, started)
+    ]
+
+    unread = {}  # (conversation, destinataire) -> messages non lus
+
+    def messages():
+        for conversation_id, first, second, created_at in pairs:
+            count = rng.randint(1, scale.messages_per_conversation * 2 - 1)
+            unread_tail = rng.choice((0, 0, 0, 1, 2, 3))  # les derniers messages ne sont pas encore lus
+            for position in range(count):
+                sender = (first, second)[position % 2]
+                is_read = position < count - unread_tail
+                if not is_read:
+                    recipient = second if sender == first else first
+                    unread[conversation_id, recipient] = unread.get((conversation_id, recipient), 0) + 1
+                yield Message(
+                    conversation_id=conversation_id,
+                    sender_id=sender,
+                    content=rng.choice(MESSAGES),
+                    is_read=is_read,
+                    created_at=created_at + timedelta(minutes=position * rng.randint(1, 120)),
+                )
+
+    total = chunked_create(Message, messages(), scale.chunk_size)
+    if conversation_ids:
+        # Date de la conversation = date de son dernier message (tri de la boîte
+        # de réception) ; chaque conversation générée a au moins un message
+        last_at = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        Conversation.objects.filter(
+            pk__gte=conversation_ids[0], pk__lte=conversation_ids[-1],
+        ).update(updated_at=Subquery(last_at))
+    chunked_create(ConversationParticipant, (
+        ConversationParticipant(
+            conversation_id=conversation_id, user_id=user_id,
+            unread_count=unread.get((conversation_id, user_id), 0),
+        )
+        for conversation_id, first, second, _ in pairs
+        for user_id in (first, second)
+    ), scale.chunk_size, ignore_conflicts=True)
+    return total
+
+
+def payment_setup():
+    """Packages et moyens de paiement de référence (créés s'il n'en existe aucun)"""
+    packages = list(Package.objects.all())
+    if not packages:
+        packages = Package.objects.bulk_create([
+            Package(name='Boost 7 jours', package_type='boost', description='', price=1000, duration_days=7,
+                    boost_multiplier=Decimal('2.0')),
+            Package(name='Mise en avant', package_type='featured', description='', price=2500, duration_days=14),
+            Package(name='Premium mensuel', package_type='premium', description='', price=5000, duration_days=30),
+        ])
+        packages = list(Package.objects.all())
+    methods = list(PaymentMethod.objects.all())
+    if not methods:
+        PaymentMethod.objects.bulk_create([
+            PaymentMethod(name='Orange Money', payment_type='orange_money', processing_fee=Decimal('1.5')),
+            PaymentMethod(name='Wave', payment_type='wave', processing_fee=Decimal('1.0')),
+        ])
+        methods = list(PaymentMethod.objects.all())
+    return packages, methods
+
+
+def seed_payments(scale, rng, user_ids, now):
+    """Transactions, coupons et utilisations de coupons"""
+    if not scale.transactions and not scale.coupons:
+        return 0, 0
+    packages, methods = payment_setup()
+    run = Transaction.objects.filter(reference__startswith='SEED-').count()
+    pick_buyer = skewed_picker(rng, user_ids, skew=0.6)
+
+    coupon_count = chunked_create(Coupon, (
+        Coupon(
+            code=f'SEED{run}X{i}', name=f'Promo {i}',
+            discount_type=rng.choice(('percentage', 'fixed')),
+            discount_value=rng.choice((10, 15, 20, 500)),
+            valid_from=now - timedelta(days=30), valid_until=now + timedelta(days=rng.randint(-10, 60)),
+            created_by_id=user_ids[0], created_at=now - timedelta(days=30),
+        )
+        for i in range(scale.coupons)
+    ), scale.chunk_size)
+    coupon_ids = list(Coupon.objects.filter(code__startswith=f'SEED{run}X').values_list('pk', flat=True))
+
+    references = []
+
+    def transactions():
+        for i in range(scale.transactions):
+            package = rng.choice(packages)
+            method = rng.choice(methods)
+            fee = (package.price * method.processing_fee / 100).quantize(Decimal('0.01'))
+            status = rng.choices(('completed', 'failed', 'pending', 'refunded'), weights=(80, 10, 8, 2))[0]
+            created_at = random_datetime(rng, now, 180)
+            reference, buyer = f'SEED-{run}-{i}', pick_buyer()
+            if coupon_ids and status == 'completed' and rng.random() < 0.1:
+                references.append((reference, buyer, rng.choice(coupon_ids)))
+            yield Transaction(
+                reference=reference, user_id=buyer, package=package, payment_method=method,
+                amount=package.price, processing_fee=fee, total_amount=package.price + fee,
+                status=status, transaction_type='package_purchase', created_at=created_at,
+                completed_at=created_at + timedelta(minutes=2) if status == 'completed' else None,
+            )
+
+    transaction_count = chunked_create(Transaction, transactions(), scale.chunk_size)
+    if references:
+        transaction_ids = dict(
+            Transaction.objects.filter(reference__in=[reference for reference, _, _ in references])
+            .values_list('reference', 'pk')
+        )
+        chunked_create(CouponUsage, (
+            CouponUsage(
+                coupon_id=coupon_id, transaction_id=transaction_ids[reference], user_id=buyer,
+                discount_amount=Decimal('500'), used_at=now,
+            )
+            for reference, buyer, coupon_id in references
+        ), scale.chunk_size, ignore_conflicts=True)
+    return transaction_count, coupon_count
+
+
+def seed_dataset(scale=None, progress=None):
+    """
+    Générer le jeu de données complet ; renvoie un SeedResult.
+    ``progress(étape, nombre)`` est appelé après chaque étape.
+    """
+    scale = scale or SeedScale()
+    rng = random.Random(scale.seed)
+    now = timezone.now().replace(microsecond=0)
+    progress = progress or (lambda step, count: None)
+    counts = {}
+
+    with explicit_timestamps(User, Ad, AdImage, AdView, Favorite, Conversation, Message, Transaction,
+                             Coupon, CouponUsage), fast_inserts():
+        with transaction.atomic():
+            user_ids = seed_users(scale, rng, now)
+        counts['users'] = len(user_ids)
+        progress('users', counts['users'])
+        demo_user_id = user_ids[0]
+
+        steps = (
+            ('ads', lambda: seed_ads(scale, rng, user_ids, now)),
+            ('views', lambda: seed_views(scale, rng, ad_ids, user_ids, now)),
+            ('favorites', lambda: seed_favorites(scale, rng, ad_ids, user_ids, demo_user_id, now)),
+            ('messages', lambda: seed_conversations(scale, rng, user_ids, demo_user_id, now)),
+            ('payments', lambda: seed_payments(scale, rng, user_ids, now)),
+        )
+        ad_ids = []
+        for step, run in steps:
+            with transaction.atomic():
+                result = run()
+            if step == 'ads':
+                ad_ids = result
+                result = len(ad_ids)
+            if step == 'payments':
+                counts['transactions'], counts['coupons'] = result
+                progress('transactions', counts['transactions'])
+                progress('coupons', counts['coupons'])
+            else:
+                counts[step] = result
+                progress(step, result)
+
+    return SeedResult(demo_user_id=demo_user_id, ad_ids=ad_ids, counts=counts)
+
+
+def load_dataset():
+    """SeedResult d'un jeu déjà généré (base conservée entre deux mesures), ou None"""
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk')
+    demo_user_id = users.values_list('pk', flat=True).first()
+    if demo_user_id is None:
+        return None
+    ad_ids = list(
+        Ad.objects.filter(slug__startswith=SLUG_PREFIX).order_by('created_at').values_list('pk', flat=True)
+    )
+    return SeedResult(demo_user_id=demo_user_id, ad_ids=ad_ids, counts={'users': users.count(), 'ads': len(ad_ids)})
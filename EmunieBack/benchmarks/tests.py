@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.servers.basehttp import WSGIServer
+from django.db import connection
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.testcases import LiveServerThread, QuietWSGIRequestHandler
+
+from EmunieBack.testing import TempMediaRootMixin
+
+from .harness import compare, load_budgets, run_scenarios
+from .seeding import SeedScale, seed_dataset
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Le nombre de requêtes des endpoints critiques ne doit pas dépasser le
+    budget de benchmarks/budgets.json, même sur un petit jeu de données.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset(SeedScale(
+            users=40, ads=120, views=400, favorites=150, conversations=40, seed=7,
+        ))
+        cls.user = get_user_model().objects.get(pk=cls.dataset.demo_user_id)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_budget_de_requetes(self):
+        measurements = run_scenarios(self.dataset, self.user, iterations=1)
+        self.assertEqual(compare(measurements, load_budgets()), [])
+
+    def test_jeu_de_donnees_deterministe(self):
+        from produit.models import Ad
+        first = list(Ad.objects.filter(pk__in=self.dataset.ad_ids).order_by('slug').values_list('title', 'category'))
+        self.assertEqual(len(first), 120)
+        again = seed_dataset(SeedScale(users=40, ads=120, views=0, favorites=0, conversations=0, seed=7))
+        second = list(Ad.objects.filter(pk__in=again.ad_ids).order_by('slug').values_list('title', 'category'))
+        self.assertEqual(first, second)
+
+
+class SeedMarketplaceTests(TempMediaRootMixin, TestCase):
+    """Jeu de données de charge complet : images, paiements, dates réparties"""
+
+    def test_jeu_de_donnees_complet(self):
+        from monetisation.models import CouponUsage, Transaction
+        from produit.models import Ad, AdImage
+
+        dataset = seed_dataset(SeedScale(
+            users=20, ads=50, views=100, favorites=40, conversations=10,
+            transactions=60, coupons=5, images=True, seed=3, chunk_size=16,
+        ))
+        self.assertEqual(dataset.counts['ads'], 50)
+        self.assertEqual(dataset.counts['transactions'], 60)
+        self.assertEqual(dataset.counts['coupons'], 5)
+        self.assertEqual(Transaction.objects.filter(reference__startswith='SEED-').count(), 60)
+        self.assertLessEqual(CouponUsage.objects.count(), 60)
+
+        ads = Ad.objects.filter(pk__in=dataset.ad_ids)
+        # Résumé d'images dénormalisé cohérent avec les AdImage insérées
+        self.assertEqual(sum(ads.values_list('images_count', flat=True)), AdImage.objects.count())
+        self.assertFalse(ads.filter(primary_image_path='').exists())
+        # Dates générées conservées (auto_now_add neutralisé pendant la génération)
+        self.assertGreater(ads.values('created_at').distinct().count(), 40)
+
+
+class LoadTestStatsTests(SimpleTestCase):
+    def test_erreurs_de_la_montee_en_charge_conservees(self):
+        from loadtest.stats import Stats
+
+        stats = Stats()
+        stats.record('ad_detail', 12.0, 'HTTP 500')
+        stats.record('ad_list', 8.0)
+        stats.reset()
+        stats.record('ad_detail', 10.0)
+        # Latences sans la montée en charge, erreurs de toute la campagne
+        self.assertEqual(stats.summary()['total']['requests'], 1)
+        self.assertEqual(stats.errors(), {'ad_detail': {'HTTP 500': 1}})
+
+
+class SerialLiveServerThread(LiveServerThread):
+    """
+    Serveur de test qui traite une requête à la fois. Avec SQLite en mémoire,
+    tous ses fils partagent la connexion du test : des requêtes simultanées y
+    entremêleraient leurs transactions (« database table is locked »).
+    """
+
+    def _create_server(self, connections_override=None):
+        # Requêtes traitées dans ce fil, qui utilise déjà la connexion du test
+        return WSGIServer((self.host, self.port), QuietWSGIRequestHandler, allow_reuse_address=False)
+
+
+# Rafraîchissements dans la requête : un fil d'arrière-plan ouvrirait sa propre
+# connexion à la base SQLite en mémoire et y verrouillerait des tables
+@override_settings(DEBUG=False, HOME_FEED_ASYNC_REFRESH=False, SAMPLING_ASYNC_REFRESH=False)
+class LoadTestSmokeTests(TempMediaRootMixin, LiveServerTestCase):
+    """Campagne courte du test de charge (python -m loadtest) contre un serveur de test"""
+    if connection.vendor == 'sqlite':
+        server_thread_class = SerialLiveServerThread
+
+    def setUp(self):
+        seed_dataset(SeedScale(users=10, ads=60, views=50, favorites=20, conversations=5, seed=11))
+
+    def test_campagne_sans_erreur(self):
+        from loadtest.runner import run
+        from loadtest.stats import compare
+
+        stats = run(
+            self.live_server_url, users=6, duration=2, spawn_rate=20, warmup=0.5,
+            think_time=(0.01, 0.05), accounts=10,
+        )
+        summary = stats.summary()
+        self.assertGreater(summary['total']['requests'], 0)
+        self.assertEqual(stats.errors(), {})  # montée en charge comprise
+        self.assertIn('ad_detail', summary)
+        # Une campagne comparée à elle-même ne présente aucune régression
+        self.assertEqual(compare(summary, {'endpoints': summary}, min_requests=1), [])
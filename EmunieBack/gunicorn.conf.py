@@ -0,0 +1,62 @@
+"""
+Configuration gunicorn, chargée automatiquement depuis le répertoire de
+lancement (/app) : ``gunicorn`` suffit.
+
+Connexions MySQL : avec DB_CONN_MAX_AGE > 0, chaque thread qui a servi une
+requête garde sa connexion ouverte. Un conteneur détient donc au plus
+
+    workers × (threads + BACKGROUND_THREADS)
+
+connexions persistantes (BACKGROUND_THREADS : vidage des files d'écriture
+différée et rafraîchissement de la page d'accueil). Si DB_MAX_CONNECTIONS
+(budget de connexions alloué à ce conteneur) est défini, le nombre de workers
+est réduit pour le respecter. ``python manage.py benchmark_db_connections``
+mesure le gain et rappelle le calcul.
+"""
+import multiprocessing
+import os
+
+BACKGROUND_THREADS = 2
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+wsgi_app = 'EmunieBack.wsgi:application'
+
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+db_max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', 0))
+connections_per_worker = threads + BACKGROUND_THREADS
+if db_max_connections:
+    workers = max(1, min(workers, db_max_connections // connections_per_worker))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycler les workers limite la dérive mémoire (et renouvelle les connexions)
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Vidage périodique des files d'écriture différée (produit.buffering)
+    from produit.buffering import start_flusher
+
+    start_flusher()
+
+
+def worker_exit(server, worker):
+    from produit.buffering import flush_all
+
+    flush_all()
+
+
+def on_starting(server):
+    server.log.info(
+        'Connexions MySQL persistantes max pour ce conteneur : %d (%d workers x %d)',
+        workers * connections_per_worker, workers, connections_per_worker,
+    )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.worker import purge_finished, run_pending, worker_id
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Exécuter les tâches de fond en file (worker). Lancer plusieurs workers est possible."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Vider la file puis s\'arrêter')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Attente quand la file est vide (secondes)')
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help='Conserver les tâches terminées ce nombre de jours'
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        self.stdout.write(f'Worker {worker} démarré')
+        last_purge = 0
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    purge_finished(options['keep_days'])
+                    last_purge = time.monotonic()
+
+                count = run_pending(options['batch_size'], worker)
+                processed += count
+                if count == 0:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'{processed} tâche(s) exécutée(s).'))
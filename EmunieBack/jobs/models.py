@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    PENDING = 'pending', 'En attente'
+    RUNNING = 'running', 'En cours'
+    DONE = 'done', 'Terminée'
+    DEAD = 'dead', 'Abandonnée'
+
+
+class Job(models.Model):
+    """Tâche de fond en file d'attente (exécutée par manage.py run_jobs)"""
+    name = models.CharField(max_length=100, db_index=True)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+
+    # Nouvelles tentatives avec délai croissant, puis abandon (dead-letter)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [models.Index(fields=['status', 'run_at'])]
+        verbose_name = 'Tâche'
+        verbose_name_plural = 'Tâches'
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
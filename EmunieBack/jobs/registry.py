@@ -0,0 +1,74 @@
+"""
+Déclaration et mise en file des tâches de fond.
+
+    @task('jobs.send_email', max_attempts=5)
+    def send_email(subject, message, recipient_list, ...):
+        ...
+
+    send_email.delay(subject='...', message='...', recipient_list=[...])
+
+``delay`` insère une ligne Job dans la transaction en cours : la tâche n'est
+visible du worker qu'une fois la transaction validée, et disparaît avec elle
+en cas d'annulation. Les arguments doivent être sérialisables en JSON.
+
+Avec JOBS_EAGER (tests, développement sans worker), la tâche est exécutée
+immédiatement dans le processus appelant.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+class Task:
+    def __init__(self, name, func, max_attempts):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, args=args, kwargs=kwargs)
+
+
+def task(name=None, max_attempts=5):
+    """Enregistrer une fonction comme tâche de fond"""
+
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registered = Task(task_name, func, max_attempts)
+        _tasks[task_name] = registered
+        return registered
+
+    return decorator
+
+
+def get_task(name):
+    return _tasks.get(name)
+
+
+def enqueue(name, args=(), kwargs=None, run_at=None):
+    """Mettre une tâche en file ; renvoie le Job créé (None en mode eager)"""
+    from .models import Job
+
+    registered = _tasks.get(name)
+    if registered is None:
+        raise LookupError(f'Tâche inconnue : {name}')
+
+    if settings.JOBS_EAGER:
+        try:
+            registered(*args, **(kwargs or {}))
+        except Exception:
+            logger.exception('Échec de la tâche %s (mode eager)', name)
+        return None
+
+    job = Job(name=name, args=list(args), kwargs=kwargs or {}, max_attempts=registered.max_attempts)
+    if run_at is not None:
+        job.run_at = run_at
+    job.save()
+    return job
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .registry import task
+
+
+@task('jobs.send_email', max_attempts=5)
+def send_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """Envoyer un email (une exception déclenche une nouvelle tentative)"""
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list=recipient_list,
+        html_message=html_message,
+        fail_silently=False,
+    )
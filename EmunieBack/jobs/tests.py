@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .registry import enqueue, task
+from .worker import claim_jobs, run_pending
+
+calls = []
+
+
+@task('jobs.tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@task('jobs.tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_mise_en_file_puis_execution(self):
+        job = record.delay('a')
+        self.assertEqual(calls, [])
+        self.assertEqual(job.status, JobStatus.PENDING)
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.DONE, 1))
+        self.assertEqual(calls, ['a'])
+
+    def test_tache_planifiee_plus_tard(self):
+        enqueue('jobs.tests.record', args=['b'], run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(run_pending(), 0)
+
+    def test_nouvelle_tentative_puis_abandon(self):
+        job = explode.delay()
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.DEAD, 2))
+
+    def test_tache_bloquee_reprise(self):
+        job = record.delay('c')
+        claim_jobs(1, worker='mort:1')
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ['c'])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_mode_eager(self):
+        self.assertIsNone(record.delay('d'))
+        self.assertEqual(calls, ['d'])
+        self.assertFalse(Job.objects.exists())
+
+
+class EmailJobTests(TestCase):
+    def test_reinitialisation_mot_de_passe_sans_smtp_dans_la_requete(self):
+        from django.contrib.auth import get_user_model
+        from user.models import PasswordResetToken
+        user = get_user_model().objects.create_user(username='client', email='client@example.com', password='x')
+
+        with mock.patch('django.core.mail.send_mail') as send_mail:
+            response = self.client.post('/api/user/password/reset/request/', {'email': 'client@example.com'})
+        self.assertEqual(response.status_code, 200)
+        send_mail.assert_not_called()
+
+        # La tâche ne conserve que des identifiants, jamais le jeton ni le lien
+        token = PasswordResetToken.objects.get(user=user)
+        job = Job.objects.get()
+        self.assertEqual((job.args, job.kwargs), ([user.pk, token.pk], {}))
+
+        run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['client@example.com'])
+        self.assertIn(f'reset-password?token={token.token}', mail.outbox[0].body)
+
+    def test_jeton_deja_utilise_non_envoye(self):
+        from django.contrib.auth import get_user_model
+        from user.models import PasswordResetToken
+        get_user_model().objects.create_user(username='client', email='client@example.com', password='x')
+
+        self.client.post('/api/user/password/reset/request/', {'email': 'client@example.com'})
+        PasswordResetToken.objects.update(is_used=True)
+        run_pending()
+        self.assertEqual(mail.outbox, [])
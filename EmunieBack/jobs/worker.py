@@ -0,0 +1,104 @@
+"""
+Exécution des tâches en file.
+
+Chaque worker réserve un lot de tâches échues avec SELECT ... FOR UPDATE SKIP
+LOCKED (plusieurs workers ne prennent jamais la même tâche), puis les exécute
+hors transaction. Une tâche en échec est replanifiée avec un délai
+exponentiel ; au-delà de ``max_attempts`` elle passe à l'état « dead » et
+reste visible dans l'admin pour être relancée à la main. Une tâche restée
+« running » plus de JOBS_LOCK_TIMEOUT secondes (worker arrêté brutalement)
+est reprise.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 60 * 60
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def retry_delay(attempts):
+    """Délai avant la tentative suivante : base x 2^(n-1), plafonné, avec gigue"""
+    delay = min(settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def claim_jobs(limit, worker=None):
+    """Réserver jusqu'à ``limit`` tâches échues pour ce worker"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING, run_at__lte=now) |
+                Q(status=JobStatus.RUNNING, locked_at__lt=stale)
+            )
+            .order_by('run_at')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=JobStatus.RUNNING,
+                locked_at=now,
+                locked_by=worker or worker_id(),
+                attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    """Exécuter une tâche réservée et enregistrer son issue ; renvoie le statut"""
+    registered = get_task(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'Tâche inconnue : {job.name}')
+        registered(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error('Tâche %s #%s abandonnée après %s tentatives', job.name, job.pk, job.attempts)
+            fields = {'status': JobStatus.DEAD, 'finished_at': timezone.now()}
+        else:
+            logger.warning('Tâche %s #%s en échec (tentative %s)', job.name, job.pk, job.attempts)
+            fields = {'status': JobStatus.PENDING, 'run_at': timezone.now() + retry_delay(job.attempts)}
+        Job.objects.filter(pk=job.pk).update(last_error=error, locked_at=None, locked_by='', **fields)
+        return fields['status']
+
+    Job.objects.filter(pk=job.pk).update(
+        status=JobStatus.DONE, finished_at=timezone.now(), locked_at=None, locked_by=''
+    )
+    return JobStatus.DONE
+
+
+def run_pending(limit=10, worker=None):
+    """Réserver puis exécuter un lot ; renvoie le nombre de tâches traitées"""
+    jobs = claim_jobs(limit, worker)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def purge_finished(days):
+    """Supprimer les tâches terminées depuis plus de ``days`` jours"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status=JobStatus.DONE, finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,14 @@
+"""
+Test de charge de l'API, autonome (bibliothèque standard, aucun service
+externe), contre runserver ou gunicorn.
+
+    python manage.py seed_marketplace --ads 100000          # données
+    gunicorn EmunieBack.wsgi -c gunicorn.conf.py           # ou runserver
+    python -m loadtest --users 50 --duration 120 --save-baseline
+    # ... optimisation ...
+    python -m loadtest --users 50 --duration 120           # comparaison
+
+Rapport par endpoint : débit, taux d'erreur, latences p50/p90/p95/p99. La
+référence (loadtest/baseline.json) n'a de sens que sur la même machine avec
+les mêmes paramètres ; le code de sortie vaut 1 en cas de régression.
+"""
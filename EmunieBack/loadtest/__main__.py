@@ -0,0 +1,65 @@
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from .runner import run
+from .stats import compare, format_report, load_baseline, save_baseline
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest',
+        description='Test de charge de l\'API publique (bibliothèque standard uniquement)',
+    )
+    parser.add_argument('--host', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20, help='Utilisateurs virtuels simultanés')
+    parser.add_argument('--spawn-rate', type=float, default=5, help='Utilisateurs lancés par seconde')
+    parser.add_argument('--duration', type=float, default=60, help='Durée mesurée (secondes)')
+    parser.add_argument('--warmup', type=float, default=5, help='Montée en charge non mesurée (secondes)')
+    parser.add_argument('--think-time', type=float, nargs=2, default=(0.5, 2.0), metavar=('MIN', 'MAX'))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--account-prefix', default='bench', help='Comptes générés par seed_marketplace')
+    parser.add_argument('--accounts', type=int, default=200, help='Nombre de comptes utilisables')
+    parser.add_argument('--password', default='benchmark')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Enregistrer cette campagne comme référence')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Marge p95/débit (0.2 = 20 %%)')
+    options = parser.parse_args(argv)
+
+    stats = run(
+        options.host, users=options.users, duration=options.duration, spawn_rate=options.spawn_rate,
+        warmup=options.warmup, seed=options.seed, think_time=tuple(options.think_time),
+        account_prefix=options.account_prefix, accounts=options.accounts, password=options.password,
+    )
+    summary = stats.summary()
+    print(format_report(summary))
+    for name, errors in sorted(stats.errors().items()):
+        print(f'  {name} : ' + ', '.join(f'{error} x{count}' for error, count in errors.items()))
+
+    if options.save_baseline:
+        meta = {
+            'host': options.host, 'users': options.users, 'duration': options.duration,
+            'think_time': list(options.think_time), 'seed': options.seed,
+            'date': datetime.now().isoformat(timespec='seconds'),
+        }
+        save_baseline(options.baseline, summary, meta)
+        print(f'Référence enregistrée : {options.baseline}')
+        return 0
+
+    if options.baseline.exists():
+        baseline = load_baseline(options.baseline)
+        if baseline['meta'].get('users') != options.users:
+            print(f"Attention : référence mesurée avec {baseline['meta'].get('users')} utilisateurs")
+        regressions = compare(summary, baseline, tolerance=options.tolerance)
+        if regressions:
+            print('Régressions :\n  ' + '\n  '.join(regressions))
+            return 1
+        print('Aucune régression par rapport à la référence.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Client HTTP minimal (bibliothèque standard) d'un utilisateur virtuel : une
+connexion keep-alive, un jeton JWT, chaque requête chronométrée et comptée
+dans les statistiques sous un nom d'endpoint stable (sans identifiants).
+"""
+import http.client
+import json
+import struct
+import time
+import uuid
+import zlib
+from urllib.parse import urlencode, urlsplit
+
+
+class HttpSession:
+    def __init__(self, host, stats, timeout=30):
+        parts = urlsplit(host)
+        self.scheme = parts.scheme or 'http'
+        self.netloc = parts.netloc or parts.path
+        self.stats = stats
+        self.timeout = timeout
+        self.token = None
+        self.connection = None
+
+    def connect(self):
+        factory = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        self.connection = factory(self.netloc, timeout=self.timeout)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, name, method, path, params=None, json_body=None, files=None, data=None,
+                expected=(200, 201, 204)):
+        """
+        Exécuter une requête et l'enregistrer sous ``name`` (None : non
+        comptée). Renvoie (statut, corps JSON décodé ou None) ; statut 0 en
+        cas d'erreur réseau.
+        """
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = {'Accept': 'application/json'}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif files is not None:
+            body, headers['Content-Type'] = encode_multipart(data or {}, files)
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connect()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+        except (OSError, http.client.HTTPException) as exc:
+            self.close()  # connexion à rouvrir à la prochaine requête
+            if name:
+                self.stats.record(name, (time.perf_counter() - started) * 1000, type(exc).__name__)
+            return 0, None
+        duration = (time.perf_counter() - started) * 1000
+
+        if name:
+            self.stats.record(name, duration, None if status in expected else f'HTTP {status}')
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def login(self, username, password):
+        status, body = self.request(
+            'auth_login', 'POST', '/api/jwt/login/', json_body={'username': username, 'password': password}
+        )
+        self.token = body.get('access') if status == 200 and body else None
+        return self.token is not None
+
+
+def encode_multipart(data, files):
+    """Corps multipart/form-data ; ``files`` : liste de (champ, nom, type, octets)"""
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, value in data.items():
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, content_type, content in files:
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    chunks.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(chunks), f'multipart/form-data; boundary={boundary}'
+
+
+def png_image(width, height, color):
+    """PNG RVB uni, sans Pillow (image de test pour les envois d'annonces)"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes(color) * width  # filtre 0 puis les pixels de la ligne
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(row * height))
+        + chunk(b'IEND', b'')
+    )
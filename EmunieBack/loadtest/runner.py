@@ -0,0 +1,50 @@
+"""
+Exécution d'une campagne : N utilisateurs virtuels (un thread chacun) lancés
+progressivement (``spawn_rate`` par seconde), qui enchaînent tâches et
+pauses jusqu'à la fin de la durée. Les mesures de la montée en charge
+(``warmup`` secondes) sont écartées des latences et des débits, mais ses
+erreurs restent comptées (``Stats.errors``).
+"""
+import threading
+import time
+
+from .scenarios import Context, make_rng, pick_profile, prepare
+from .stats import Stats
+
+
+def run_user(user, stop):
+    try:
+        user.on_start()
+        while not stop.is_set():
+            user.run_task()
+            stop.wait(user.pause())
+    finally:
+        user.on_stop()
+
+
+def run(host, users=20, duration=60, spawn_rate=5, warmup=5, seed=1, profiles=None, **context_options):
+    """Lancer la campagne ; renvoie les statistiques (``Stats``)"""
+    stats = Stats()
+    context = Context(host=host, stats=stats, **context_options)
+    if not prepare(context):
+        raise RuntimeError(f"Aucune annonce active sur {host} (lancer d'abord seed_marketplace)")
+
+    rng = make_rng(seed, 'population')
+    stop = threading.Event()
+    threads = []
+    for number in range(users):
+        profile = pick_profile(rng, profiles) if profiles else pick_profile(rng)
+        user = profile(context, make_rng(seed, number))
+        thread = threading.Thread(target=run_user, args=(user, stop), name=f'{profile.__name__}-{number}', daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(1 / spawn_rate)
+
+    stop.wait(warmup)
+    stats.reset()
+    stop.wait(duration)
+    stop.set()
+    stats.stop()
+    for thread in threads:
+        thread.join(timeout=30)
+    return stats
@@ -0,0 +1,258 @@
+"""
+Profils d'utilisateurs virtuels et leurs parcours, pondérés comme le trafic
+réel : une majorité de visiteurs anonymes qui parcourent l'accueil, les
+listes filtrées et les fiches, des acheteurs connectés (favoris, messagerie)
+et quelques vendeurs qui publient des annonces avec photos.
+
+Chaque profil déclare ``tasks`` (méthode -> poids) ; l'utilisateur virtuel
+tire une tâche, l'exécute puis marque une pause (``think_time``).
+"""
+import itertools
+import random
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from .client import HttpSession, png_image
+
+ADS_PATH = '/api/produit/ads/'
+
+
+@dataclass
+class Context:
+    """État partagé par les utilisateurs virtuels d'une campagne"""
+    host: str
+    stats: object
+    account_prefix: str = 'bench'
+    accounts: int = 200
+    password: str = 'benchmark'
+    think_time: tuple = (0.5, 2.0)
+    ad_ids: list = field(default_factory=list)
+    categories: list = field(default_factory=list)
+    cities: list = field(default_factory=list)
+    run_id: str = field(default_factory=lambda: datetime.now().strftime('%H%M%S'))
+    counter: object = field(default_factory=itertools.count)
+    lock: object = field(default_factory=threading.Lock)
+
+    def next_number(self):
+        with self.lock:
+            return next(self.counter)
+
+    def remember_ads(self, body):
+        """Alimenter la réserve d'annonces à partir d'une réponse de liste"""
+        results = body.get('results') if isinstance(body, dict) else body
+        ids = [ad['id'] for ad in results or [] if isinstance(ad, dict) and 'id' in ad]
+        if ids:
+            with self.lock:
+                self.ad_ids.extend(ids)
+                del self.ad_ids[:-5000]  # réserve bornée, annonces récentes
+
+
+def next_cursor(body):
+    """Curseur (décodé) du lien ``next`` d'une page keyset"""
+    next_url = body.get('next') if isinstance(body, dict) else None
+    return parse_qs(urlsplit(next_url).query).get('cursor', [None])[0] if next_url else None
+
+
+def prepare(context):
+    """Référentiels et première réserve d'annonces (requêtes non comptées)"""
+    session = HttpSession(context.host, context.stats)
+    try:
+        status, body = session.request(None, 'GET', '/api/produit/categories/')
+        if status == 200:
+            context.categories = [item['value'] for item in body['categories']]
+        status, body = session.request(None, 'GET', '/api/produit/cities/')
+        if status == 200:
+            context.cities = [item['value'] for item in body['cities']]
+        params = {'pagination': 'cursor', 'page_size': 100}
+        for _ in range(5):
+            status, body = session.request(None, 'GET', ADS_PATH, params=params)
+            if status != 200:
+                break
+            context.remember_ads(body)
+            cursor = next_cursor(body)
+            if not cursor:
+                break
+            params = {'cursor': cursor, 'page_size': 100}
+    finally:
+        session.close()
+    return bool(context.ad_ids)
+
+
+class VirtualUser:
+    weight = 1
+    tasks = {}
+
+    def __init__(self, context, rng):
+        self.context = context
+        self.rng = rng
+        self.session = HttpSession(context.host, context.stats)
+        names = list(self.tasks)
+        self._pick = lambda: rng.choices(names, weights=[self.tasks[name] for name in names])[0]
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        self.session.close()
+
+    def run_task(self):
+        getattr(self, self._pick())()
+
+    def pause(self):
+        low, high = self.context.think_time
+        return self.rng.uniform(low, high)
+
+    def random_ad(self):
+        ads = self.context.ad_ids
+        return self.rng.choice(ads) if ads else None
+
+    # Parcours communs
+
+    def home(self):
+        self.session.request('home_data', 'GET', '/api/produit/home-data/')
+
+    def browse(self):
+        status, body = self.session.request('ad_list', 'GET', ADS_PATH, params={'page': self.rng.randint(1, 3)})
+        if status == 200:
+            self.context.remember_ads(body)
+
+    def browse_filtered(self):
+        params = {'ordering': self.rng.choice(['-created_at', 'price', '-price'])}
+        if self.context.categories:
+            params['category'] = self.rng.choice(self.context.categories)
+        if self.context.cities and self.rng.random() < 0.5:
+            params['city'] = self.rng.choice(self.context.cities)
+        if self.rng.random() < 0.3:
+            params['price_max'] = self.rng.choice([50000, 200000, 1000000])
+        status, body = self.session.request('ad_list_filtered', 'GET', ADS_PATH, params=params)
+        if status == 200:
+            self.context.remember_ads(body)
+
+    def browse_infinite(self):
+        """Défilement infini : trois pages de curseur"""
+        params = {'pagination': 'cursor'}
+        for _ in range(3):
+            status, body = self.session.request('ad_list_cursor', 'GET', ADS_PATH, params=params)
+            cursor = next_cursor(body) if status == 200 else None
+            if not cursor:
+                break
+            params = {'cursor': cursor}
+
+    def ad_detail(self):
+        ad_id = self.random_ad()
+        if ad_id:
+            # 404 possible : annonce de test de charge supprimée depuis son listage
+            status, body = self.session.request(
+                'ad_detail', 'GET', f'{ADS_PATH}{ad_id}/', expected=(200, 404),
+            )
+            return body if status == 200 else None
+
+
+class AnonymousVisitor(VirtualUser):
+    weight = 6
+    tasks = {'home': 3, 'browse': 4, 'browse_filtered': 3, 'browse_infinite': 2, 'ad_detail': 5}
+
+
+class AuthenticatedUser(VirtualUser):
+    def on_start(self):
+        account = self.rng.randrange(self.context.accounts)
+        if not self.session.login(f'{self.context.account_prefix}{account}', self.context.password):
+            self.register()
+
+    def register(self):
+        username = f'loadtest{self.context.run_id}x{self.context.next_number()}'
+        password = 'Charge-Test-2025!'
+        status, _ = self.session.request('register', 'POST', '/api/user/register/', json_body={
+            'username': username, 'email': f'{username}@example.com',
+            'password': password, 'password_confirm': password, 'first_name': 'Charge',
+        })
+        if status == 201:
+            self.session.login(username, password)
+
+
+class Buyer(AuthenticatedUser):
+    """Acheteur connecté (compte généré par seed_marketplace) : favoris et messagerie"""
+    weight = 3
+    tasks = {
+        'browse': 2, 'ad_detail': 3, 'toggle_favorite': 2, 'favorites': 2,
+        'conversations': 2, 'send_message': 2,
+    }
+
+    def toggle_favorite(self):
+        ad_id = self.random_ad()
+        if ad_id:
+            # 404 possible : annonce expirée ou vendue depuis le début de la campagne
+            self.session.request(
+                'favorite_toggle', 'POST', '/api/produit/favorites/toggle/',
+                json_body={'ad_id': ad_id}, expected=(200, 201, 404),
+            )
+
+    def favorites(self):
+        self.session.request('favorite_list', 'GET', '/api/produit/favorites/')
+
+    def conversations(self):
+        self.session.request('conversation_list', 'GET', '/api/user/conversations/')
+
+    def send_message(self):
+        """Contacter le vendeur d'une annonce consultée puis relire le fil"""
+        ad = self.ad_detail() or {}
+        seller = ad.get('user') or {}
+        if not seller.get('id') or ad.get('is_owner'):  # pas de conversation avec soi-même
+            return
+        status, conversation = self.session.request(
+            'conversation_start', 'POST', '/api/user/conversations/start/',
+            json_body={'recipient_id': seller['id']},
+        )
+        if status != 200 or not conversation:
+            return
+        path = f"/api/user/conversations/{conversation['id']}/messages/"
+        self.session.request('message_send', 'POST', path, json_body={'content': 'Toujours disponible ?'})
+        self.session.request('message_list', 'GET', path)
+
+
+class Seller(AuthenticatedUser):
+    """Vendeur : publie une annonce avec photos puis la retire (quota gratuit préservé)"""
+    weight = 1
+    tasks = {'publish': 2, 'my_ads': 1, 'browse': 1}
+
+    def on_start(self):
+        self.register()  # compte neuf : le quota d'annonces gratuites n'est pas atteint
+
+    def publish(self):
+        color = tuple(self.rng.randrange(256) for _ in range(3))
+        files = [
+            ('images', f'photo{index}.png', 'image/png', png_image(640, 480, color))
+            for index in range(self.rng.randint(1, 3))
+        ]
+        data = {
+            'title': 'Annonce de test de charge',
+            'description': 'Créée puis supprimée par le test de charge.',
+            'category': self.rng.choice(self.context.categories or ['autres']),
+            'city': self.rng.choice(self.context.cities or ['abidjan']),
+            'price': self.rng.randrange(1, 500) * 1000,
+            'expires_at': (datetime.now() + timedelta(days=30)).isoformat(),
+        }
+        status, _ = self.session.request('ad_create', 'POST', f'{ADS_PATH}create/', files=files, data=data)
+        if status != 201:
+            return
+        # La réponse de création ne contient pas l'identifiant : il vient de « mes annonces »
+        for ad in self.my_ads() or []:
+            self.session.request('ad_delete', 'DELETE', f"{ADS_PATH}{ad['id']}/delete/")
+
+    def my_ads(self):
+        status, body = self.session.request('my_ads', 'GET', '/api/produit/my-ads/')
+        if status == 200:
+            return body.get('results', []) if isinstance(body, dict) else body
+
+
+PROFILES = [AnonymousVisitor, Buyer, Seller]
+
+
+def pick_profile(rng, profiles=PROFILES):
+    return rng.choices(profiles, weights=[profile.weight for profile in profiles])[0]
+
+
+def make_rng(seed, number):
+    return random.Random(f'{seed}:{number}')
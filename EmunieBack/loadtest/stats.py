@@ -0,0 +1,160 @@
+"""
+Statistiques par endpoint : débit, percentiles de latence, taux d'erreur, et
+fichier de référence (baseline) pour comparer deux campagnes.
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, pct):
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+@dataclass
+class EndpointStats:
+    name: str
+    durations: list = field(default_factory=list)  # ms
+    failures: int = 0
+    errors: dict = field(default_factory=dict)  # motif -> occurrences
+
+    @property
+    def requests(self):
+        return len(self.durations)
+
+    def record(self, duration_ms, error=None):
+        self.durations.append(duration_ms)
+        if error:
+            self.failures += 1
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, elapsed):
+        ordered = sorted(self.durations)
+        summary = {
+            'requests': self.requests,
+            'rps': round(self.requests / elapsed, 2) if elapsed else 0.0,
+            'error_rate': round(self.failures / self.requests, 4) if self.requests else 0.0,
+            'mean_ms': round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+        }
+        for pct in PERCENTILES:
+            summary[f'p{pct}_ms'] = round(percentile(ordered, pct), 1)
+        summary['max_ms'] = round(ordered[-1], 1) if ordered else 0.0
+        return summary
+
+
+class Stats:
+    """Collecte partagée entre les utilisateurs virtuels (un verrou suffit)"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.warmup_errors = {}  # endpoint -> {motif: occurrences}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stopped = None
+
+    def record(self, name, duration_ms, error=None):
+        with self.lock:
+            stats = self.endpoints.get(name)
+            if stats is None:
+                stats = self.endpoints[name] = EndpointStats(name)
+            stats.record(duration_ms, error)
+
+    def reset(self):
+        """
+        Oublier les mesures de la montée en charge : seules les suivantes
+        comptent pour les latences et les débits. Ses erreurs sont conservées.
+        """
+        with self.lock:
+            for name, stats in self.endpoints.items():
+                errors = self.warmup_errors.setdefault(name, {})
+                for error, count in stats.errors.items():
+                    errors[error] = errors.get(error, 0) + count
+            self.endpoints = {}
+            self.started = time.monotonic()
+
+    def stop(self):
+        self.stopped = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return (self.stopped or time.monotonic()) - self.started
+
+    def summary(self):
+        with self.lock:
+            endpoints = {name: stats.summary(self.elapsed) for name, stats in sorted(self.endpoints.items())}
+            total = EndpointStats('total')
+            for stats in self.endpoints.values():
+                total.durations.extend(stats.durations)
+                total.failures += stats.failures
+            endpoints['total'] = total.summary(self.elapsed)
+        return endpoints
+
+    def errors(self):
+        """Erreurs de toute la campagne, montée en charge comprise"""
+        errors = {}
+        with self.lock:
+            measured = [(name, stats.errors) for name, stats in self.endpoints.items()]
+            for name, counts in [*self.warmup_errors.items(), *measured]:
+                for error, count in counts.items():
+                    endpoint = errors.setdefault(name, {})
+                    endpoint[error] = endpoint.get(error, 0) + count
+        return errors
+
+
+def format_report(summary):
+    header = f"{'endpoint':<26}{'req':>8}{'req/s':>9}{'err %':>8}" + ''.join(
+        f"{f'p{pct} ms':>10}" for pct in PERCENTILES
+    ) + f"{'max ms':>10}"
+    lines = [header, '-' * len(header)]
+    for name, row in summary.items():
+        if name == 'total':
+            lines.append('-' * len(header))
+        lines.append(
+            f"{name:<26}{row['requests']:>8}{row['rps']:>9.1f}{row['error_rate'] * 100:>8.1f}"
+            + ''.join(f"{row[f'p{pct}_ms']:>10.1f}" for pct in PERCENTILES)
+            + f"{row['max_ms']:>10.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def save_baseline(path, summary, meta):
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump({'meta': meta, 'endpoints': summary}, fp, indent=2, sort_keys=True)
+        fp.write('\n')
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def compare(summary, baseline, tolerance=0.2, min_requests=20):
+    """
+    Régressions par rapport à la baseline : p95 ou débit dégradés au-delà de
+    ``tolerance``, ou taux d'erreur en hausse. Les endpoints trop peu
+    sollicités (moins de ``min_requests`` requêtes) ne sont pas comparés.
+    """
+    regressions = []
+    for name, reference in baseline.get('endpoints', {}).items():
+        current = summary.get(name)
+        if current is None:
+            regressions.append(f'{name} : absent de cette campagne')
+            continue
+        if min(current['requests'], reference['requests']) < min_requests:
+            continue
+        if current['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name} : p95 {current['p95_ms']} ms > {reference['p95_ms']} ms")
+        if current['rps'] < reference['rps'] * (1 - tolerance):
+            regressions.append(f"{name} : débit {current['rps']} req/s < {reference['rps']} req/s")
+        if current['error_rate'] > reference['error_rate'] + 0.01:
+            regressions.append(
+                f"{name} : erreurs {current['error_rate'] * 100:.1f} % > {reference['error_rate'] * 100:.1f} %"
+            )
+    return regressions
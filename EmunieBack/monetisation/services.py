@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.core.mail import send_mail
+from jobs.tasks import send_email
 from django.utils import timezone
 
 class PaymentService:
@@ -29,7 +29,12 @@ class PaymentService:
         }
 
 class NotificationService:
-    """Service pour envoyer des notifications"""
+    """
+    Service pour envoyer des notifications
+
+    Les emails sont mis en file (tâche jobs.send_email) : l'envoi SMTP, et
+    ses nouvelles tentatives, se font hors de la requête.
+    """
     
     @staticmethod
     def send_payment_success(transaction):
@@ -45,12 +50,10 @@ class NotificationService:
             Merci d'utiliser notre plateforme !
             """
             
-            send_mail(
+            send_email.delay(
                 subject=subject,
                 message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[transaction.user.email],
-                fail_silently=True
             )
             
         except Exception as e:
@@ -71,12 +74,10 @@ class NotificationService:
             Veuillez réessayer ou nous contacter.
             """
             
-            send_mail(
+            send_email.delay(
                 subject=subject,
                 message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[transaction.user.email],
-                fail_silently=True
             )
             
         except Exception as e:
@@ -97,12 +98,10 @@ class NotificationService:
             Renouvelez dès maintenant pour continuer à bénéficier de nos services premium.
             """
             
-            send_mail(
+            send_email.delay(
                 subject=subject,
                 message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[subscription.user.email],
-                fail_silently=True
             )
             
         except Exception as e:
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from EmunieBack.response_cache import invalidate_response_cache
+
+from .models import Package, PaymentMethod
+
+
+@receiver([post_save, post_delete], sender=Package)
+def package_changed(sender, **kwargs):
+    """Un package a changé : la liste en cache est périmée"""
+    invalidate_response_cache('packages')
+
+
+@receiver([post_save, post_delete], sender=PaymentMethod)
+def payment_method_changed(sender, **kwargs):
+    """Une méthode de paiement a changé : la liste en cache est périmée"""
+    invalidate_response_cache('payment-methods')
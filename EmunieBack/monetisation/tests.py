@@ -1,3 +1,44 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Package
+
+
+class PackageListCacheTests(TestCase):
+    url = '/api/monetisation/packages/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.package = Package.objects.create(
+            name='Boost', package_type='boost', description='', price=1000, duration_days=7,
+        )
+
+    def test_reponse_en_cache_avec_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertIn('max-age=', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_304_si_etag_inchange(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_modification_invalide_le_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        self.package.price = 1500
+        self.package.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['price'], '1500.00')
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import timedelta
@@ -18,7 +19,9 @@ from .serializers import (
     CouponSerializer, CouponValidationSerializer, RevenueSerializer
 )
 from .services import PaymentService, NotificationService
+from EmunieBack.response_cache import cache_response
 
+@method_decorator(cache_response('packages'), name='dispatch')
 class PackageListView(generics.ListAPIView):
     """Liste des packages disponibles"""
     queryset = Package.objects.filter(is_active=True).order_by('price')
@@ -31,6 +34,7 @@ class PackageDetailView(generics.RetrieveAPIView):
     serializer_class = PackageSerializer
     permission_classes = [permissions.AllowAny]
 
+@method_decorator(cache_response('payment-methods'), name='dispatch')
 class PaymentMethodListView(generics.ListAPIView):
     """Liste des méthodes de paiement"""
     queryset = PaymentMethod.objects.filter(is_active=True).order_by('order')
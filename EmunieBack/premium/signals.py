@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from EmunieBack.response_cache import invalidate_response_cache
+
+from .models import PremiumPlan
+
+
+@receiver([post_save, post_delete], sender=PremiumPlan)
+def premium_plan_changed(sender, **kwargs):
+    """Un plan Premium a changé : la liste en cache est périmée"""
+    invalidate_response_cache('premium-plans')
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.utils.decorators import method_decorator
 
 from .models import PremiumPlan, PremiumSubscription
 from .serializers import (
@@ -14,8 +15,10 @@ from .serializers import (
     PremiumSubscriptionSerializer,
     SubscribeToPremiumSerializer
 )
+from EmunieBack.response_cache import cache_response
 
 
+@method_decorator(cache_response('premium-plans'), name='dispatch')
 class PremiumPlanListView(generics.ListAPIView):
     """Liste des plans Premium disponibles"""
     serializer_class = PremiumPlanSerializer
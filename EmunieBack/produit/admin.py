@@ -80,10 +80,6 @@ class AdAdmin(admin.ModelAdmin):
 
     actions = ['approve_ads', 'reject_ads', 'feature_ads', 'unfeature_ads']
 
-    def images_count(self, obj):
-        return obj.images.count()
-    images_count.short_description = 'Nb Images'
-
     def approve_ads(self, request, queryset):
         from django.utils import timezone
         updated = queryset.update(
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProduitConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produit'
+
+    def ready(self):
+        from . import signals, tracking  # noqa: F401
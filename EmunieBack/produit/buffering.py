@@ -0,0 +1,181 @@
+"""
+Tampons d'écriture différée (write-behind) partagés via le cache Django.
+
+Les événements fréquents (vues d'annonces, impressions...) ne sont pas écrits
+en base pendant la requête : ils sont ajoutés à une file dans le cache puis
+appliqués par lots, toutes les EVENT_BUFFER_FLUSH_INTERVAL secondes, par un
+thread de fond de chaque worker gunicorn (``start_flusher``, appelé par
+gunicorn.conf.py, qui vide aussi les files à l'arrêt du worker). Un seul
+vidage à la fois est effectué (verrou dans le cache).
+
+La file est une séquence numérotée : ``push`` incrémente le compteur de queue
+puis écrit l'événement sous sa clé. Un numéro sans événement (écriture en
+cours) bloque le vidage une fois, puis est ignoré.
+
+Les files supposent un cache partagé dont add/incr sont atomiques (Redis) :
+activées par EVENT_BUFFERING (par défaut si REDIS_URL est défini). Sans cela
+(FileBasedCache : numéros de séquence en double entre workers ; LocMemCache :
+files invisibles des autres processus), chaque événement est appliqué
+directement en base. Les entrées sont stockées sans expiration, pour qu'une
+politique d'éviction volatile-* de Redis ne les supprime pas avant vidage.
+
+``python manage.py flush_buffers`` vide toutes les files (arrêt, maintenance).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 60
+GAP_TIMEOUT = 60 * 60 * 24
+ATOMIC_CACHE_BACKENDS = ('django.core.cache.backends.redis.RedisCache',)
+
+
+def buffering_enabled():
+    """Files actives : demandées et adossées à un cache aux add/incr atomiques"""
+    return settings.EVENT_BUFFERING and settings.CACHES['default']['BACKEND'] in ATOMIC_CACHE_BACKENDS
+
+
+class EventBuffer:
+    """File d'événements dont le vidage est confié à ``handler(events)``"""
+
+    def __init__(self, name, handler, batch_size=500):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        prefix = f'buffer:{name}'
+        self.tail_key = f'{prefix}:tail'
+        self.head_key = f'{prefix}:head'
+        self.gap_key = f'{prefix}:gap'
+        self.lock_key = f'{prefix}:lock'
+        self.item_key = f'{prefix}:item:{{seq}}'
+
+    def push(self, event):
+        """Ajouter un événement (dictionnaire sérialisable) à la file, ou l'appliquer sans file"""
+        if not buffering_enabled():
+            try:
+                self.handler([event])
+            except Exception:
+                logger.exception("Écriture directe d'un événement %s impossible", self.name)
+            return
+        try:
+            seq = cache.incr(self.tail_key)
+        except ValueError:
+            cache.add(self.tail_key, 0, None)
+            seq = cache.incr(self.tail_key)
+        cache.set(self.item_key.format(seq=seq), event, None)
+
+    def pending(self):
+        return max(0, cache.get(self.tail_key, 0) - cache.get(self.head_key, 0))
+
+    def read_batch(self, final=False):
+        """
+        Lire le prochain lot : (événements, dernier numéro lu, lot complet).
+        ``final`` ignore immédiatement les trous (aucune écriture en cours).
+        """
+        head = cache.get(self.head_key, 0)
+        tail = cache.get(self.tail_key, 0)
+        if tail <= head:
+            return [], head, False
+
+        seqs = range(head + 1, min(tail, head + self.batch_size) + 1)
+        found = cache.get_many([self.item_key.format(seq=seq) for seq in seqs])
+        events = []
+        last = head
+        for seq in seqs:
+            key = self.item_key.format(seq=seq)
+            if key in found:
+                events.append(found[key])
+            elif not final and cache.get(self.gap_key) != seq:
+                # Premier passage sur ce trou : on attend le prochain vidage
+                cache.set(self.gap_key, seq, GAP_TIMEOUT)
+                return events, last, False
+            last = seq
+        return events, last, last < tail
+
+    @contextmanager
+    def lock(self):
+        """Verrou de vidage ; renvoie False s'il est déjà pris ailleurs"""
+        acquired = cache.add(self.lock_key, 1, LOCK_TIMEOUT)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cache.delete(self.lock_key)
+
+    def flush(self, final=False):
+        """Appliquer les événements en attente ; renvoie le nombre traité"""
+        processed = 0
+        with self.lock() as acquired:
+            if not acquired:
+                return 0
+            while True:
+                head = cache.get(self.head_key, 0)
+                events, last, more = self.read_batch(final)
+                if last == head:
+                    break
+                if events:
+                    self.handler(events)
+                cache.set(self.head_key, last, None)
+                cache.delete_many([self.item_key.format(seq=seq) for seq in range(head + 1, last + 1)])
+                processed += len(events)
+                if not more:
+                    break
+        return processed
+
+
+_registry = {}
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def register_buffer(name, handler, **kwargs):
+    """Déclarer une file ; elle est vidée par le thread de fond et flush_buffers"""
+    buffer = EventBuffer(name, handler, **kwargs)
+    _registry[name] = buffer
+    return buffer
+
+
+def get_buffers():
+    return dict(_registry)
+
+
+def flush_all(final=False):
+    """Vider toutes les files déclarées ; renvoie {nom: nombre d'événements}"""
+    results = {}
+    for name, buffer in _registry.items():
+        try:
+            results[name] = buffer.flush(final=final)
+        except Exception:
+            logger.exception("Vidage de la file %s impossible", name)
+            results[name] = 0
+    return results
+
+
+def _run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        close_old_connections()
+        flush_all()
+
+
+def start_flusher():
+    """
+    Démarrer (une fois par processus) le thread de vidage périodique. Appelé
+    par les workers gunicorn seulement : ni les commandes de gestion ni les
+    tests n'ont de thread de fond.
+    """
+    global _flusher
+    interval = settings.EVENT_BUFFER_FLUSH_INTERVAL
+    if interval <= 0 or not buffering_enabled() or _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, args=(interval,), daemon=True)
+            _flusher.start()
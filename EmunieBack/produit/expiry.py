@@ -0,0 +1,55 @@
+"""
+Passage des annonces échues au statut « expirée ».
+
+Les requêtes publiques filtrent ``status='active' AND expires_at > now``, mais
+rien ne retirait les annonces échues de l'ensemble actif : il ne faisait que
+grossir, et les index commençant par ``status`` perdaient leur sélectivité.
+
+``expire_ads`` traite les annonces échues par lots : sélection d'au plus
+``batch_size`` clés primaires via l'index (expires_at, status), puis UPDATE
+ciblé sur ces clés dans sa propre transaction. Les verrous sont donc tenus le
+temps d'un lot seulement, et une pause optionnelle laisse respirer la base
+entre deux lots.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def expired_ads(now=None):
+    from .models import Ad, AdStatus
+    return Ad.objects.filter(status=AdStatus.ACTIVE, expires_at__lte=now or timezone.now())
+
+
+def expire_ads(batch_size=500, pause=0, now=None):
+    """Passer les annonces échues en EXPIRED ; renvoie le nombre d'annonces traitées"""
+    from .home_feed import invalidate_home_feed
+    from .models import Ad, AdStatus
+    from .sampling import featured_ads_sampler, urgent_ads_sampler
+
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(expired_ads(now).order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            # Conditions répétées : une annonce prolongée entre-temps reste active
+            total += Ad.objects.filter(
+                pk__in=ids, status=AdStatus.ACTIVE, expires_at__lte=now
+            ).update(status=AdStatus.EXPIRED, updated_at=now)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if total:
+        invalidate_home_feed()
+        featured_ads_sampler.invalidate()
+        urgent_ads_sampler.invalidate()
+        logger.info('%d annonce(s) expirée(s)', total)
+    return total
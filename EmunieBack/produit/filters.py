@@ -1,6 +1,34 @@
 import django_filters
 from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
 from .models import Ad, Category, Location, AdType, AdStatus
+from .search import get_search_backend
+
+
+class AdSearchFilter(BaseFilterBackend):
+    """
+    Recherche plein texte des annonces via le backend de produit.search.
+
+    Remplace SearchFilter (LIKE '%terme%') : insensible aux accents et trié
+    par pertinence, sauf si le client impose un tri avec ?ordering=.
+    À placer après OrderingFilter dans filter_backends.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        queryset = get_search_backend().search(queryset, query)
+        if 'search_rank' not in queryset.query.annotations:
+            return queryset
+
+        if request.query_params.get(self.ordering_param):
+            return queryset
+        return queryset.order_by('-search_rank', *queryset.query.order_by)
+
 
 class AdFilter(django_filters.FilterSet):
     """Filtres pour les annonces"""
@@ -0,0 +1,185 @@
+"""
+Instantané (snapshot) des données de la page d'accueil.
+
+Le contenu de /api/produit/home-data/ est calculé hors du chemin critique et
+stocké dans le cache Django. L'endpoint sert toujours l'instantané en cache
+(aucune requête SQL) ; s'il est périmé, il est servi tel quel pendant qu'un
+rafraîchissement est lancé en arrière-plan (stale-while-revalidate).
+
+L'instantané est reconstruit :
+- périodiquement par ``python manage.py refresh_home_feed --loop``
+- à la première requête qui le trouve périmé (plus vieux que
+  HOME_FEED_FRESH_SECONDS ou invalidé par une modification d'annonce)
+
+L'instantané est unique quel que soit l'hôte de la requête : ses URLs
+absolues sont construites sur settings.BACKEND_URL. Il est anonyme ;
+``with_favorites`` y reporte ensuite les favoris de l'utilisateur connecté.
+"""
+import logging
+import threading
+import time
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'produit:home-feed'
+GENERATION_KEY = 'produit:home-feed:generation'
+LOCK_KEY = 'produit:home-feed:lock'
+LOCK_TIMEOUT = 60
+AD_BLOCKS = ('featured_ads', 'recent_ads', 'urgent_ads')
+
+
+class SnapshotRequest:
+    """Requête anonyme minimale pour sérialiser hors du cycle requête/réponse"""
+
+    def __init__(self):
+        self.base_url = settings.BACKEND_URL.rstrip('/') + '/'
+        self.user = AnonymousUser()
+
+    def build_absolute_uri(self, location=None):
+        return urljoin(self.base_url, location or '')
+
+
+def build_home_payload():
+    """Calculer les données de la page d'accueil (requêtes SQL ici uniquement)"""
+    from .models import Ad, AdStatus, CATEGORY_CHOICES, CITY_CHOICES
+    from .sampling import featured_ads_sampler, urgent_ads_sampler
+    from .serializers import AdListSerializer
+
+    User = get_user_model()
+    now = timezone.now()
+    context = {'request': SnapshotRequest()}
+    active_ads = Ad.objects.for_listing().filter(status=AdStatus.ACTIVE, expires_at__gt=now)
+
+    # Annonces en vedette (aléatoires, non urgentes), récentes et urgentes.
+    # Le tirage aléatoire est pondéré par les boosts actifs.
+    featured_ads = featured_ads_sampler.sample(4, queryset=active_ads.filter(is_urgent=False))
+    recent_ads = active_ads.order_by('-created_at')[:12]
+    urgent_ads = urgent_ads_sampler.sample(4, queryset=active_ads.filter(is_urgent=True))
+
+    # Statistiques par catégorie : un seul GROUP BY
+    counts = dict(
+        Ad.objects.filter(status=AdStatus.ACTIVE)
+        .values_list('category')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    categories_stats = [
+        {'value': value, 'label': label, 'count': counts[value]}
+        for value, label in CATEGORY_CHOICES
+        if counts.get(value)
+    ]
+
+    stats = {
+        'total_ads': sum(counts.values()),
+        'total_users': User.objects.filter(is_active=True).count(),
+        'ads_today': Ad.objects.filter(
+            created_at__date=now.date(),
+            status=AdStatus.ACTIVE
+        ).count(),
+    }
+
+    return {
+        'featured_ads': AdListSerializer(featured_ads, many=True, context=context).data,
+        'recent_ads': AdListSerializer(recent_ads, many=True, context=context).data,
+        'urgent_ads': AdListSerializer(urgent_ads, many=True, context=context).data,
+        'categories': categories_stats,
+        'cities': [{'value': v, 'label': l} for v, l in CITY_CHOICES[:10]],  # Top 10 villes
+        'stats': stats,
+    }
+
+
+def current_generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def invalidate_home_feed():
+    """Marquer l'instantané comme périmé (il reste servi jusqu'au rafraîchissement)"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def refresh_home_feed():
+    """Reconstruire et stocker l'instantané, puis le renvoyer"""
+    generation = current_generation()
+    entry = {
+        'payload': build_home_payload(),
+        'built_at': time.time(),
+        'generation': generation,
+    }
+    cache.set(CACHE_KEY, entry, settings.HOME_FEED_MAX_AGE)
+    return entry
+
+
+def _refresh_locked():
+    try:
+        refresh_home_feed()
+    except Exception:
+        logger.exception("Rafraîchissement de la page d'accueil impossible")
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _refresh_in_thread():
+    try:
+        _refresh_locked()
+    finally:
+        connections.close_all()
+
+
+def schedule_refresh():
+    """Lancer un seul rafraîchissement à la fois (verrou dans le cache)"""
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return
+    if settings.HOME_FEED_ASYNC_REFRESH:
+        threading.Thread(target=_refresh_in_thread, daemon=True).start()
+    else:
+        _refresh_locked()
+
+
+def is_stale(entry):
+    age = time.time() - entry['built_at']
+    return age > settings.HOME_FEED_FRESH_SECONDS or entry['generation'] != current_generation()
+
+
+def get_home_payload():
+    """Servir l'instantané ; le construire de façon synchrone seulement s'il n'existe pas"""
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        entry = refresh_home_feed()
+    elif is_stale(entry):
+        schedule_refresh()
+    return entry['payload']
+
+
+def with_favorites(payload, user):
+    """
+    Instantané avec is_favorited propre à ``user`` : une requête sur ses
+    favoris parmi les annonces affichées, aucune pour un visiteur anonyme.
+    """
+    if not user.is_authenticated:
+        return payload
+    from .models import Favorite
+
+    ad_ids = {ad['id'] for block in AD_BLOCKS for ad in payload[block]}
+    favorited = {
+        str(ad_id)  # identifiants sérialisés en chaînes dans l'instantané
+        for ad_id in Favorite.objects.filter(user=user, ad_id__in=ad_ids).values_list('ad_id', flat=True)
+    }
+    return {
+        **payload,
+        **{
+            block: [{**ad, 'is_favorited': ad['id'] in favorited} for ad in payload[block]]
+            for block in AD_BLOCKS
+        },
+    }
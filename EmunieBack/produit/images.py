@@ -0,0 +1,313 @@
+"""
+Déclinaisons (dérivés) des images d'annonces.
+
+Pour chaque AdImage, l'original est redimensionné en plusieurs largeurs
+(thumb, card, full), encodé en WebP et en JPEG progressif, sans métadonnées
+EXIF (l'orientation EXIF est appliquée aux pixels avant d'être retirée). Les
+chemins et dimensions sont enregistrés dans ``AdImage.derivatives`` :
+
+    {'thumb': {'width': 240, 'height': 180, 'webp': '...', 'jpeg': '...'}, ...}
+
+Le traitement est confié à la file de tâches (tâche
+``produit.generate_image_derivatives``, voir l'app jobs) pour ne pas allonger
+la création d'annonce. Les images existantes se rattrapent via la commande
+``generate_image_derivatives``.
+
+``attach_images`` attache un lot d'images à une annonce en une fois (création
+et modification d'annonce) : validation en mémoire, écriture des fichiers en
+parallèle, un seul bulk_create. Les fichiers écrits sont supprimés si son
+bloc atomique échoue, ou le bloc ``atomic_with_files`` qui l'englobe.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Fichiers écrits dans le bloc atomic_with_files en cours
+_written_files = ContextVar('written_files', default=None)
+
+# Nom -> côté maximal en pixels (jamais agrandi)
+DERIVATIVE_SIZES = {
+    'thumb': 240,
+    'card': 480,
+    'full': 1280,
+}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+# Nombre maximal d'images par annonce
+MAX_IMAGES = 3
+
+# Orientations EXIF qui échangent largeur et hauteur
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def open_normalized(file):
+    """
+    Ouvrir l'original, appliquer l'orientation EXIF et passer en RGB.
+    Renvoie (image, (largeur, hauteur) de l'original une fois orienté).
+    """
+    image = Image.open(file)
+    width, height = image.size
+    if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    image.draft('RGB', (max(DERIVATIVE_SIZES.values()),) * 2)  # décodage JPEG réduit
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background, (width, height)
+    return image.convert('RGB'), (width, height)
+
+
+def render_derivatives(file):
+    """
+    Calculer les dérivés d'un fichier image.
+    Renvoie ((largeur, hauteur), {nom: (largeur, hauteur, {format: octets})}).
+    """
+    source, size = open_normalized(file)
+    with source:
+        rendered = {}
+        current = source
+        # Du plus grand au plus petit : chaque réduction part de la précédente
+        for name, max_side in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+            current = current.copy()
+            current.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            encoded = {}
+            for extension, options in FORMATS.items():
+                buffer = BytesIO()
+                current.save(buffer, **options)  # aucune métadonnée EXIF transmise
+                encoded[extension] = buffer.getvalue()
+            rendered[name] = (current.width, current.height, encoded)
+    return size, rendered
+
+
+def derivative_name(original_name, name, extension):
+    stem = os.path.splitext(original_name)[0]
+    return f'{stem}_{name}.{extension}'
+
+
+def generate_derivatives(ad_image):
+    """Générer, stocker et enregistrer les dérivés d'une AdImage"""
+    storage = ad_image.image.storage
+    with ad_image.image.open('rb') as file:
+        (width, height), rendered = render_derivatives(file)
+
+    old_paths = derivative_paths(ad_image)
+    derivatives = {}
+    for name, (derivative_width, derivative_height, encoded) in rendered.items():
+        entry = {'width': derivative_width, 'height': derivative_height}
+        for extension, content in encoded.items():
+            path = derivative_name(ad_image.image.name, name, extension)
+            if storage.exists(path):
+                storage.delete(path)
+            entry[extension] = storage.save(path, ContentFile(content))
+        derivatives[name] = entry
+
+    ad_image.width, ad_image.height, ad_image.derivatives = width, height, derivatives
+    type(ad_image).objects.filter(pk=ad_image.pk).update(
+        width=width, height=height, derivatives=derivatives
+    )
+    # Copie dénormalisée sur l'annonce si c'est son image primaire
+    type(ad_image)._meta.get_field('ad').related_model.objects.filter(
+        pk=ad_image.ad_id, primary_image_path=ad_image.image.name
+    ).update(primary_image_derivatives=derivatives)
+    stale = old_paths - derivative_paths(ad_image)
+    for path in stale:
+        storage.delete(path)
+    return derivatives
+
+
+def schedule_derivatives(ad_image):
+    """Mettre en file la génération des dérivés (exécutée par un worker run_jobs)"""
+    from .tasks import generate_image_derivatives
+    generate_image_derivatives.delay(ad_image.pk)
+
+
+def schedule_ad_derivatives(ad):
+    """Mettre en file la génération des dérivés de toutes les images d'une annonce"""
+    from .tasks import generate_ad_image_derivatives
+    generate_ad_image_derivatives.delay(str(ad.pk))
+
+
+def derivative_paths(ad_image):
+    return {
+        path
+        for entry in (ad_image.derivatives or {}).values()
+        for extension, path in entry.items()
+        if extension in FORMATS
+    }
+
+
+def delete_derivatives(ad_image):
+    """Supprimer les fichiers dérivés (l'original est géré par l'appelant)"""
+    storage = ad_image.image.storage
+    for path in derivative_paths(ad_image):
+        try:
+            storage.delete(path)
+        except Exception as e:
+            logger.warning('Suppression du dérivé %s impossible: %s', path, e)
+
+
+def build_srcset(ad_image, request=None):
+    """
+    Carte des dérivés pour le frontend :
+    {'thumb': {'width': 240, 'height': 180, 'webp': url, 'jpeg': url}, ...}
+    Vide tant que les dérivés n'ont pas été générés.
+    """
+    return srcset_from_derivatives(ad_image.derivatives, ad_image.image.storage, request)
+
+
+def srcset_from_derivatives(derivatives, storage, request=None):
+    """Même carte, à partir d'un dictionnaire de dérivés (ex. Ad.primary_image_derivatives)"""
+    srcset = {}
+    for name, entry in (derivatives or {}).items():
+        item = {'width': entry.get('width'), 'height': entry.get('height')}
+        for extension in FORMATS:
+            if entry.get(extension):
+                url = storage.url(entry[extension])
+                item[extension] = request.build_absolute_uri(url) if request else url
+        srcset[name] = item
+    return srcset
+
+
+def image_field():
+    from .models import AdImage
+    return AdImage._meta.get_field('image')
+
+
+def validate_image_set(files, existing=0):
+    """Valider un lot d'images en mémoire : nombre total (1 à 3), taille, extension"""
+    total = existing + len(files)
+    if total < 1:
+        raise ValidationError('Une annonce doit avoir au moins 1 image.')
+    if total > MAX_IMAGES:
+        raise ValidationError(f'Une annonce ne peut contenir que {MAX_IMAGES} images maximum.')
+    validators = image_field().validators
+    for file in files:
+        for validator in validators:
+            validator(file)
+
+
+def store_files(files):
+    """Écrire les fichiers dans le stockage en parallèle ; renvoie leurs noms"""
+    field = image_field()
+
+    def store(file):
+        name = field.generate_filename(None, file.name)
+        return field.storage.save(name, file, max_length=field.max_length)
+
+    with ThreadPoolExecutor(max_workers=min(len(files), MAX_IMAGES)) as executor:
+        futures = [executor.submit(store, file) for file in files]
+
+    names, errors = [], []
+    for future in futures:
+        try:
+            names.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        discard_files(names)
+        raise errors[0]
+    return names
+
+
+def discard_files(names):
+    storage = image_field().storage
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.warning('Suppression du fichier %s impossible: %s', name, e)
+
+
+@contextmanager
+def atomic_with_files(using=None):
+    """
+    transaction.atomic() qui supprime les fichiers d'images écrits dans le bloc
+    (liste renvoyée, alimentée aussi par attach_images) si le bloc échoue,
+    commit compris. Une exception levée par une fonction on_commit après le
+    commit ne supprime rien. Imbriqué, le bloc confie ses fichiers au bloc
+    englobant : ils ne restent que si la transaction externe aboutit.
+    """
+    parent = _written_files.get()
+    written = []
+    committed = []
+    token = _written_files.set(written)
+    try:
+        with transaction.atomic(using=using):
+            # Première fonction on_commit du bloc : exécutée avant les autres
+            transaction.on_commit(lambda: committed.append(True), using=using)
+            yield written
+    except BaseException:
+        if not committed:
+            discard_files(written)
+        raise
+    finally:
+        _written_files.reset(token)
+    if parent is not None:
+        parent.extend(written)
+
+
+def attach_images(ad, files, replace=False):
+    """
+    Attacher des images à une annonce : validation unique, fichiers écrits en
+    parallèle puis lignes insérées par un seul bulk_create (sans full_clean
+    par ligne). Avec ``replace``, les images existantes sont remplacées ; leurs
+    fichiers sont supprimés après le commit.
+
+    La première image devient primaire si l'annonce n'en a pas déjà une.
+    Lève ValidationError si le lot ne respecte pas la règle des 1 à 3 images.
+    """
+    from .home_feed import invalidate_home_feed
+    from .models import AdImage
+
+    files = list(files)
+    existing = list(ad.images.all())
+    kept = [] if replace else existing
+    validate_image_set(files, existing=len(kept))
+    if not files:
+        return []
+
+    used_orders = {image.order for image in kept}
+    free_orders = [order for order in range(MAX_IMAGES) if order not in used_orders]
+    has_primary = any(image.is_primary for image in kept)
+
+    with atomic_with_files() as written:
+        names = store_files(files)
+        written.extend(names)
+        images = [
+            AdImage(ad=ad, image=name, order=order, is_primary=(index == 0 and not has_primary))
+            for index, (name, order) in enumerate(zip(names, free_orders))
+        ]
+        if replace and existing:
+            AdImage.objects.filter(ad=ad).delete()
+        AdImage.objects.bulk_create(images)
+        ad.refresh_image_summary(kept + images)
+        schedule_ad_derivatives(ad)
+
+    if replace and existing:
+        transaction.on_commit(lambda: discard_images(existing))
+    invalidate_home_feed()
+    return images
+
+
+def discard_images(images):
+    """Supprimer les fichiers (originaux et dérivés) d'images déjà retirées de la base"""
+    for image in images:
+        if image.image:
+            delete_derivatives(image)
+            discard_files([image.image.name])
@@ -0,0 +1,88 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesurer le surcoût de connexion à la base par requête, sans et avec "
+        "connexions persistantes, et estimer le besoin en max_connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requêtes simulées par mode')
+        parser.add_argument('--queries', type=int, default=3, help='Requêtes SQL par requête HTTP simulée')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--workers', type=int, default=int(os.environ.get('GUNICORN_WORKERS', 0)) or None)
+        parser.add_argument('--threads', type=int, default=int(os.environ.get('GUNICORN_THREADS', 4)))
+        parser.add_argument('--replicas', type=int, default=1, help='Conteneurs backend')
+
+    def simulate(self, connection, conn_max_age, health_checks, count, queries):
+        """Cycle requête complet : signaux request_started/finished inclus"""
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+
+        durations = []
+        for _ in range(count):
+            started = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+            durations.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        return durations
+
+    def report(self, label, durations):
+        ordered = sorted(durations)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        self.stdout.write(
+            f'{label:<38} moyenne {statistics.mean(ordered):7.2f} ms   '
+            f'médiane {statistics.median(ordered):7.2f} ms   p95 {p95:7.2f} ms'
+        )
+        return statistics.mean(ordered)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        original = {key: connection.settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        count, queries = max(options['requests'], 1), options['queries']
+
+        self.stdout.write(f"Base : {connection.vendor} ({connection.settings_dict.get('HOST') or 'local'})")
+        try:
+            before = self.report(
+                'Sans persistance (CONN_MAX_AGE=0)',
+                self.simulate(connection, 0, False, count, queries),
+            )
+            after = self.report(
+                'Persistante + health checks',
+                self.simulate(connection, 600, True, count, queries),
+            )
+            self.report(
+                'Persistante sans health checks',
+                self.simulate(connection, 600, False, count, queries),
+            )
+        finally:
+            connection.settings_dict.update(original)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Surcoût de connexion évité : {before - after:.2f} ms par requête '
+            f'({(before - after) / before * 100 if before else 0:.0f} %)'
+        ))
+
+        # Dimensionnement : même calcul que gunicorn.conf.py
+        workers = options['workers'] or (os.cpu_count() or 1) * 2 + 1
+        per_container = workers * (options['threads'] + 2)
+        total = per_container * options['replicas']
+        self.stdout.write(
+            f'Connexions persistantes : {per_container} par conteneur '
+            f"({workers} workers x ({options['threads']} threads + 2 threads de fond)), "
+            f"{total} pour {options['replicas']} conteneur(s). "
+            f'Prévoir max_connections >= {total + 10} (marge pour migrations, admin, cron).'
+        )
@@ -0,0 +1,68 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from produit.models import Ad
+from produit.slugs import base_slug, create_with_unique_slug
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesurer la création d'annonces dont le titre existe déjà N fois "
+        "(tout est annulé en fin de mesure)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--title', default='iPhone 13')
+        parser.add_argument('--duplicates', type=int, default=10000, help='Annonces existantes de même titre')
+        parser.add_argument('--creates', type=int, default=50, help='Créations mesurées')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        user = get_user_model().objects.create(username=f'benchmark-slugs-{time.time_ns()}')
+        title = options['title']
+        expires_at = timezone.now() + timedelta(days=30)
+
+        # Doublons existants, nommés comme l'ancien algorithme (-1, -2, ...)
+        slug = base_slug(title)
+        Ad.objects.bulk_create(
+            [
+                Ad(user=user, title=title, slug=slug if i == 0 else f'{slug}-{i}', expires_at=expires_at)
+                for i in range(options['duplicates'])
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{options['duplicates']} annonce(s) « {title} » existantes")
+
+        durations, query_counts = [], []
+        for _ in range(options['creates']):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                create_with_unique_slug(
+                    title,
+                    lambda slug: Ad.objects.create(user=user, title=title, slug=slug, expires_at=expires_at),
+                )
+                durations.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['creates']} création(s) : moyenne {statistics.mean(durations):.2f} ms, "
+            f"max {max(durations):.2f} ms, requêtes par création {min(query_counts)}-{max(query_counts)}"
+        ))
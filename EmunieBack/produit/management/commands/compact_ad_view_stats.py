@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from produit.tracking import ad_views_buffer, compact_ad_view_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculer les cumuls journaliers des vues (AdViewDailyStat) depuis AdView. "
+        "À planifier chaque nuit ; --all pour l'initialisation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Nombre de jours recalculés (aujourd\'hui inclus)')
+        parser.add_argument('--all', action='store_true', help='Recalculer tout l\'historique')
+
+    def handle(self, *args, **options):
+        since = None
+        if not options['all']:
+            since = timezone.now().date() - timedelta(days=max(options['days'], 1) - 1)
+
+        with ad_views_buffer.lock() as acquired:
+            if not acquired:
+                raise CommandError('Vidage des vues en cours, réessayer dans quelques secondes.')
+            created = compact_ad_view_stats(since)
+
+        scope = "tout l'historique" if since is None else f'depuis le {since.isoformat()}'
+        self.stdout.write(self.style.SUCCESS(f'{created} cumul(s) journalier(s) recalculé(s), {scope}.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from produit.expiry import expire_ads, expired_ads
+
+
+class Command(BaseCommand):
+    help = "Passer les annonces échues au statut « expirée » (à planifier via cron ou --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Annonces par UPDATE')
+        parser.add_argument('--pause', type=float, default=0.05, help='Secondes de pause entre deux lots')
+        parser.add_argument('--dry-run', action='store_true', help='Compter sans modifier')
+        parser.add_argument('--loop', action='store_true', help='Balayer en continu')
+        parser.add_argument('--interval', type=int, default=300, help='Secondes entre deux balayages (avec --loop)')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{expired_ads().count()} annonce(s) à expirer')
+            return
+
+        while True:
+            started = time.monotonic()
+            count = expire_ads(batch_size=options['batch_size'], pause=options['pause'])
+            self.stdout.write(f'{count} annonce(s) expirée(s) en {time.monotonic() - started:.2f}s')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
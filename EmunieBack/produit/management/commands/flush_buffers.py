@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from produit.buffering import buffering_enabled, flush_all, get_buffers
+
+
+class Command(BaseCommand):
+    help = (
+        "Vider les files d'écriture différée (vues d'annonces...). "
+        "À lancer à l'arrêt, une fois les workers arrêtés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-gaps', action='store_true',
+            help="Ne pas ignorer les événements en cours d'écriture (workers encore actifs)",
+        )
+
+    def handle(self, *args, **options):
+        if not buffering_enabled():
+            # Sans cache partagé, les événements sont écrits directement en base
+            self.stdout.write('Écriture différée inactive (EVENT_BUFFERING, cache Redis) : rien à vider.')
+            return
+        results = flush_all(final=not options['keep_gaps'])
+        for name, count in results.items():
+            pending = get_buffers()[name].pending()
+            self.stdout.write(f'{name}: {count} événement(s) appliqué(s), {pending} en attente')
+        self.stdout.write(self.style.SUCCESS('Files vidées.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from produit.images import generate_derivatives
+from produit.models import AdImage
+
+
+class Command(BaseCommand):
+    help = "Générer les déclinaisons (thumb/card/full, WebP et JPEG) des images d'annonces"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Régénérer aussi les images déjà traitées')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for ad_image in AdImage.objects.order_by('pk').iterator(chunk_size=options['batch_size']):
+            if ad_image.derivatives and not options['force']:
+                continue
+            try:
+                generate_derivatives(ad_image)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Image {ad_image.pk} ({ad_image.image.name}) : {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'{generated} image(s) traitée(s), {failed} échec(s).'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from produit.models import Ad
+from produit.search import build_search_document, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recalculer les documents de recherche et reconstruire l'index plein texte des annonces"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        updated = 0
+
+        for ad in Ad.objects.only('pk', 'title', 'description', 'search_document').iterator(chunk_size=batch_size):
+            document = build_search_document(ad)
+            if document != ad.search_document:
+                ad.search_document = document
+                batch.append(ad)
+            if len(batch) >= batch_size:
+                updated += Ad.objects.bulk_update(batch, ['search_document'])
+                batch = []
+        if batch:
+            updated += Ad.objects.bulk_update(batch, ['search_document'])
+
+        get_search_backend().rebuild(Ad.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} document(s) mis à jour, index reconstruit.'
+        ))
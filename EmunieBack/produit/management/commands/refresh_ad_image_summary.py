@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from produit.models import Ad
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifier et réparer le résumé des images des annonces "
+        "(primary_image_path, primary_image_derivatives, images_count)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Lister les écarts sans les corriger')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        checked = repaired = 0
+        queryset = Ad.objects.only(
+            'pk', 'primary_image_path', 'primary_image_derivatives', 'images_count'
+        ).prefetch_related('images').order_by('pk')
+        for ad in queryset.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            summary = ad.image_summary()
+            if all(getattr(ad, field) == value for field, value in summary.items()):
+                continue
+            repaired += 1
+            if options['dry_run']:
+                self.stdout.write(
+                    f'Annonce {ad.pk} : {ad.images_count} -> {summary["images_count"]} image(s), '
+                    f'primaire {ad.primary_image_path!r} -> {summary["primary_image_path"]!r}'
+                )
+            else:
+                Ad.objects.filter(pk=ad.pk).update(**summary)
+
+        verb = 'à corriger' if options['dry_run'] else 'corrigée(s)'
+        self.stdout.write(self.style.SUCCESS(f'{checked} annonce(s) vérifiée(s), {repaired} {verb}.'))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from produit.home_feed import refresh_home_feed
+
+
+class Command(BaseCommand):
+    help = "Reconstruire l'instantané de la page d'accueil (à planifier via cron ou --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Rafraîchir en continu')
+        parser.add_argument(
+            '--interval', type=int, default=settings.HOME_FEED_FRESH_SECONDS,
+            help='Secondes entre deux rafraîchissements (avec --loop)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            refresh_home_feed()
+            self.stdout.write(f"Page d'accueil rafraîchie en {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
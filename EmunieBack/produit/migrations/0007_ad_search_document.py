@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """Créer l'index plein texte propre au moteur de base de données"""
+    from produit.search import SQLiteFTSBackend
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX produit_ad_search_ft ON produit_ad (search_document)'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX produit_ad_search_gin ON produit_ad '
+            "USING GIN (to_tsvector('simple', search_document))"
+        )
+    elif vendor == 'sqlite':
+        SQLiteFTSBackend.create_table(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from produit.search import SQLiteFTSBackend
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('DROP INDEX produit_ad_search_ft ON produit_ad')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS produit_ad_search_gin')
+    elif vendor == 'sqlite':
+        SQLiteFTSBackend.drop_table(schema_editor)
+
+
+def backfill_search_documents(apps, schema_editor):
+    """Calculer le document de recherche des annonces existantes"""
+    from produit.search import build_search_document
+
+    Ad = apps.get_model('produit', 'Ad')
+    vendor = schema_editor.connection.vendor
+    for ad in Ad.objects.only('pk', 'title', 'description').iterator():
+        document = build_search_document(ad)
+        Ad.objects.filter(pk=ad.pk).update(search_document=document)
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                'INSERT INTO produit_ad_fts (ad_id, document) VALUES (%s, %s)',
+                [Ad._meta.pk.get_db_prep_value(ad.pk, schema_editor.connection), document],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produit', '0006_alter_ad_description_alter_ad_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
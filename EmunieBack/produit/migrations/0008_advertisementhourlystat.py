@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produit', '0007_ad_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertisementHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('impressions', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='produit.advertisement')),
+            ],
+            options={
+                'verbose_name': 'Statistique horaire de publicité',
+                'verbose_name_plural': 'Statistiques horaires de publicités',
+                'ordering': ['hour'],
+                'unique_together': {('advertisement', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produit', '0008_advertisementhourlystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdViewDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_ips', models.PositiveIntegerField(default=0)),
+                ('authenticated', models.PositiveIntegerField(default=0)),
+                ('anonymous', models.PositiveIntegerField(default=0)),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='produit.ad')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('ad', 'day')},
+            },
+        ),
+    ]
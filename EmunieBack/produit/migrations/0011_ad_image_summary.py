@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+def backfill_image_summary(apps, schema_editor):
+    """Remplir le résumé des images des annonces existantes (même règle qu'Ad.image_summary)"""
+    Ad = apps.get_model('produit', 'Ad')
+    AdImage = apps.get_model('produit', 'AdImage')
+    images_by_ad = {}
+    for image in AdImage.objects.order_by('ad_id', '-is_primary', 'order', 'created_at').iterator():
+        images_by_ad.setdefault(image.ad_id, []).append(image)
+    for ad_id, images in images_by_ad.items():
+        Ad.objects.filter(pk=ad_id).update(
+            primary_image_path=images[0].image.name or '',
+            primary_image_derivatives=images[0].derivatives or {},
+            images_count=len(images),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produit', '0010_adimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='images_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nb Images'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='primary_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='primary_image_path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_image_summary, migrations.RunPython.noop),
+    ]
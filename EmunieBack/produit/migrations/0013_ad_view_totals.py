@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:07
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_view_totals(apps, schema_editor):
+    """Totaux de vues des annonces existantes, depuis AdView (même règle que produit.tracking)"""
+    Ad = apps.get_model('produit', 'Ad')
+    AdView = apps.get_model('produit', 'AdView')
+    rows = (
+        AdView.objects
+        .values('ad_id')
+        .annotate(
+            unique_visitors=Count('ip_address', distinct=True),
+            authenticated_views=Count('id', filter=Q(user__isnull=False)),
+            anonymous_views=Count('id', filter=Q(user__isnull=True)),
+        )
+        .order_by()
+    )
+    for row in rows.iterator():
+        Ad.objects.filter(pk=row.pop('ad_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produit', '0012_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='anonymous_views',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='authenticated_views',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='unique_visitors',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_view_totals, migrations.RunPython.noop),
+    ]
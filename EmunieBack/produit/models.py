@@ -96,6 +96,23 @@ class AdType(models.TextChoices):
     JOB_OFFER = 'job_offer', 'Offre d\'emploi'
     JOB_SEEK = 'job_seek', 'Recherche d\'emploi'
 
+class AdQuerySet(models.QuerySet):
+    def for_listing(self, user=None):
+        """
+        Précharger tout ce qu'affiche AdListSerializer : auteur et favori de
+        l'utilisateur courant (sous-requête EXISTS annotée). L'image primaire
+        et le nombre d'images sont dénormalisés sur Ad.
+        """
+        queryset = self.select_related('user')
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                user_has_favorited=models.Exists(
+                    Favorite.objects.filter(ad=models.OuterRef('pk'), user=user)
+                )
+            )
+        return queryset
+
+
 class Ad(models.Model):
     """Modèle principal pour les annonces"""
     # Identification
@@ -150,6 +167,11 @@ class Ad(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     favorites_count = models.PositiveIntegerField(default=0)
 
+    # Totaux de vues depuis la publication, tenus à jour par produit.tracking
+    unique_visitors = models.PositiveIntegerField(default=0, editable=False)
+    authenticated_views = models.PositiveIntegerField(default=0, editable=False)
+    anonymous_views = models.PositiveIntegerField(default=0, editable=False)
+
     # Contact
     #contact_phone = models.CharField(max_length=20, blank=True)
     contact_email = models.EmailField(blank=True)
@@ -167,12 +189,32 @@ class Ad(models.Model):
     moderated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='moderated_ads')
     rejection_reason = models.TextField(blank=True)
 
+    # Recherche plein texte (titre + description normalisés, voir produit.search)
+    search_document = models.TextField(blank=True, editable=False)
+
+    # Résumé des images, tenu à jour par AdImage (voir refresh_image_summary)
+    primary_image_path = models.CharField(max_length=255, blank=True, editable=False)
+    primary_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    images_count = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nb Images')
+
+    objects = AdQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'category', 'city']),
             models.Index(fields=['created_at', 'is_featured']),
             models.Index(fields=['price', 'category']),
+            # Listes publiques : status='active' (les échues sont balayées par
+            # expire_ads), tri par défaut de AdListView et de la pagination keyset
+            models.Index(fields=['status', '-is_featured', '-is_urgent', '-created_at'], name='ad_listing_idx'),
+            models.Index(
+                fields=['status', 'category', '-is_featured', '-is_urgent', '-created_at'],
+                name='ad_category_listing_idx',
+            ),
+            # Balayage des annonces échues. expires_at en tête : l'index n'attire
+            # pas les listes publiques (expires_at > now), servies par le tri
+            models.Index(fields=['expires_at', 'status'], name='ad_expiry_idx'),
         ]
 
     def __str__(self):
@@ -187,9 +229,31 @@ class Ad(models.Model):
     def is_expired(self):
         return self.expires_at <= timezone.now()
 
-    @property
-    def images_count(self):
-        return self.images.count()
+    def image_summary(self, images=None):
+        """
+        Image primaire (ou la première) et nombre d'images. Sans ``images``,
+        lit self.images (utilise un éventuel prefetch).
+        """
+        if images is None:
+            images = self.images.all()
+        images = sorted(images, key=lambda img: (not img.is_primary, img.order))
+        primary = images[0] if images else None
+        return {
+            'primary_image_path': primary.image.name if primary and primary.image else '',
+            'primary_image_derivatives': primary.derivatives if primary else {},
+            'images_count': len(images),
+        }
+
+    def refresh_image_summary(self, images=None):
+        """
+        Recalculer primary_image_path, primary_image_derivatives et images_count.
+        Écrit par update() : ni save(), ni updated_at, ni réindexation.
+        """
+        summary = self.image_summary(images)
+        for field, value in summary.items():
+            setattr(self, field, value)
+        Ad.objects.filter(pk=self.pk).update(**summary)
+        return summary
 
     def clean(self):
         """Validation personnalisée"""
@@ -203,10 +267,37 @@ class Ad(models.Model):
             if images_count > 3:
                 raise ValidationError('Une annonce ne peut avoir que 3 images maximum.')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Document tel qu'indexé : un enregistrement qui ne le change pas ne réindexe pas
+        instance._indexed_document = instance.__dict__.get('search_document')
+        return instance
+
     def save(self, *args, **kwargs):
+        from .search import SEARCH_FIELDS, build_search_document, index_ad
+        from .slugs import allocate_slug
+
+        if not self.slug:
+            self.slug = allocate_slug(self.title, exclude_pk=self.pk)
+
         if self.status == AdStatus.ACTIVE and not self.published_at:
             self.published_at = timezone.now()
+
+        # Maintenir le document de recherche à jour, seulement si titre ou
+        # description peuvent avoir changé (la suppression : signals.ad_deleted)
+        update_fields = kwargs.get('update_fields')
+        reindex = update_fields is None or bool(set(SEARCH_FIELDS) & set(update_fields))
+        if reindex:
+            self.search_document = build_search_document(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_document'}
+            reindex = self.search_document != getattr(self, '_indexed_document', None)
+
         super().save(*args, **kwargs)
+        if reindex:
+            index_ad(self)
+            self._indexed_document = self.search_document
 
 
 def validate_image_size(image):
@@ -232,6 +323,11 @@ class AdImage(models.Model):
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Dimensions de l'original et déclinaisons redimensionnées (produit.images)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
     class Meta:
         ordering = ['order', 'created_at']
         unique_together = [['ad', 'order']]
@@ -266,21 +362,32 @@ class AdImage(models.Model):
                 self.is_primary = True
                 self.order = 0
 
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        self.ad.refresh_image_summary()
+
+        # Générer les déclinaisons hors de la requête
+        if adding and self.image:
+            from .images import schedule_derivatives
+            schedule_derivatives(self)
 
     def delete(self, *args, **kwargs):
         """Empêcher la suppression si c'est la dernière image"""
         if self.ad.images.count() <= 1:
             raise ValidationError('Impossible de supprimer la dernière image. Une annonce doit avoir au moins 1 image.')
 
-        # Supprimer le fichier physique
+        # Supprimer le fichier physique et ses déclinaisons
         if self.image:
+            from .images import delete_derivatives
+            delete_derivatives(self)
             try:
                 self.image.delete(save=False)
             except Exception as e:
                 print(f"Erreur lors de la suppression de l'image: {e}")
 
-        super().delete(*args, **kwargs)
+        result = super().delete(*args, **kwargs)
+        self.ad.refresh_image_summary()
+        return result
 
 
 class AdAttribute(models.Model):
@@ -356,6 +463,25 @@ class AdView(models.Model):
     def __str__(self):
         return f"View for {self.ad.title}"
 
+class AdViewDailyStat(models.Model):
+    """
+    Vues d'une annonce agrégées par jour, alimentées par le vidage des vues
+    (produit.tracking) et recalculables via compact_ad_view_stats
+    """
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_ips = models.PositiveIntegerField(default=0)
+    authenticated = models.PositiveIntegerField(default=0)
+    anonymous = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ('ad', 'day')
+
+    def __str__(self):
+        return f"{self.ad.title} - {self.day}"
+
 class AdReport(models.Model):
     """Signalements d'annonces"""
     REPORT_REASONS = [
@@ -463,4 +589,20 @@ class Advertisement(models.Model):
         """Calcul du taux de clic (Click Through Rate)"""
         if self.impressions == 0:
             return 0
-        return (self.clicks / self.impressions) * 100
\ No newline at end of file
+        return (self.clicks / self.impressions) * 100
+
+class AdvertisementHourlyStat(models.Model):
+    """Impressions et clics d'une publicité agrégés par heure"""
+    advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='hourly_stats')
+    hour = models.DateTimeField()
+    impressions = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['hour']
+        unique_together = ('advertisement', 'hour')
+        verbose_name = 'Statistique horaire de publicité'
+        verbose_name_plural = 'Statistiques horaires de publicités'
+
+    def __str__(self):
+        return f"{self.advertisement.title} - {self.hour:%Y-%m-%d %H}h"
@@ -0,0 +1,157 @@
+"""
+Pagination par curseur (keyset) pour les listes d'annonces.
+
+Contrairement à PageNumberPagination, aucune requête COUNT(*) n'est émise et
+aucun OFFSET n'est utilisé : chaque page filtre sur la position de la dernière
+ligne de la page précédente selon le tri composite. Le coût d'une page est donc
+le même en page 1 et en page 500.
+"""
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination keyset générique sur un tri composite.
+
+    ``ordering`` doit se terminer par un champ unique (la clé primaire) et ne
+    contenir que des champs non NULL. Les curseurs sont signés (opaques et
+    infalsifiables) et restent valides tant que le tri ne change pas.
+    """
+    ordering = ('-pk',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    include_total_query_param = 'include_total'
+    total_cache_timeout = 300
+    cursor_salt = 'produit.pagination.keyset'
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.total = None
+
+        if request.query_params.get(self.include_total_query_param):
+            self.total = self.get_approximate_total(queryset, request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.build_position_filter(queryset.model, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.total is not None:
+            payload['count'] = self.total
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': 'Total approximatif (si include_total=1)'},
+                'results': schema,
+            },
+        }
+
+    # ----- Curseurs -----
+
+    @staticmethod
+    def split_ordering(ordering):
+        """('-created_at', 'pk') -> [('created_at', True), ('pk', False)]"""
+        return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def get_position(self, instance):
+        return [getattr(instance, field) for field, _ in self.split_ordering(self.ordering)]
+
+    def encode_cursor(self, position):
+        values = [value if isinstance(value, (bool, int)) else str(value) for value in position]
+        return signing.dumps(values, salt=self.cursor_salt, compress=True)
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+        return self.load_cursor(raw)
+
+    def load_cursor(self, raw):
+        try:
+            values = signing.loads(raw, salt=self.cursor_salt)
+        except signing.BadSignature:
+            raise NotFound(self.invalid_cursor_message)
+        fields = self.split_ordering(self.ordering)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def build_position_filter(self, model, position, ordering=None):
+        """
+        Condition « strictement après la position » sur le tri composite
+        (``self.ordering`` par défaut) :
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        condition = Q()
+        equal = Q()
+        for (field, descending), raw_value in zip(self.split_ordering(ordering or self.ordering), position):
+            model_field = model._meta.pk if field == 'pk' else model._meta.get_field(field)
+            value = model_field.to_python(raw_value)
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.include_total_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    # ----- Total approximatif -----
+
+    def get_approximate_total(self, queryset, request):
+        """
+        Total mis en cache quelques minutes par combinaison de filtres : un
+        seul COUNT(*) par requête distincte et par période.
+        """
+        ignored = {self.cursor_query_param, self.page_size_query_param, self.include_total_query_param}
+        params = sorted(
+            (key, value) for key, value in request.query_params.lists() if key not in ignored
+        )
+        digest = hashlib.sha1(f'{request.path}|{params}'.encode()).hexdigest()
+        key = f'keyset-total:{digest}'
+        total = cache.get(key)
+        if total is None:
+            total = queryset.order_by().count()
+            cache.set(key, total, self.total_cache_timeout)
+        return total
+
+
+class AdCursorPagination(KeysetPagination):
+    """Tri de AdListView : mises en avant, urgentes, puis plus récentes"""
+    ordering = ('-is_featured', '-is_urgent', '-created_at', 'id')
@@ -0,0 +1,249 @@
+"""
+Échantillonnage aléatoire sans ORDER BY RAND().
+
+``order_by('?')`` oblige MySQL à trier tout l'ensemble des candidats à chaque
+requête. Ici, un pool d'identifiants candidats (et leurs poids) est calculé
+périodiquement et mis en cache ; chaque requête tire k identifiants dans ce
+pool en mémoire puis charge les lignes par clé primaire.
+
+Au-delà de ``max_pool_size`` candidats, le pool est formé de fenêtres de clés
+primaires qui démarrent à des pivots aléatoires (``pk >= pivot ORDER BY pk
+LIMIT n``) : quelques parcours d'index courts au lieu d'un tri complet. Un
+pool périmé reste servi pendant qu'un seul processus le reconstruit en
+arrière-plan (verrou dans le cache) ; seul un pool absent est construit
+pendant la requête.
+
+Les poids permettent de favoriser les annonces boostées proportionnellement
+au ``boost_multiplier`` de leur package (monetisation.AdBoost).
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 60
+
+
+def random_pivot(low, high):
+    """Clé primaire aléatoire entre ``low`` et ``high`` (entiers ou UUID)"""
+    if isinstance(low, uuid.UUID):
+        return uuid.UUID(int=random.randint(low.int, high.int))
+    return random.randint(low, high)
+
+
+class RandomSampler:
+    """
+    Tirage de k objets parmi les candidats d'un queryset.
+
+    - ``queryset_factory()`` renvoie le queryset des candidats (réévalué au
+      chargement pour écarter les lignes devenues inéligibles)
+    - ``weights_factory(queryset)`` renvoie {pk: poids} pour les candidats
+      ayant un poids différent de 1 (optionnel)
+    - au-delà de ``max_pool_size`` candidats, le pool est un sous-ensemble
+      aléatoire (``windows`` fenêtres de clés) renouvelé à chaque
+      rafraîchissement
+    - le pool est rafraîchi après ``pool_timeout`` secondes et conservé
+      ``max_age`` secondes pour être servi pendant le rafraîchissement
+    """
+
+    def __init__(self, name, queryset_factory, weights_factory=None,
+                 pool_timeout=300, max_pool_size=2000, windows=4, max_age=None):
+        self.cache_key = f'sampling:pool:{name}'
+        self.lock_key = f'sampling:lock:{name}'
+        self.queryset_factory = queryset_factory
+        self.weights_factory = weights_factory
+        self.pool_timeout = pool_timeout
+        self.max_pool_size = max_pool_size
+        self.windows = windows
+        self.max_age = max_age or pool_timeout * 12
+
+    # ----- Pool d'identifiants -----
+
+    def build_pool(self):
+        queryset = self.queryset_factory().order_by()
+        weights = {}
+        if self.weights_factory:
+            weights = {pk: w for pk, w in self.weights_factory(queryset).items() if w > 0}
+
+        ids = list(queryset.values_list('pk', flat=True)[:self.max_pool_size + 1])
+        if len(ids) > self.max_pool_size:
+            ids = self.window_ids(queryset)
+
+        # Les candidats pondérés font toujours partie du pool
+        ids = list(dict.fromkeys(list(weights) + ids))
+        pool = {'ids': ids, 'cum_weights': None, 'built_at': time.time()}
+        if weights:
+            pool['cum_weights'] = list(accumulate(float(weights.get(pk, 1)) for pk in ids))
+        cache.set(self.cache_key, pool, self.max_age)
+        return pool
+
+    def window_ids(self, queryset):
+        """
+        Environ ``max_pool_size`` candidats pris dans des fenêtres de clés
+        primaires à partir de pivots aléatoires, en repartant du début de
+        l'index quand une fenêtre en atteint la fin.
+        """
+        size = math.ceil(self.max_pool_size / self.windows)
+        bounds = queryset.model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+        ids = []
+        for _ in range(self.windows):
+            pivot = random_pivot(bounds['low'], bounds['high'])
+            keys = queryset.order_by('pk').values_list('pk', flat=True)
+            window = list(keys.filter(pk__gte=pivot)[:size])
+            if len(window) < size:
+                window += keys.filter(pk__lt=pivot)[:size - len(window)]
+            ids += window
+        return list(dict.fromkeys(ids))
+
+    def rebuild(self):
+        """Reconstruire le pool si aucun autre processus ne le fait ; None sinon"""
+        if not cache.add(self.lock_key, 1, LOCK_TIMEOUT):
+            return None
+        return self._rebuild_locked()
+
+    def _rebuild_locked(self):
+        try:
+            return self.build_pool()
+        except Exception:
+            logger.exception('Reconstruction du pool %s impossible', self.cache_key)
+        finally:
+            cache.delete(self.lock_key)
+
+    def _rebuild_in_thread(self):
+        try:
+            self._rebuild_locked()
+        finally:
+            connections.close_all()
+
+    def schedule_rebuild(self):
+        """Lancer une seule reconstruction à la fois, en arrière-plan"""
+        if not cache.add(self.lock_key, 1, LOCK_TIMEOUT):
+            return
+        if settings.SAMPLING_ASYNC_REFRESH:
+            threading.Thread(target=self._rebuild_in_thread, daemon=True).start()
+        else:
+            self._rebuild_locked()
+
+    def get_pool(self):
+        """Pool en cache, reconstruit en arrière-plan s'il est périmé"""
+        pool = cache.get(self.cache_key)
+        if pool is None:
+            return self.build_pool()
+        if time.time() - pool.get('built_at', 0) > self.pool_timeout:
+            self.schedule_rebuild()
+        return pool
+
+    def invalidate(self):
+        cache.delete(self.cache_key)
+
+    # ----- Tirage -----
+
+    def sample_ids(self, k=None):
+        """Tirer k identifiants distincts (tous, mélangés, si k est None)"""
+        pool = self.get_pool()
+        ids, cum_weights = pool['ids'], pool['cum_weights']
+        if k is None or k >= len(ids):
+            k = len(ids)
+
+        if cum_weights is None:
+            return random.sample(ids, k)
+
+        # Tirages pondérés avec remise, dédoublonnés : O(k log n) en moyenne
+        chosen = {}
+        attempts = 0
+        while len(chosen) < k and attempts < 10 * k:
+            for pk in random.choices(ids, cum_weights=cum_weights, k=k - len(chosen)):
+                chosen.setdefault(pk, None)
+            attempts += k
+        if len(chosen) < k:
+            remaining = [pk for pk in ids if pk not in chosen]
+            chosen.update(dict.fromkeys(random.sample(remaining, k - len(chosen))))
+        return list(chosen)
+
+    def sample(self, k=None, queryset=None):
+        """
+        Charger k objets tirés au hasard, dans l'ordre du tirage.
+
+        Quelques identifiants supplémentaires sont tirés pour compenser les
+        candidats devenus inéligibles depuis la construction du pool ; si
+        cela ne suffit pas, le pool est jugé périmé et reconstruit une fois,
+        sauf si un autre processus est déjà en train de le faire.
+        """
+        if queryset is None:
+            queryset = self.queryset_factory()
+        margin = 0 if k is None else max(2, k // 2)
+        draw = None if k is None else k + margin
+
+        ids = self.sample_ids(draw)
+        objects = queryset.in_bulk(ids)
+        if k is not None and len(objects) < min(k, len(ids)) and self.rebuild():
+            ids = self.sample_ids(draw)
+            objects = queryset.in_bulk(ids)
+
+        sampled = [objects[pk] for pk in ids if pk in objects]
+        return sampled if k is None else sampled[:k]
+
+
+# ----- Échantillonneurs des annonces et publicités -----
+
+def active_ads():
+    from .models import Ad, AdStatus
+    return Ad.objects.filter(status=AdStatus.ACTIVE, expires_at__gt=timezone.now())
+
+
+def boost_weights(queryset):
+    """{ad_id: boost_multiplier} des annonces ayant un boost actif"""
+    from monetisation.models import AdBoost
+
+    now = timezone.now()
+    rows = (
+        AdBoost.objects
+        .filter(is_active=True, start_date__lte=now, end_date__gt=now, ad__in=queryset)
+        .order_by()
+        .values('ad_id')
+        .annotate(multiplier=Max('package__boost_multiplier'))
+        .values_list('ad_id', 'multiplier')
+    )
+    return {ad_id: Decimal(multiplier or 1) for ad_id, multiplier in rows}
+
+
+def running_advertisements():
+    from .models import Advertisement
+    now = timezone.now()
+    return Advertisement.objects.filter(
+        is_active=True,
+        is_approved=True,
+        start_date__lte=now,
+        end_date__gte=now
+    )
+
+
+featured_ads_sampler = RandomSampler(
+    'featured-ads',
+    lambda: active_ads().filter(is_urgent=False),
+    weights_factory=boost_weights,
+)
+
+urgent_ads_sampler = RandomSampler(
+    'urgent-ads',
+    lambda: active_ads().filter(is_urgent=True),
+    weights_factory=boost_weights,
+)
+
+advertisements_sampler = RandomSampler(
+    'advertisements',
+    running_advertisements,
+    pool_timeout=60,
+)
@@ -0,0 +1,282 @@
+"""
+Recherche plein texte des annonces.
+
+Chaque annonce porte un champ ``search_document`` contenant le titre et la
+description normalisés (minuscules, sans accents ni ponctuation). Ce champ est
+indexé différemment selon le moteur de base de données :
+
+- MySQL : index FULLTEXT interrogé en mode booléen (``MATCH ... AGAINST``)
+- PostgreSQL : index GIN sur ``to_tsvector('simple', search_document)``
+- SQLite : table FTS5 annexe ``produit_ad_fts`` (utilisée par les tests)
+
+Le backend peut être forcé via ``settings.AD_SEARCH_BACKEND`` (chemin pointé).
+
+L'index suit ``Ad.save`` (quand titre ou description changent) et toute
+suppression, y compris en masse ou en cascade (signal post_delete). Une mise à
+jour en masse du titre ou de la description (``queryset.update``) contourne
+``save`` : relancer ``python manage.py rebuild_search_index``.
+"""
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Mots vides français ignorés à l'indexation et à la recherche
+STOP_WORDS = {
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en',
+    'et', 'il', 'la', 'le', 'les', 'leur', 'ma', 'mes', 'mon', 'ou', 'par',
+    'pas', 'pour', 'qui', 'que', 'sa', 'se', 'ses', 'son', 'sur', 'ta', 'te',
+    'tes', 'ton', 'un', 'une', 'vos', 'votre',
+}
+
+MAX_QUERY_TERMS = 8
+
+# Champs d'Ad dont dépend le document indexé
+SEARCH_FIELDS = ('title', 'description')
+
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_text(text):
+    """Mettre en minuscules, retirer les accents et la ponctuation"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD_RE.sub(' ', without_accents.lower()).strip()
+
+
+def tokenize(text):
+    """Découper un texte en termes indexables"""
+    return [
+        token for token in normalize_text(text).split()
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def stem(token):
+    """Racinisation minimale : retirer la marque du pluriel (s/x)"""
+    if len(token) > 3 and token[-1] in 'sx':
+        return token[:-1]
+    return token
+
+
+def query_terms(query):
+    """Termes de recherche racinisés, dédoublonnés et limités en nombre"""
+    terms = []
+    for token in tokenize(query):
+        term = stem(token)
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def build_search_document(ad):
+    """Construire le document indexé d'une annonce (titre pondéré x2)"""
+    title = ' '.join(tokenize(ad.title))
+    description = ' '.join(tokenize(ad.description))
+    return ' '.join(part for part in (title, title, description) if part)
+
+
+class BaseSearchBackend:
+    """Interface commune des backends de recherche"""
+
+    def index(self, ad):
+        """Mettre à jour l'index après l'enregistrement d'une annonce"""
+
+    def remove(self, ad_pk):
+        """Retirer une annonce de l'index"""
+
+    def rebuild(self, queryset):
+        """Reconstruire l'index pour un ensemble d'annonces"""
+        for ad in queryset.iterator():
+            self.index(ad)
+
+    def search(self, queryset, query):
+        """Filtrer le queryset et l'annoter avec ``search_rank``"""
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Repli sans index plein texte : recherche par préfixe sur le document
+    normalisé. Insensible aux accents mais non indexé.
+    """
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(search_document__startswith=term) |
+                Q(search_document__contains=f' {term}')
+            )
+        return queryset.filter(condition).annotate(
+            search_rank=Value(1.0, output_field=FloatField())
+        )
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """Index FULLTEXT InnoDB interrogé en mode booléen"""
+
+    # innodb_ft_min_token_size vaut 3 par défaut
+    min_term_length = 3
+
+    def search(self, queryset, query):
+        terms = [t for t in query_terms(query) if len(t) >= self.min_term_length]
+        if not terms:
+            return SimpleSearchBackend().search(queryset, query)
+
+        against = ' '.join(f'+{term}*' for term in terms)
+        column = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name('search_document'),
+        )
+        sql = f'MATCH ({column}) AGAINST (%s IN BOOLEAN MODE)'
+        # MATCH dans le WHERE permet à MySQL d'utiliser l'index FULLTEXT
+        return queryset.filter(
+            RawSQL(sql, (against,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(sql, (against,), output_field=FloatField())
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector 'simple' calculé sur le document normalisé (index GIN)"""
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        column = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name('search_document'),
+        )
+        vector = f"to_tsvector('simple', {column})"
+        rank = RawSQL(
+            f"ts_rank({vector}, to_tsquery('simple', %s))",
+            (tsquery,),
+            output_field=FloatField(),
+        )
+        matches = RawSQL(
+            f"{vector} @@ to_tsquery('simple', %s)",
+            (tsquery,),
+            output_field=BooleanField(),
+        )
+        return queryset.filter(matches).annotate(search_rank=rank)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Table FTS5 annexe, maintenue à chaque enregistrement d'annonce"""
+
+    table = 'produit_ad_fts'
+
+    @classmethod
+    def create_table(cls, schema_editor):
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {cls.table} USING fts5('
+            f"ad_id UNINDEXED, document, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    @classmethod
+    def drop_table(cls, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {cls.table}')
+
+    def _db_pk(self, ad_pk):
+        from .models import Ad
+        return Ad._meta.pk.get_db_prep_value(ad_pk, connection)
+
+    def index(self, ad):
+        db_pk = self._db_pk(ad.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE ad_id = %s', [db_pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (ad_id, document) VALUES (%s, %s)',
+                [db_pk, ad.search_document],
+            )
+
+    def remove(self, ad_pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE ad_id = %s', [self._db_pk(ad_pk)])
+
+    def rebuild(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.executemany(
+                f'INSERT INTO {self.table} (ad_id, document) VALUES (%s, %s)',
+                [
+                    (self._db_pk(pk), document)
+                    for pk, document in queryset.values_list('pk', 'search_document').iterator()
+                ],
+            )
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset
+
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        pk_column = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        # bm25() renvoie un score négatif : plus il est bas, plus c'est pertinent
+        rank = RawSQL(
+            f'SELECT -bm25({self.table}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND ad_id = {pk_column}',
+            (match,),
+            output_field=FloatField(),
+        )
+        matching = RawSQL(
+            f'SELECT ad_id FROM {self.table} WHERE {self.table} MATCH %s',
+            (match,),
+        )
+        return queryset.filter(pk__in=matching).annotate(search_rank=rank)
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFullTextBackend,
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Backend configuré, ou choisi selon le moteur de base de données"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'AD_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        else:
+            _backend = VENDOR_BACKENDS.get(connection.vendor, SimpleSearchBackend)()
+    return _backend
+
+
+def index_ad(ad):
+    """Indexer une annonce sans jamais faire échouer l'enregistrement"""
+    try:
+        get_search_backend().index(ad)
+    except Exception as e:
+        logger.warning("Indexation de l'annonce %s impossible: %s", ad.pk, e)
+
+
+def unindex_ad(ad_pk):
+    """Désindexer une annonce sans jamais faire échouer la suppression"""
+    try:
+        get_search_backend().remove(ad_pk)
+    except Exception as e:
+        logger.warning("Désindexation de l'annonce %s impossible: %s", ad_pk, e)
@@ -1,21 +1,42 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import (
     Ad, AdImage, Advertisement, Favorite, AdReport,
     CATEGORY_CHOICES, CITY_CHOICES
 )
+from .images import atomic_with_files, attach_images, build_srcset, srcset_from_derivatives
+from .slugs import create_with_unique_slug
 
 User = get_user_model()
 
+
+def is_favorited_by_request_user(ad, request):
+    """
+    Utiliser l'annotation de Ad.objects.for_listing() si présente,
+    sinon interroger la base (une requête par annonce).
+    """
+    if not (request and request.user.is_authenticated):
+        return False
+    annotated = getattr(ad, 'user_has_favorited', None)
+    if annotated is not None:
+        return annotated
+    return ad.favorited_by.filter(user=request.user).exists()
+
+
 class AdImageSerializer(serializers.ModelSerializer):
     """Serializer pour les images d'annonces"""
     image_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = AdImage
-        fields = ('id', 'image', 'image_url', 'caption', 'order', 'is_primary', 'created_at')
-        read_only_fields = ('id', 'created_at')
+        fields = (
+            'id', 'image', 'image_url', 'srcset', 'width', 'height',
+            'caption', 'order', 'is_primary', 'created_at'
+        )
+        read_only_fields = ('id', 'width', 'height', 'created_at')
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -25,6 +46,10 @@ class AdImageSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_srcset(self, obj):
+        """Déclinaisons redimensionnées (WebP/JPEG) : vide tant qu'elles sont en cours de génération"""
+        return build_srcset(obj, self.context.get('request')) if obj.image else {}
+
     def validate_image(self, value):
         """Valider la taille de l'image"""
         if value.size > 5 * 1024 * 1024:  # 5Mo
@@ -54,7 +79,7 @@ class AdListSerializer(serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     city_display = serializers.CharField(source='get_city_display', read_only=True)
     primary_image = serializers.SerializerMethodField()
-    images = AdImageSerializer(many=True, read_only=True)
+    primary_image_srcset = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     time_since_published = serializers.SerializerMethodField()
     images_count = serializers.IntegerField(read_only=True)
@@ -64,7 +89,7 @@ class AdListSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'slug', 'price', 'currency', 'is_negotiable',
             'user_name', 'user_avatar', 'user_phone', 'category', 'category_display',  # ✅ user_phone ajouté
-            'city', 'city_display', 'primary_image', 'images', 'images_count',
+            'city', 'city_display', 'primary_image', 'primary_image_srcset', 'images_count',
             'is_favorited', 'is_featured', 'is_urgent', 'views_count',
             'favorites_count', 'status', 'created_at', 'time_since_published',
             'expires_at', 'whatsapp_number'  # ✅ whatsapp_number ajouté
@@ -72,29 +97,23 @@ class AdListSerializer(serializers.ModelSerializer):
 
 
     def get_primary_image(self, obj):
-        """Obtenir l'URL de l'image primaire"""
+        """Obtenir l'URL de l'image primaire (champ dénormalisé, sans requête)"""
+        if not obj.primary_image_path:
+            return None
+        url = AdImage._meta.get_field('image').storage.url(obj.primary_image_path)
         request = self.context.get('request')
-        primary_image = obj.images.filter(is_primary=True).first()
-
-        if primary_image and primary_image.image:
-            if request:
-                return request.build_absolute_uri(primary_image.image.url)
-            return primary_image.image.url
-
-        # Sinon prendre la première image
-        first_image = obj.images.first()
-        if first_image and first_image.image:
-            if request:
-                return request.build_absolute_uri(first_image.image.url)
-            return first_image.image.url
-
-        return None
+        return request.build_absolute_uri(url) if request else url
+
+    def get_primary_image_srcset(self, obj):
+        """Déclinaisons de l'image primaire (vignettes des grilles d'annonces)"""
+        return srcset_from_derivatives(
+            obj.primary_image_derivatives,
+            AdImage._meta.get_field('image').storage,
+            self.context.get('request'),
+        )
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        return is_favorited_by_request_user(obj, self.context.get('request'))
 
     def get_time_since_published(self, obj):
         if obj.published_at:
@@ -148,10 +167,7 @@ class AdDetailSerializer(serializers.ModelSerializer):
         }
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
+        return is_favorited_by_request_user(obj, self.context.get('request'))
 
     def get_is_owner(self, obj):
         request = self.context.get('request')
@@ -160,7 +176,8 @@ class AdDetailSerializer(serializers.ModelSerializer):
         return False
 
     def get_related_ads(self, obj):
-        related = Ad.objects.filter(
+        request = self.context.get('request')
+        related = Ad.objects.for_listing(request.user if request else None).filter(
             category=obj.category,
             status='active'
         ).exclude(id=obj.id)[:4]
@@ -225,7 +242,6 @@ class AdCreateUpdateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         from django.utils import timezone
-        from django.utils.text import slugify
         from datetime import timedelta
 
         # Extraire les images
@@ -235,31 +251,23 @@ class AdCreateUpdateSerializer(serializers.ModelSerializer):
         if 'expires_at' not in validated_data or not validated_data['expires_at']:
             validated_data['expires_at'] = timezone.now() + timedelta(days=30)
 
-        # Générer un slug unique
-        title = validated_data['title']
-        slug = slugify(title)
-        counter = 1
-        while Ad.objects.filter(slug=slug).exists():
-            slug = f"{slugify(title)}-{counter}"
-            counter += 1
-
-        validated_data['slug'] = slug
-
         # ✅ Définir le statut par défaut en création si non fourni
         if 'status' not in validated_data:
             validated_data['status'] = 'active'
 
-        # Créer l'annonce
-        ad = Ad.objects.create(**validated_data)
-
-        # Créer les images
-        for index, image_file in enumerate(images_data):
-            AdImage.objects.create(
-                ad=ad,
-                image=image_file,
-                order=index,
-                is_primary=(index == 0)  # La première image est primaire
+        # Créer l'annonce (slug unique, voir produit.slugs) et ses images
+        # (la première est primaire) d'un seul tenant ; fichiers supprimés si
+        # la transaction échoue
+        with atomic_with_files():
+            ad = create_with_unique_slug(
+                validated_data['title'],
+                lambda slug: Ad.objects.create(slug=slug, **validated_data),
             )
+            if images_data:
+                try:
+                    attach_images(ad, images_data)
+                except DjangoValidationError as e:
+                    raise DRFValidationError({'images': e.messages})
 
         return ad
 
@@ -267,8 +275,6 @@ class AdCreateUpdateSerializer(serializers.ModelSerializer):
         """
         Mise à jour de l'annonce avec gestion sécurisée des images
         """
-        from django.db import transaction
-
         # Extraire les images si présentes
         images_data = validated_data.pop('images', None)
 
@@ -278,33 +284,12 @@ class AdCreateUpdateSerializer(serializers.ModelSerializer):
 
         instance.save()
 
-        # Gérer les images si fournies
+        # Remplacer les images si fournies (anciens fichiers supprimés après le commit)
         if images_data is not None and len(images_data) > 0:
             try:
-                with transaction.atomic():
-                    # 1. Supprimer d'abord TOUTES les anciennes images
-                    old_images = list(instance.images.all())
-
-                    # Supprimer les fichiers physiques
-                    for old_img in old_images:
-                        try:
-                            if old_img.image:
-                                old_img.image.delete(save=False)
-                        except Exception as e:
-                            print(f"Avertissement: impossible de supprimer le fichier: {e}")
-
-                    # Supprimer tous les enregistrements via queryset
-                    AdImage.objects.filter(ad=instance).delete()
-
-                    # 2. Créer les nouvelles images
-                    for index, image_file in enumerate(images_data):
-                        AdImage.objects.create(
-                            ad=instance,
-                            image=image_file,
-                            order=index,
-                            is_primary=(index == 0)
-                        )
-
+                attach_images(instance, images_data, replace=True)
+            except DjangoValidationError as e:
+                raise DRFValidationError({'images': e.messages})
             except Exception as e:
                 raise DRFValidationError({
                     'images': f"Erreur lors de la mise à jour des images: {str(e)}"
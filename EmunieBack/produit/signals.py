@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .home_feed import invalidate_home_feed
+from .models import Ad, AdImage, Advertisement
+from .sampling import advertisements_sampler
+from .search import unindex_ad
+from .tracking import forget_advertisement
+
+
+@receiver([post_save, post_delete], sender=Ad)
+@receiver([post_save, post_delete], sender=AdImage)
+def ad_changed(sender, **kwargs):
+    """Une annonce ou ses images ont changé : la page d'accueil est périmée"""
+    invalidate_home_feed()
+
+
+@receiver(post_delete, sender=Ad)
+def ad_deleted(sender, instance, **kwargs):
+    """Suppression unitaire, en masse (queryset) ou en cascade : retirer de l'index"""
+    unindex_ad(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Advertisement)
+def advertisement_changed(sender, instance, **kwargs):
+    """Une publicité a changé : pool de tirage et cache de suivi à reconstruire"""
+    advertisements_sampler.invalidate()
+    forget_advertisement(instance.pk)
@@ -0,0 +1,73 @@
+"""
+Attribution des slugs d'annonces.
+
+Le slug de base est ``slugify(titre)`` tronqué à la longueur du champ. S'il est
+déjà pris (une seule requête), on lui ajoute un suffixe base62 aléatoire de
+SUFFIX_LENGTH caractères (62^6 ≈ 5,7e10 possibilités) : le coût ne dépend pas
+du nombre d'annonces portant le même titre, contrairement à la boucle
+``-1``, ``-2``... qui testait chaque suffixe.
+
+La contrainte d'unicité reste l'arbitre en cas de création concurrente :
+``create_with_unique_slug`` retente avec un nouveau suffixe sur IntegrityError.
+"""
+import secrets
+import string
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+BASE62 = string.digits + string.ascii_lowercase + string.ascii_uppercase
+SUFFIX_LENGTH = 6
+MAX_ATTEMPTS = 5
+DEFAULT_SLUG = 'annonce'
+
+
+def random_suffix(length=SUFFIX_LENGTH):
+    return ''.join(secrets.choice(BASE62) for _ in range(length))
+
+
+def slug_max_length():
+    from .models import Ad
+    return Ad._meta.get_field('slug').max_length
+
+
+def base_slug(title):
+    return slugify(title)[:slug_max_length()].strip('-') or DEFAULT_SLUG
+
+
+def suffixed_slug(base):
+    """Slug de base tronqué pour laisser la place à '-<suffixe>'"""
+    head = base[:slug_max_length() - SUFFIX_LENGTH - 1].strip('-') or DEFAULT_SLUG
+    return f'{head}-{random_suffix()}'
+
+
+def allocate_slug(title, exclude_pk=None):
+    """Proposer un slug libre pour ``title`` en une requête au plus"""
+    from .models import Ad
+
+    slug = base_slug(title)
+    taken = Ad.objects.filter(slug=slug)
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+    if taken.exists():
+        return suffixed_slug(slug)
+    return slug
+
+
+def create_with_unique_slug(title, create):
+    """
+    Appeler ``create(slug)`` avec un slug libre. Si la contrainte d'unicité est
+    violée entre-temps (création concurrente du même titre), retenter avec un
+    suffixe aléatoire, dans un savepoint pour ne pas casser la transaction.
+    """
+    from .models import Ad
+
+    slug = allocate_slug(title)
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return create(slug)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not Ad.objects.filter(slug=slug).exists():
+                raise  # autre contrainte, ou échecs répétés
+            slug = suffixed_slug(base_slug(title))
@@ -0,0 +1,23 @@
+from jobs.registry import task
+
+from .images import generate_derivatives
+
+
+@task('produit.generate_image_derivatives', max_attempts=3)
+def generate_image_derivatives(ad_image_id):
+    """Générer les déclinaisons d'une image d'annonce (ignorée si supprimée)"""
+    from .models import AdImage
+
+    ad_image = AdImage.objects.filter(pk=ad_image_id).first()
+    if ad_image is not None and ad_image.image:
+        generate_derivatives(ad_image)
+
+
+@task('produit.generate_ad_image_derivatives', max_attempts=3)
+def generate_ad_image_derivatives(ad_id):
+    """Générer les déclinaisons des images d'une annonce qui n'en ont pas encore"""
+    from .models import AdImage
+
+    for ad_image in AdImage.objects.filter(ad_id=ad_id, derivatives={}):
+        if ad_image.image:
+            generate_derivatives(ad_image)
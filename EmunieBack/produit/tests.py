@@ -1,3 +1,860 @@
-from django.test import TestCase
+import random
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+
+from EmunieBack.testing import TempMediaRootMixin
+from monetisation.models import AdBoost, Package
+
+from .buffering import buffering_enabled, flush_all
+from .expiry import expire_ads, expired_ads
+from .images import atomic_with_files, attach_images
+from .models import (
+    Ad, AdImage, AdStatus, AdView, AdViewDailyStat, Advertisement, AdvertisementHourlyStat, Favorite
+)
+from .sampling import RandomSampler, active_ads, featured_ads_sampler
+from .slugs import create_with_unique_slug
+from .search import get_search_backend, normalize_text, query_terms
+from .tracking import ad_views_buffer, compact_ad_view_stats
+
+User = get_user_model()
+
+# Plus petit GIF valide (1x1 pixel)
+TINY_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+def single_process_buffering():
+    """Files actives dès EVENT_BUFFERING : un seul processus, le LocMemCache des tests suffit"""
+    return settings.EVENT_BUFFERING
+
+
+# Écriture différée dans les tests, sans Redis
+buffered = mock.patch('produit.buffering.buffering_enabled', single_process_buffering)
+
+
+def make_image(name='photo.gif'):
+    return SimpleUploadedFile(name, TINY_GIF, content_type='image/gif')
+
+
+def make_ad(user, title, **kwargs):
+    kwargs.setdefault('expires_at', timezone.now() + timedelta(days=30))
+    kwargs.setdefault('status', AdStatus.ACTIVE)
+    return Ad.objects.create(user=user, title=title, slug=kwargs.pop('slug', None) or title.lower().replace(' ', '-'), **kwargs)
+
+
+class AdSearchTests(TransactionTestCase):
+    """
+    Hors transaction de test : un index FULLTEXT InnoDB ne voit que les lignes
+    validées
+    """
+
+    def setUp(self):
+        # La table FTS5 annexe n'est pas vidée entre les tests (pas un modèle)
+        get_search_backend().rebuild(Ad.objects.none())
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/produit/ads/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [ad['title'] for ad in response.data['results']]
+
+    def test_normalisation_retire_accents_et_ponctuation(self):
+        self.assertEqual(normalize_text("Véhicules d'occasion!"), 'vehicules d occasion')
+        self.assertEqual(query_terms('Les Véhicules'), ['vehicule'])
+
+    def test_recherche_insensible_aux_accents_et_au_pluriel(self):
+        make_ad(self.user, 'Véhicules utilitaires')
+        make_ad(self.user, 'Téléphone portable')
+
+        self.assertEqual(self.search('vehicule'), ['Véhicules utilitaires'])
+        self.assertEqual(self.search('VÉHICULES'), ['Véhicules utilitaires'])
+        self.assertEqual(self.search('telephones'), ['Téléphone portable'])
+
+    def test_recherche_dans_la_description_et_classement(self):
+        make_ad(self.user, 'Toyota Corolla', description='Voiture familiale économique')
+        make_ad(self.user, 'Voiture de sport', description='Rapide')
+
+        self.assertEqual(self.search('voiture'), ['Voiture de sport', 'Toyota Corolla'])
+
+    def test_index_mis_a_jour_a_la_modification_et_suppression(self):
+        ad = make_ad(self.user, 'Canapé en cuir')
+        self.assertEqual(self.search('canape'), ['Canapé en cuir'])
+
+        ad.title = 'Fauteuil en cuir'
+        ad.save()
+        self.assertEqual(self.search('canape'), [])
+        self.assertEqual(self.search('fauteuil'), ['Fauteuil en cuir'])
+
+        ad.delete()
+        self.assertEqual(self.search('fauteuil'), [])
+
+    def test_reindexation_seulement_si_le_texte_change(self):
+        ad = make_ad(self.user, 'Canapé en cuir')
+        with mock.patch('produit.search.index_ad') as index_ad:
+            ad.views_count = 3
+            ad.save(update_fields=['views_count'])
+            ad = Ad.objects.get(pk=ad.pk)
+            ad.save()  # rien de modifié dans le texte
+            index_ad.assert_not_called()
+            ad.description = 'Trois places'
+            ad.save()
+            index_ad.assert_called_once_with(ad)
+
+    def test_suppressions_en_masse_et_en_cascade(self):
+        first = make_ad(self.user, 'Canapé en cuir')
+        second = make_ad(self.user, 'Table basse')
+        with mock.patch.object(get_search_backend(), 'remove') as remove:
+            Ad.objects.filter(pk=first.pk).delete()
+            remove.assert_called_once_with(first.pk)
+            self.user.delete()
+            remove.assert_called_with(second.pk)
+
+
+class AdCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        for i in range(7):
+            make_ad(self.user, f'Annonce {i}', is_featured=(i % 3 == 0), is_urgent=(i % 2 == 0))
+
+    def test_parcours_complet_sans_doublon_ni_count(self):
+        expected = [
+            ad['title'] for ad in
+            self.client.get('/api/produit/ads/', {'page_size': 50}).data['results']
+        ]
+
+        seen = []
+        url, params = '/api/produit/ads/', {'pagination': 'cursor', 'page_size': 3}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT(' in q['sql'].upper() for q in queries.captured_queries))
+            seen += [ad['title'] for ad in response.data['results']]
+            url, params = response.data['next'], None
+
+        self.assertEqual(seen, expected)
+
+    def test_total_approximatif_optionnel(self):
+        response = self.client.get('/api/produit/ads/', {'pagination': 'cursor', 'include_total': 1})
+        self.assertEqual(response.data['count'], 7)
+        self.assertNotIn('include_total', response.data['next'] or '')
+
+    def test_curseur_falsifie_refuse(self):
+        response = self.client.get('/api/produit/ads/', {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AdListQueryBudgetTests(TempMediaRootMixin, TestCase):
+    """Le coût d'une page ne doit pas dépendre du nombre d'annonces"""
+    QUERY_BUDGET = 4
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='acheteur', password='x')
+        seller = User.objects.create_user(username='vendeur', password='x')
+        for i in range(20):
+            ad = make_ad(seller, f'Annonce {i}')
+            AdImage.objects.create(ad=ad, image=make_image(), order=0, is_primary=False)
+            AdImage.objects.create(ad=ad, image=make_image(), order=1, is_primary=(i % 2 == 0))
+            if i % 4 == 0:
+                Favorite.objects.create(user=self.user, ad=ad)
+
+    def get_page(self, url='/api/produit/ads/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET, '\n'.join(q['sql'] for q in queries.captured_queries))
+        return response.data
+
+    def test_page_anonyme(self):
+        results = self.get_page()['results']
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(ad['primary_image'] and ad['images_count'] == 2 for ad in results))
+
+    def test_liste_sans_requete_sur_les_images(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/produit/ads/')
+        self.assertFalse([q for q in queries.captured_queries if 'produit_adimage' in q['sql']])
+
+    def test_page_authentifiee_avec_favoris(self):
+        self.client.force_authenticate(self.user)
+        results = self.get_page()['results']
+        favorited = {ad['title'] for ad in results if ad['is_favorited']}
+        self.assertEqual(favorited, {f'Annonce {i}' for i in range(0, 20, 4)})
+
+    def test_liste_des_favoris(self):
+        self.client.force_authenticate(self.user)
+        results = self.get_page('/api/produit/favorites/')['results']
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(fav['ad']['is_favorited'] for fav in results))
+
+
+@override_settings(HOME_FEED_ASYNC_REFRESH=False)
+class HomeFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        make_ad(self.user, 'Moto Yamaha', category='vehicules')
+        make_ad(self.user, 'Villa à louer', category='immobilier', is_urgent=True)
+
+    def test_chemin_critique_sans_sql(self):
+        self.client.get('/api/produit/home-data/')  # construction initiale
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/produit/home-data/')
+        self.assertEqual(response.data['stats']['total_ads'], 2)
+        self.assertEqual(
+            {c['value']: c['count'] for c in response.data['categories']},
+            {'vehicules': 1, 'immobilier': 1},
+        )
+
+    def test_instantane_perime_servi_puis_rafraichi(self):
+        self.client.get('/api/produit/home-data/')
+        make_ad(self.user, 'Ordinateur portable', category='electronique')
+
+        # La modification invalide l'instantané : l'ancien est servi pendant le rafraîchissement
+        stale = self.client.get('/api/produit/home-data/')
+        self.assertEqual(stale.data['stats']['total_ads'], 2)
+
+        fresh = self.client.get('/api/produit/home-data/')
+        self.assertEqual(fresh.data['stats']['total_ads'], 3)
+        self.assertEqual(len(fresh.data['recent_ads']), 3)
+
+    def test_favoris_de_l_utilisateur(self):
+        buyer = User.objects.create_user(username='acheteur', password='x')
+        Favorite.objects.create(user=buyer, ad=Ad.objects.get(title='Moto Yamaha'))
+        self.client.get('/api/produit/home-data/')
+
+        self.client.force_authenticate(buyer)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/produit/home-data/')
+        favorited = {ad['title']: ad['is_favorited'] for ad in response.data['recent_ads']}
+        self.assertEqual(favorited, {'Moto Yamaha': True, 'Villa à louer': False})
+
+        # L'instantané partagé reste anonyme
+        self.client.force_authenticate(None)
+        anonymous = self.client.get('/api/produit/home-data/')
+        self.assertFalse(any(ad['is_favorited'] for ad in anonymous.data['recent_ads']))
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'localhost'])
+    def test_instantane_commun_a_tous_les_hotes(self):
+        call_command('refresh_home_feed', stdout=StringIO())
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/produit/home-data/', HTTP_HOST='localhost')
+        self.assertEqual(response.data['stats']['total_ads'], 2)
+
+
+@override_settings(SAMPLING_ASYNC_REFRESH=False)
+class RandomSamplingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ads = [make_ad(self.user, f'Annonce {i}') for i in range(10)]
+        featured_ads_sampler.invalidate()
+
+    def test_tirage_distinct_sans_order_by_rand(self):
+        featured_ads_sampler.get_pool()
+        with CaptureQueriesContext(connection) as ctx:
+            sampled = featured_ads_sampler.sample(4)
+        self.assertEqual(len(sampled), 4)
+        self.assertEqual(len({ad.pk for ad in sampled}), 4)
+        self.assertFalse(any('RANDOM()' in q['sql'] or 'RAND()' in q['sql'] for q in ctx.captured_queries))
+
+    def test_annonces_devenues_inactives_ecartees(self):
+        featured_ads_sampler.get_pool()
+        Ad.objects.filter(pk__in=[ad.pk for ad in self.ads[:8]]).update(status=AdStatus.EXPIRED)
+        sampled = featured_ads_sampler.sample(4)
+        self.assertEqual({ad.pk for ad in sampled}, {ad.pk for ad in self.ads[8:]})
+
+    def test_fenetres_de_cles_au_dela_du_pool(self):
+        sampler = RandomSampler('test-fenetres', active_ads, max_pool_size=4, windows=2)
+        with CaptureQueriesContext(connection) as ctx:
+            pool = sampler.build_pool()
+        self.assertEqual(len(pool['ids']), len(set(pool['ids'])))
+        self.assertGreaterEqual(len(pool['ids']), 2)
+        self.assertLessEqual(len(pool['ids']), 4)
+        self.assertTrue(set(pool['ids']) <= {ad.pk for ad in self.ads})
+        self.assertFalse(any('RANDOM()' in q['sql'] or 'RAND()' in q['sql'] for q in ctx.captured_queries))
+
+    def test_pool_perime_servi_puis_reconstruit(self):
+        pool = featured_ads_sampler.get_pool()
+        cache.set(featured_ads_sampler.cache_key, {**pool, 'built_at': 0})
+        make_ad(self.user, 'Nouvelle annonce')
+
+        # Le pool périmé est servi ; la reconstruction (ici synchrone) le remplace
+        self.assertEqual(featured_ads_sampler.get_pool()['ids'], pool['ids'])
+        self.assertEqual(len(featured_ads_sampler.get_pool()['ids']), 11)
+
+        # Reconstruction déjà en cours ailleurs : rien n'est relancé
+        cache.set(featured_ads_sampler.cache_key, {**pool, 'built_at': 0})
+        cache.add(featured_ads_sampler.lock_key, 1)
+        with self.assertNumQueries(0):
+            featured_ads_sampler.get_pool()
+
+    def test_annonces_boostees_favorisees(self):
+        package = Package.objects.create(
+            name='Boost x9', package_type='boost', description='', price=1000,
+            duration_days=7, boost_multiplier=9,
+        )
+        boosted = self.ads[0]
+        now = timezone.now()
+        AdBoost.objects.create(
+            ad=boosted, user=self.user, boost_type='basic', package=package, price_paid=1000,
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=6),
+        )
+        random.seed(42)
+        hits = sum(boosted.pk in featured_ads_sampler.sample_ids(1) for _ in range(1000))
+        # Poids 9 sur un total de 18 : environ une fois sur deux
+        self.assertGreater(hits, 400)
+        self.assertLess(hits, 600)
+
+
+@override_settings(EVENT_BUFFERING=True)
+@buffered
+class AdViewTrackingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+        self.url = f'/api/produit/ads/{self.ad.pk}/'
+
+    def view(self, ip, user=None):
+        self.client.force_authenticate(user)
+        self.client.get(self.url, REMOTE_ADDR=ip)
+
+    def test_aucune_ecriture_pendant_la_requete(self):
+        self.view('10.0.0.1')
+        self.view('10.0.0.1')  # doublon, écarté par le cache
+        self.assertEqual(AdView.objects.count(), 0)
+        self.assertEqual(ad_views_buffer.pending(), 1)
+
+        flush_all()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views_count, 1)
+        self.assertEqual(AdView.objects.count(), 1)
+        self.assertEqual(ad_views_buffer.pending(), 0)
+
+    def test_vidage_par_lot(self):
+        other = make_ad(self.user, 'Villa à louer')
+        AdView.objects.create(ad=self.ad, ip_address='10.0.0.1')  # déjà en base
+        self.view('10.0.0.1')
+        self.view('10.0.0.2')
+        self.view('10.0.0.2', user=self.user)
+        self.client.get(f'/api/produit/ads/{other.pk}/', REMOTE_ADDR='10.0.0.2')
+
+        with self.assertNumQueries(8):
+            # savepoint, annonces, vues existantes, INSERT, UPDATE ... CASE,
+            # INSERT des cumuls manquants, UPDATE des cumuls, release
+            flush_all()
+        self.ad.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.ad.views_count, other.views_count), (2, 1))
+        self.assertEqual(AdView.objects.count(), 4)
+
+    def test_ecriture_directe_sans_cache_atomique(self):
+        # FileBasedCache : add/incr non atomiques entre workers ; LocMemCache :
+        # une file par worker gunicorn. Dans les deux cas, pas de file
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': tempfile.gettempdir()}}
+        with self.settings(CACHES=file_cache):
+            self.assertFalse(buffering_enabled())
+        locmem_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem_cache):
+            self.assertFalse(buffering_enabled())
+        with self.settings(EVENT_BUFFERING=False):
+            self.view('10.0.0.4')
+        self.assertEqual(ad_views_buffer.pending(), 0)
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.views_count, AdView.objects.count()), (1, 1))
+
+    @override_settings(EVENT_BUFFERING=False)
+    def test_ecriture_directe_concurrente(self):
+        # Cumul du jour créé par un autre worker entre-temps : la vue et
+        # l'incrément de views_count ne doivent pas être annulés
+        bulk_create = AdViewDailyStat.objects.bulk_create
+
+        def concurrent_bulk_create(objs, **kwargs):
+            AdViewDailyStat.objects.create(ad=self.ad, day=objs[0].day, views=1, unique_ips=1, anonymous=1)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(AdViewDailyStat.objects, 'bulk_create', concurrent_bulk_create):
+            self.view('10.0.0.5')
+
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.views_count, AdView.objects.count()), (1, 1))
+        stat = AdViewDailyStat.objects.get()
+        self.assertEqual((stat.views, stat.anonymous), (2, 2))
+
+    def test_trou_dans_la_file(self):
+        cache.set(ad_views_buffer.tail_key, 1)  # numéro réservé sans événement
+        self.view('10.0.0.3')
+
+        # L'entrée 1 manque (écriture en cours) : le vidage attend un tour
+        ad_views_buffer.flush()
+        self.assertEqual(AdView.objects.count(), 0)
+        ad_views_buffer.flush()
+        self.assertEqual(AdView.objects.count(), 1)
+
+
+@override_settings(EVENT_BUFFERING=True)
+@buffered
+class AdvertisementCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='annonceur', password='x')
+        now = timezone.now()
+        self.advertisement = Advertisement.objects.create(
+            user=self.user, title='Soldes', link='https://example.com', image='publicite/soldes.gif',
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            is_active=True, is_approved=True,
+        )
+        self.base_url = f'/api/publicite/{self.advertisement.pk}/'
+
+    def test_beacons_sans_sql_puis_vidage(self):
+        self.client.post(self.base_url + 'impression/')
+        with self.assertNumQueries(0):
+            for _ in range(4):
+                self.client.post(self.base_url + 'impression/')
+            response = self.client.post(self.base_url + 'click/')
+        self.assertEqual(response.data['redirect_url'], 'https://example.com')
+
+        flush_all()
+        self.client.post(self.base_url + 'impression/')
+        flush_all()
+
+        self.advertisement.refresh_from_db()
+        self.assertEqual((self.advertisement.impressions, self.advertisement.clicks), (6, 1))
+        stat = AdvertisementHourlyStat.objects.get()
+        self.assertEqual((stat.impressions, stat.clicks), (6, 1))
+
+    @override_settings(EVENT_BUFFERING=False)
+    def test_ecriture_directe_concurrente(self):
+        # Un autre worker crée la ligne horaire entre-temps : sans verrou en
+        # écriture directe, les deux incréments doivent s'additionner
+        bulk_create = AdvertisementHourlyStat.objects.bulk_create
+
+        def concurrent_bulk_create(objs, **kwargs):
+            AdvertisementHourlyStat.objects.create(
+                advertisement=self.advertisement, hour=objs[0].hour, impressions=2
+            )
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(AdvertisementHourlyStat.objects, 'bulk_create', concurrent_bulk_create):
+            self.client.post(self.base_url + 'impression/')
+
+        self.advertisement.refresh_from_db()
+        self.assertEqual(self.advertisement.impressions, 1)
+        self.assertEqual(AdvertisementHourlyStat.objects.get().impressions, 3)
+
+    def test_publicite_inactive_introuvable(self):
+        self.advertisement.is_active = False
+        self.advertisement.save()
+        response = self.client.post(self.base_url + 'impression/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_statistiques_horaires(self):
+        for _ in range(3):
+            self.client.post(self.base_url + 'impression/')
+        flush_all()
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.base_url + 'statistics/', {'hours': 24})
+        self.assertEqual(len(response.data['hourly']), 24)
+        self.assertEqual(response.data['hourly'][-1]['impressions'], 3)
+        self.assertEqual(sum(h['impressions'] for h in response.data['hourly']), 3)
+
+
+@override_settings(EVENT_BUFFERING=True)
+@buffered
+class AdStatisticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+
+    def view(self, ip, user=None):
+        self.client.force_authenticate(user)
+        self.client.get(f'/api/produit/ads/{self.ad.pk}/', REMOTE_ADDR=ip)
+
+    def test_cumul_journalier_incremental(self):
+        self.view('10.0.0.1')
+        self.view('10.0.0.1', user=self.user)  # même IP, autre visiteur
+        self.view('10.0.0.2')
+        flush_all()
+
+        stat = AdViewDailyStat.objects.get(ad=self.ad)
+        self.assertEqual(
+            (stat.views, stat.unique_ips, stat.authenticated, stat.anonymous),
+            (3, 2, 1, 2),
+        )
+
+        self.ad.refresh_from_db()
+        totals = (self.ad.unique_visitors, self.ad.authenticated_views, self.ad.anonymous_views)
+        self.assertEqual(totals, (2, 1, 2))
+
+        # La compaction recalcule le même résultat depuis AdView
+        Ad.objects.filter(pk=self.ad.pk).update(unique_visitors=0, authenticated_views=0, anonymous_views=0)
+        compact_ad_view_stats()
+        stat = AdViewDailyStat.objects.get(ad=self.ad)
+        self.assertEqual((stat.views, stat.unique_ips), (3, 2))
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.unique_visitors, self.ad.authenticated_views, self.ad.anonymous_views), totals)
+
+    def test_statistiques_en_requetes_constantes(self):
+        old_day = timezone.now().date() - timedelta(days=40)
+        AdViewDailyStat.objects.create(ad=self.ad, day=old_day, views=2, unique_ips=2, anonymous=2)
+        Ad.objects.filter(pk=self.ad.pk).update(views_count=2, unique_visitors=2, anonymous_views=2)
+        self.view('10.0.0.1')
+        flush_all()
+
+        self.client.force_authenticate(self.user)
+        url = f'/api/produit/ads/{self.ad.pk}/statistics/'
+        with self.assertNumQueries(2):
+            # annonce (totaux dénormalisés), plage de cumuls : rien ne
+            # dépend du nombre de vues brutes
+            response = self.client.get(url, {'days': 90})
+        self.assertEqual(len(response.data['views_by_day']), 90)
+        self.assertEqual(response.data['views_today'], 1)
+        self.assertEqual(response.data['anonymous_views_in_period'], 3)
+
+        # Totaux depuis la publication, quelle que soit la période
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['views_by_day']), 7)
+        self.assertEqual(response.data['unique_visitors_in_period'], 1)
+        self.assertEqual(
+            (response.data['unique_visitors'], response.data['anonymous_views'], response.data['authenticated_views']),
+            (3, 3, 0),
+        )
+
+
+def make_photo(size=(2000, 1000), orientation=6):
+    """JPEG avec une orientation EXIF (6 : rotation de 90°)"""
+    exif = PILImage.Exif()
+    exif[0x0112] = orientation
+    buffer = BytesIO()
+    PILImage.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(JOBS_EAGER=True)
+class AdImageDerivativeTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+        self.image = AdImage.objects.create(ad=self.ad, image=make_photo())
+        self.image.refresh_from_db()
+
+    def test_declinaisons_generees(self):
+        # Dimensions de l'original une fois l'orientation EXIF appliquée
+        self.assertEqual((self.image.width, self.image.height), (1000, 2000))
+        self.assertEqual(set(self.image.derivatives), {'thumb', 'card', 'full'})
+
+        thumb = self.image.derivatives['thumb']
+        self.assertEqual((thumb['width'], thumb['height']), (120, 240))
+        storage = self.image.image.storage
+        for extension in ('webp', 'jpeg'):
+            with storage.open(thumb[extension]) as file, PILImage.open(file) as derivative:
+                self.assertEqual(derivative.size, (120, 240))
+                self.assertNotIn(0x0112, derivative.getexif())
+
+    def test_srcset_dans_la_liste(self):
+        response = APIClient().get('/api/produit/ads/')
+        srcset = response.data['results'][0]['primary_image_srcset']
+        self.assertTrue(srcset['card']['webp'].startswith('http://testserver/media/'))
+        self.assertTrue(srcset['card']['jpeg'].endswith('_card.jpeg'))
+
+    def test_suppression_des_declinaisons(self):
+        AdImage.objects.create(ad=self.ad, image=make_photo(), order=1)
+        paths = [entry['webp'] for entry in self.image.derivatives.values()]
+        self.image.delete()
+        storage = self.image.image.storage
+        self.assertFalse(any(storage.exists(path) for path in paths))
+
+
+class ImageUploadTests(TempMediaRootMixin, TestCase):
+    url = '/api/produit/ads/create/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.client.force_authenticate(self.user)
+
+    def post(self, *images):
+        return self.client.post(self.url, {
+            'title': 'Moto Yamaha', 'description': 'Bon état', 'price': '450000',
+            'category': 'vehicules', 'city': 'abidjan', 'images': list(images),
+            'expires_at': (timezone.now() + timedelta(days=30)).isoformat(),
+        }, format='multipart')
+
+    def test_images_valides(self):
+        response = self.post(make_image('a.gif'), make_photo(size=(64, 32)))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(AdImage.objects.filter(ad__user=self.user).count(), 2)
+
+    def test_contenu_ne_correspondant_pas_a_une_image(self):
+        fake = SimpleUploadedFile('photo.jpg', b'<?php echo "x"; ?>' * 10, content_type='image/jpeg')
+        response = self.post(fake)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('images', response.data)
+        self.assertFalse(Ad.objects.exists())
+
+    def test_image_trop_lourde_interrompue(self):
+        from .views import AdCreateView
+        with mock.patch.object(AdCreateView, 'upload_max_file_size', 1024):
+            response = self.post(make_photo(size=(400, 400)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('images', response.data)
+
+    def test_trop_de_fichiers(self):
+        response = self.post(*(make_image(f'{i}.gif') for i in range(4)))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Ad.objects.exists())
+
+    @override_settings(UPLOAD_MAX_IMAGE_PIXELS=1000)
+    def test_dimensions_bornees_avant_decodage(self):
+        response = self.post(make_photo(size=(100, 100)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('trop grande', str(response.data['images'][0]))
+
+
+class AdImageSummaryTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+        self.first = AdImage.objects.create(ad=self.ad, image=make_image('a.gif'))
+        self.second = AdImage.objects.create(ad=self.ad, image=make_image('b.gif'), order=1)
+
+    def test_resume_tenu_a_jour(self):
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.images_count, 2)
+        self.assertEqual(self.ad.primary_image_path, self.first.image.name)
+
+        self.second.is_primary = True
+        self.second.save()
+        self.first.delete()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.images_count, 1)
+        self.assertEqual(self.ad.primary_image_path, self.second.image.name)
+
+    def test_mise_a_jour_des_images_par_le_serializer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(
+            f'/api/produit/ads/{self.ad.pk}/update/', {'images': [make_image('c.gif')]}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.images_count, 1)
+        self.assertEqual(self.ad.primary_image_path, self.ad.images.get().image.name)
+
+    def test_commande_de_reparation(self):
+        Ad.objects.filter(pk=self.ad.pk).update(images_count=0, primary_image_path='')
+        call_command('refresh_ad_image_summary', '--dry-run', stdout=StringIO())
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.images_count, 0)
+
+        call_command('refresh_ad_image_summary', stdout=StringIO())
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.images_count, 2)
+        self.assertEqual(self.ad.primary_image_path, self.first.image.name)
+
+
+class AttachImagesTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+
+    def test_lot_insere_en_requetes_constantes(self):
+        files = [make_image(f'{i}.gif') for i in range(3)]
+        # images existantes, savepoint, bulk_create, résumé, tâche, release
+        with self.assertNumQueries(6):
+            attach_images(self.ad, files)
+
+        images = list(self.ad.images.order_by('order'))
+        self.assertEqual([image.order for image in images], [0, 1, 2])
+        self.assertEqual([image.is_primary for image in images], [True, False, False])
+        self.assertEqual(self.ad.images_count, 3)
+        self.assertEqual(self.ad.primary_image_path, images[0].image.name)
+
+    def test_ajout_conserve_la_primaire(self):
+        attach_images(self.ad, [make_image('a.gif')])
+        attach_images(self.ad, [make_image('b.gif'), make_image('c.gif')])
+        self.assertEqual(self.ad.images.filter(is_primary=True).count(), 1)
+        self.assertEqual(sorted(self.ad.images.values_list('order', flat=True)), [0, 1, 2])
+
+    def test_lot_invalide_sans_ecriture(self):
+        attach_images(self.ad, [make_image('a.gif')])
+        storage = AdImage._meta.get_field('image').storage
+        before = set(storage.listdir('ads/images/' + timezone.now().strftime('%Y/%m/%d'))[1])
+        with self.assertRaises(DjangoValidationError):
+            attach_images(self.ad, [make_image(f'{i}.gif') for i in range(3)])
+        after = set(storage.listdir('ads/images/' + timezone.now().strftime('%Y/%m/%d'))[1])
+        self.assertEqual(before, after)
+        self.assertEqual(self.ad.images.count(), 1)
+
+    def test_fichiers_supprimes_si_la_transaction_est_annulee(self):
+        storage = AdImage._meta.get_field('image').storage
+        with self.assertRaises(RuntimeError), atomic_with_files():
+            images = attach_images(self.ad, [make_image('a.gif'), make_image('b.gif')])
+            self.assertTrue(all(storage.exists(image.image.name) for image in images))
+            raise RuntimeError('échec après l\'ajout des images')
+        self.assertFalse(any(storage.exists(image.image.name) for image in images))
+
+        # Transaction validée : les fichiers restent
+        with self.captureOnCommitCallbacks(execute=True):
+            images = attach_images(self.ad, [make_image('c.gif')])
+        self.assertTrue(storage.exists(images[0].image.name))
+
+    def test_fichiers_conserves_si_une_fonction_on_commit_echoue(self):
+        storage = AdImage._meta.get_field('image').storage
+
+        def explode():
+            raise RuntimeError('échec après le commit')
+
+        # Django abandonne les fonctions on_commit suivantes : le commit a
+        # pourtant eu lieu, les fichiers doivent rester
+        with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+            transaction.on_commit(explode)
+            images = attach_images(self.ad, [make_image('a.gif')])
+        self.assertTrue(storage.exists(images[0].image.name))
+
+
+class AtomicWithFilesTests(TempMediaRootMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.ad = make_ad(self.user, 'Moto Yamaha')
+        self.storage = AdImage._meta.get_field('image').storage
+
+    def test_exception_on_commit_apres_le_commit(self):
+        def explode():
+            raise RuntimeError('échec après le commit')
+
+        # Transaction la plus externe : les fonctions on_commit s'exécutent à
+        # la sortie du bloc, après le commit
+        with self.assertRaises(RuntimeError), atomic_with_files():
+            transaction.on_commit(explode)
+            images = attach_images(self.ad, [make_image('a.gif')])
+        self.assertEqual(self.ad.images.count(), 1)
+        self.assertTrue(self.storage.exists(images[0].image.name))
+
+    def test_echec_du_bloc_externe(self):
+        with self.assertRaises(RuntimeError), atomic_with_files():
+            images = attach_images(self.ad, [make_image('a.gif')])
+            raise RuntimeError('échec après l\'ajout des images')
+        self.assertEqual(self.ad.images.count(), 0)
+        self.assertFalse(self.storage.exists(images[0].image.name))
+
+    def test_remplacement(self):
+        attach_images(self.ad, [make_image('a.gif'), make_image('b.gif')])
+        new = attach_images(self.ad, [make_image('c.gif')], replace=True)
+        self.assertEqual(list(self.ad.images.all()), new)
+        self.assertTrue(new[0].is_primary)
+        self.assertEqual(self.ad.images_count, 1)
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        self.expires_at = timezone.now() + timedelta(days=30)
+
+    def create(self, title):
+        return create_with_unique_slug(
+            title,
+            lambda slug: Ad.objects.create(user=self.user, title=title, slug=slug, expires_at=self.expires_at),
+        )
+
+    def test_requetes_constantes_avec_doublons(self):
+        Ad.objects.bulk_create([
+            Ad(user=self.user, title='iPhone 13', slug='iphone-13' if i == 0 else f'iphone-13-{i}',
+               expires_at=self.expires_at)
+            for i in range(300)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            ad = self.create('iPhone 13')
+        with CaptureQueriesContext(connection) as other:
+            self.create('iPhone 13')
+        self.assertEqual(len(queries), len(other))
+        self.assertLessEqual(len(queries), 6)
+        self.assertRegex(ad.slug, r'^iphone-13-[0-9a-zA-Z]{6}$')
+
+    def test_titre_libre_et_titre_long(self):
+        self.assertEqual(self.create('Moto Yamaha').slug, 'moto-yamaha')
+        ad = self.create('x' * 120)
+        self.assertLessEqual(len(ad.slug), 50)
+        self.assertLessEqual(len(self.create('x' * 120).slug), 50)
+
+    def test_nouvel_essai_sur_collision(self):
+        Ad.objects.create(user=self.user, title='Moto', slug='moto', expires_at=self.expires_at)
+        with mock.patch('produit.slugs.allocate_slug', return_value='moto'):
+            ad = self.create('Moto')
+        self.assertRegex(ad.slug, r'^moto-[0-9a-zA-Z]{6}$')
+
+
+class AdExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='vendeur', password='x')
+        past = timezone.now() - timedelta(days=1)
+        self.expired = [make_ad(self.user, f'Échue {i}', expires_at=past) for i in range(5)]
+        self.active = make_ad(self.user, 'En cours')
+
+    def test_balayage_par_lots(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(expire_ads(batch_size=2), 5)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(Ad.objects.filter(status=AdStatus.EXPIRED).count(), 5)
+        self.active.refresh_from_db()
+        self.assertEqual(self.active.status, AdStatus.ACTIVE)
+        self.assertEqual(expire_ads(), 0)
+
+    def test_commande(self):
+        out = StringIO()
+        call_command('expire_ads', '--dry-run', stdout=out)
+        self.assertIn('5 annonce(s)', out.getvalue())
+        call_command('expire_ads', '--pause', '0', stdout=StringIO())
+        self.assertFalse(expired_ads().exists())
+
+    @skipUnless(connection.vendor == 'sqlite', "ANALYZE et texte d'EXPLAIN propres à SQLite")
+    def test_plans_d_execution(self):
+        # Distribution réaliste après balayage : toutes les actives sont en cours
+        expire_ads()
+        future = timezone.now() + timedelta(days=30)
+        Ad.objects.bulk_create([
+            Ad(user=self.user, title=f'Annonce {i}', slug=f'annonce-{i}', expires_at=future - timedelta(hours=i),
+               category=('vehicules', 'immobilier', 'emploi_stages')[i % 3])
+            for i in range(300)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        now = timezone.now()
+        listing = Ad.objects.filter(status=AdStatus.ACTIVE, expires_at__gt=now).order_by(
+            '-is_featured', '-is_urgent', '-created_at', 'id'
+        )
+        # Page de 20 : l'index de tri évite le tri temporaire
+        self.assertIn('ad_listing_idx', listing[:20].explain())
+        self.assertIn('ad_category_listing_idx', listing.filter(category='vehicules')[:20].explain())
+        self.assertIn('ad_expiry_idx', expired_ads(now).order_by('expires_at').explain())
@@ -0,0 +1,318 @@
+"""
+Compteurs en écriture différée : vues d'annonces, impressions et clics de
+publicités.
+
+Vues : une vue est dédoublonnée par (annonce, IP, utilisateur) dans le cache
+pendant AD_VIEW_DEDUPE_TTL secondes, puis ajoutée à la file ``ad-views``. Le
+vidage insère les AdView par lots (bulk_create), incrémente
+``Ad.views_count`` et les totaux de visiteurs en un seul UPDATE ... CASE par
+lot et alimente le cumul journalier AdViewDailyStat.
+
+Publicités : chaque impression ou clic est ajouté à la file
+``advertisement-events``. Le vidage agrège le lot par publicité et par heure,
+incrémente ``impressions``/``clicks`` avec F() et alimente
+AdvertisementHourlyStat.
+"""
+import operator
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, PositiveIntegerField, Q, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .buffering import register_buffer
+
+USER_AGENT_MAX_LENGTH = 512
+ADVERTISEMENT_CACHE_TIMEOUT = 300
+ADVERTISEMENT_EVENT_FIELDS = {'impression': 'impressions', 'click': 'clicks'}
+AD_VIEW_TOTAL_FIELDS = ('views_count', 'unique_visitors', 'authenticated_views', 'anonymous_views')
+
+
+def get_client_ip(request):
+    """Obtenir l'adresse IP du client"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '127.0.0.1')
+
+
+def event_datetime(timestamp):
+    """Date d'un événement, naïve ou non selon USE_TZ"""
+    value = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+    return value if settings.USE_TZ else timezone.make_naive(value)
+
+
+def increment_expression(field, increments):
+    """``field + n`` selon la clé primaire, pour un UPDATE groupé"""
+    return Case(
+        *[When(pk=pk, then=F(field) + count) for pk, count in increments.items() if count],
+        default=F(field),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def accumulate_counters(model, key_fields, counters):
+    """
+    Ajouter des compteurs à des lignes d'agrégat identifiées par
+    ``key_fields``, créées au besoin. ``counters`` associe un tuple de valeurs
+    des clés à un Counter {champ: incrément}.
+
+    Les lignes manquantes sont d'abord insérées à zéro en ignorant les
+    conflits, puis toutes sont incrémentées par un seul UPDATE ... CASE : deux
+    appels concurrents (écriture directe, sans verrou) sur une même clé
+    s'additionnent au lieu d'échouer sur la contrainte d'unicité.
+    """
+    if not counters:
+        return
+    conditions = {key: Q(**dict(zip(key_fields, key))) for key in counters}
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in counters],
+        ignore_conflicts=True,
+    )
+
+    fields = {field for counts in counters.values() for field in counts}
+    model.objects.filter(reduce(operator.or_, conditions.values())).update(**{
+        field: Case(
+            *[
+                When(conditions[key], then=F(field) + counts[field])
+                for key, counts in counters.items() if counts[field]
+            ],
+            default=F(field),
+            output_field=PositiveIntegerField(),
+        )
+        for field in fields
+    })
+
+
+def track_ad_view(ad, ip_address, user=None, user_agent=''):
+    """
+    Enregistrer une vue sans écrire en base.
+    Renvoie False si la vue a déjà été comptée récemment.
+    """
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    seen_key = f'produit:ad-view:{ad.pk}:{ip_address}:{user_id or 0}'
+    if not cache.add(seen_key, 1, settings.AD_VIEW_DEDUPE_TTL):
+        return False
+
+    ad_views_buffer.push({
+        'ad_id': str(ad.pk),
+        'user_id': user_id,
+        'ip_address': ip_address,
+        'user_agent': user_agent[:USER_AGENT_MAX_LENGTH],
+        'timestamp': time.time(),
+    })
+    return True
+
+
+def flush_ad_views(events):
+    """Persister un lot de vues : AdView nouvelles, compteurs et cumuls journaliers"""
+    from .models import Ad, AdView, AdViewDailyStat
+
+    ad_ids = {uuid.UUID(event['ad_id']) for event in events}
+    ips = {event['ip_address'] for event in events}
+
+    with transaction.atomic():
+        # Annonces supprimées entre-temps et vues déjà enregistrées (la clé
+        # unique n'empêche pas les doublons anonymes : user est NULL)
+        live_ads = set(Ad.objects.filter(pk__in=ad_ids).values_list('pk', flat=True))
+        seen = set()
+        visitors = set()
+        ip_days = set()
+        for ad_id, ip_address, user_id, created_at in (
+            AdView.objects
+            .filter(ad_id__in=live_ads, ip_address__in=ips)
+            .values_list('ad_id', 'ip_address', 'user_id', 'created_at')
+        ):
+            seen.add((ad_id, ip_address, user_id))
+            visitors.add((ad_id, ip_address))
+            ip_days.add((ad_id, ip_address, created_at.date()))
+
+        new_views = []
+        for event in events:
+            key = (uuid.UUID(event['ad_id']), event['ip_address'], event['user_id'])
+            if key[0] not in live_ads or key in seen:
+                continue
+            seen.add(key)
+            new_views.append(AdView(
+                ad_id=key[0],
+                user_id=key[2],
+                ip_address=key[1],
+                user_agent=event['user_agent'],
+            ))
+
+        # created_at est renseigné par bulk_create (auto_now_add)
+        AdView.objects.bulk_create(new_views, batch_size=500, ignore_conflicts=True)
+
+        totals = defaultdict(Counter)
+        daily = defaultdict(Counter)
+        for view in new_views:
+            day = view.created_at.date()
+            counts = daily[(view.ad_id, day)]
+            counts['views'] += 1
+            counts['authenticated' if view.user_id else 'anonymous'] += 1
+            if (view.ad_id, view.ip_address, day) not in ip_days:
+                ip_days.add((view.ad_id, view.ip_address, day))
+                counts['unique_ips'] += 1
+
+            ad_totals = totals[view.ad_id]
+            ad_totals['views_count'] += 1
+            ad_totals['authenticated_views' if view.user_id else 'anonymous_views'] += 1
+            if (view.ad_id, view.ip_address) not in visitors:
+                visitors.add((view.ad_id, view.ip_address))
+                ad_totals['unique_visitors'] += 1
+
+        if totals:
+            Ad.objects.filter(pk__in=totals).update(**{
+                field: increment_expression(field, {pk: counts[field] for pk, counts in totals.items()})
+                for field in AD_VIEW_TOTAL_FIELDS
+            })
+        accumulate_counters(AdViewDailyStat, ('ad_id', 'day'), daily)
+    return new_views
+
+
+def refresh_ad_view_totals(views=None, batch_size=1000):
+    """
+    Recalculer depuis AdView les totaux de visiteurs (Ad.unique_visitors,
+    authenticated_views, anonymous_views) des annonces ayant une vue dans le
+    queryset ``views`` (toutes les annonces vues si None).
+    """
+    from .models import Ad, AdView
+
+    ads = AdView.objects.all()
+    if views is not None:
+        ads = ads.filter(ad_id__in=views.values('ad_id'))
+    rows = (
+        ads
+        .values('ad_id')
+        .annotate(
+            unique_visitors=Count('ip_address', distinct=True),
+            authenticated_views=Count('id', filter=Q(user__isnull=False)),
+            anonymous_views=Count('id', filter=Q(user__isnull=True)),
+        )
+        .order_by()
+    )
+
+    fields = ['unique_visitors', 'authenticated_views', 'anonymous_views']
+    updated = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(Ad(pk=row.pop('ad_id'), **row))
+        if len(batch) >= batch_size:
+            updated += Ad.objects.bulk_update(batch, fields)
+            batch = []
+    return updated + Ad.objects.bulk_update(batch, fields)
+
+
+def compact_ad_view_stats(since=None, batch_size=1000):
+    """
+    Recalculer AdViewDailyStat depuis AdView (GROUP BY annonce, jour) à partir
+    de la date ``since`` (tout l'historique si None), ainsi que les totaux des
+    annonces concernées. À exécuter hors vidage : l'appelant tient le verrou
+    de la file ``ad-views``.
+    """
+    from .models import AdView, AdViewDailyStat
+
+    views = AdView.objects.all()
+    stats = AdViewDailyStat.objects.all()
+    if since is not None:
+        views = views.filter(created_at__date__gte=since)
+        stats = stats.filter(day__gte=since)
+
+    rows = (
+        views
+        .annotate(day=TruncDate('created_at'))
+        .values('ad_id', 'day')
+        .annotate(
+            views=Count('id'),
+            unique_ips=Count('ip_address', distinct=True),
+            authenticated=Count('id', filter=Q(user__isnull=False)),
+            anonymous=Count('id', filter=Q(user__isnull=True)),
+        )
+        .order_by()
+    )
+
+    created = 0
+    with transaction.atomic():
+        stats.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(AdViewDailyStat(**row))
+            if len(batch) >= batch_size:
+                created += len(AdViewDailyStat.objects.bulk_create(batch))
+                batch = []
+        created += len(AdViewDailyStat.objects.bulk_create(batch))
+        refresh_ad_view_totals(None if since is None else views, batch_size)
+    return created
+
+
+# ----- Publicités -----
+
+def get_trackable_advertisement(pk):
+    """
+    Publicité active et approuvée, sous forme {'id', 'link'} mise en cache
+    (les beacons d'impression ne font aucune requête SQL). None si introuvable.
+    """
+    from .models import Advertisement
+
+    key = f'produit:advertisement:{pk}'
+    data = cache.get(key)
+    if data is None:
+        row = (
+            Advertisement.objects
+            .filter(pk=pk, is_active=True, is_approved=True)
+            .values('id', 'link')
+            .first()
+        )
+        data = row or {}
+        cache.set(key, data, ADVERTISEMENT_CACHE_TIMEOUT)
+    return data or None
+
+
+def forget_advertisement(pk):
+    cache.delete(f'produit:advertisement:{pk}')
+
+
+def track_advertisement_event(advertisement_id, kind):
+    """Enregistrer une impression ('impression') ou un clic ('click')"""
+    advertisement_events_buffer.push({
+        'advertisement_id': advertisement_id,
+        'kind': kind,
+        'timestamp': time.time(),
+    })
+
+
+def flush_advertisement_events(events):
+    """Appliquer un lot d'impressions/clics : compteurs et séries horaires"""
+    from .models import Advertisement, AdvertisementHourlyStat
+
+    totals = defaultdict(Counter)
+    hourly = defaultdict(Counter)
+    for event in events:
+        field = ADVERTISEMENT_EVENT_FIELDS[event['kind']]
+        hour = event_datetime(event['timestamp']).replace(minute=0, second=0, microsecond=0)
+        totals[event['advertisement_id']][field] += 1
+        hourly[(event['advertisement_id'], hour)][field] += 1
+
+    with transaction.atomic():
+        live = set(Advertisement.objects.filter(pk__in=totals).values_list('pk', flat=True))
+        if live:
+            Advertisement.objects.filter(pk__in=live).update(**{
+                field: increment_expression(field, {pk: totals[pk][field] for pk in live})
+                for field in ADVERTISEMENT_EVENT_FIELDS.values()
+            })
+        accumulate_counters(
+            AdvertisementHourlyStat,
+            ('advertisement_id', 'hour'),
+            {key: counts for key, counts in hourly.items() if key[0] in live},
+        )
+
+
+ad_views_buffer = register_buffer('ad-views', flush_ad_views)
+advertisement_events_buffer = register_buffer('advertisement-events', flush_advertisement_events)
@@ -0,0 +1,195 @@
+"""
+Réception des images envoyées avec les annonces et les publicités.
+
+Les handlers par défaut de Django gardent en mémoire les fichiers de moins de
+2,5 Mo et ne laissent vérifier la taille qu'une fois tout le corps reçu.
+``ImageUploadHandler`` écrit chaque fichier par morceaux dans un fichier
+temporaire et interrompt l'envoi dès que :
+
+- le corps annoncé (Content-Length) dépasse ce que la vue peut accepter ;
+- un fichier dépasse la taille maximale ou la vue reçoit trop de fichiers ;
+- les premiers octets ne correspondent à aucun format autorisé (JPEG, PNG,
+  GIF, WebP), quelle que soit l'extension annoncée ;
+- l'envoi dure plus de UPLOAD_TIMEOUT secondes.
+
+Une fois le fichier reçu, Pillow lit l'en-tête (dimensions bornées par
+UPLOAD_MAX_IMAGE_PIXELS) puis ``verify()`` le contrôle sans décoder les
+pixels. Le débit de chaque envoi est journalisé.
+
+``ImageMultiPartParser`` installe ce handler pour les vues qui le déclarent
+et renvoie les refus sous forme d'erreur de validation (400).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+# Format Pillow -> signatures possibles en début de fichier
+SIGNATURES = {
+    'JPEG': (b'\xff\xd8\xff',),
+    'PNG': (b'\x89PNG\r\n\x1a\n',),
+    'GIF': (b'GIF87a', b'GIF89a'),
+    'WEBP': (b'RIFF',),  # complété par 'WEBP' aux octets 8 à 12
+}
+SNIFF_LENGTH = 12
+# Marge pour les champs texte et les en-têtes multipart
+FORM_OVERHEAD = 256 * 1024
+
+
+def sniff_format(header):
+    """Format Pillow correspondant aux premiers octets, ou None"""
+    for image_format, signatures in SIGNATURES.items():
+        if header.startswith(signatures):
+            if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                continue
+            return image_format
+    return None
+
+
+class UploadRejected(MultiPartParserError):
+    """Envoi refusé : ``field`` est le champ de formulaire concerné"""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Handler en flux vers un fichier temporaire, avec contrôles au fil de l'eau"""
+
+    def __init__(self, request=None, max_file_size=5 * 1024 * 1024, max_files=1):
+        super().__init__(request)
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.files_received = 0
+        self.bytes_received = 0
+        self.started_at = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.started_at = time.monotonic()
+        limit = self.max_files * self.max_file_size + FORM_OVERHEAD
+        if content_length and content_length > limit:
+            raise UploadRejected(
+                'non_field_errors',
+                f"La requête dépasse la taille maximale autorisée ({limit // (1024 * 1024)}Mo)."
+            )
+        return None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        self.files_received += 1
+        if self.files_received > self.max_files:
+            raise UploadRejected(
+                field_name, f"Vous ne pouvez ajouter que {self.max_files} image(s) maximum."
+            )
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.header = b''
+        self.detected_format = None
+        self.file_started_at = time.monotonic()
+
+    def reject(self, message):
+        self.file.close()
+        raise UploadRejected(self.field_name, message)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_file_size:
+            self.reject(
+                f"L'image {self.file_name} dépasse la taille maximale de "
+                f"{self.max_file_size // (1024 * 1024)}Mo."
+            )
+        if time.monotonic() - self.started_at > settings.UPLOAD_TIMEOUT:
+            self.reject("L'envoi des images a pris trop de temps, veuillez réessayer.")
+
+        if self.detected_format is None:
+            self.header += raw_data[:SNIFF_LENGTH - len(self.header)]
+            if len(self.header) >= SNIFF_LENGTH:
+                self.check_signature()
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_signature(self):
+        self.detected_format = sniff_format(self.header)
+        if self.detected_format is None:
+            self.reject(
+                f"Le fichier {self.file_name} n'est pas une image JPEG, PNG, GIF ou WebP."
+            )
+
+    def file_complete(self, file_size):
+        if self.detected_format is None:
+            self.check_signature()  # fichier plus court que SNIFF_LENGTH
+        uploaded = super().file_complete(file_size)
+        self.verify_image(uploaded)
+
+        elapsed = time.monotonic() - self.file_started_at
+        self.bytes_received += file_size
+        logger.info(
+            'Image reçue %s (%s) : %d octets en %.3fs, %.0f Ko/s',
+            self.file_name, self.detected_format, file_size, elapsed,
+            file_size / 1024 / elapsed if elapsed else 0,
+        )
+        return uploaded
+
+    def verify_image(self, uploaded):
+        """Contrôle Pillow en mémoire bornée : en-tête puis verify(), sans décodage"""
+        try:
+            with Image.open(uploaded.file) as image:
+                width, height = image.size
+                if width * height > settings.UPLOAD_MAX_IMAGE_PIXELS:
+                    self.reject(
+                        f"L'image {self.file_name} est trop grande ({width}x{height} pixels)."
+                    )
+                if image.format != self.detected_format:
+                    self.reject(f"Le contenu de {self.file_name} ne correspond pas à son format.")
+                image.verify()
+        except UploadRejected:
+            raise
+        except Exception:
+            # DecompressionBombError compris
+            self.reject(f"Le fichier {self.file_name} n'est pas une image valide.")
+        uploaded.file.seek(0)
+
+    def upload_complete(self):
+        if self.started_at is not None and self.files_received:
+            elapsed = time.monotonic() - self.started_at
+            logger.info(
+                'Envoi terminé : %d fichier(s), %d octets en %.3fs, %.0f Ko/s',
+                self.files_received, self.bytes_received, elapsed,
+                self.bytes_received / 1024 / elapsed if elapsed else 0,
+            )
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """
+    Parser multipart utilisant ImageUploadHandler. Les limites sont lues sur la
+    vue : ``upload_max_file_size`` (octets) et ``upload_max_files``.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        view = parser_context.get('view')
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+
+        handler = ImageUploadHandler(
+            request._request,
+            max_file_size=getattr(view, 'upload_max_file_size', 5 * 1024 * 1024),
+            max_files=getattr(view, 'upload_max_files', 1),
+        )
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [handler], encoding)
+            data, files = parser.parse()
+            return DataAndFiles(data, files)
+        except UploadRejected as exc:
+            logger.warning('Envoi refusé (%s) : %s', exc.field, exc.message)
+            raise ValidationError({exc.field: [exc.message]})
+        except MultiPartParserError as exc:
+            raise ParseError('Multipart form parse error - %s' % str(exc))
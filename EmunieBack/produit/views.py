@@ -1,13 +1,16 @@
 from rest_framework import generics, status, permissions, filters
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.parsers import FormParser, JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg, F, Prefetch
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from datetime import timedelta
 
+from EmunieBack.response_cache import cache_response
+
 User = get_user_model()
 
 from .models import (
@@ -21,7 +24,16 @@ from .serializers import (
     CategoryChoiceSerializer, CityChoiceSerializer
 )
 from .permissions import IsOwnerOrReadOnly
+from .filters import AdSearchFilter
+from .pagination import AdCursorPagination
+from .home_feed import get_home_payload, with_favorites
+from .sampling import advertisements_sampler
+from .tracking import (
+    get_client_ip, get_trackable_advertisement, track_ad_view, track_advertisement_event
+)
+from .uploadhandlers import ImageMultiPartParser
 
+@cache_response('reference')
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_categories(request):
@@ -29,6 +41,7 @@ def get_categories(request):
     categories = [{'value': value, 'label': label} for value, label in CATEGORY_CHOICES]
     return Response({'categories': categories})
 
+@cache_response('reference')
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_cities(request):
@@ -37,19 +50,33 @@ def get_cities(request):
     return Response({'cities': cities})
 
 class AdListView(generics.ListAPIView):
-    """Liste des annonces avec filtres"""
+    """
+    Liste des annonces avec filtres
+
+    ?pagination=cursor active la pagination keyset (défilement infini) :
+    pas de COUNT(*) ni d'OFFSET, tri fixe (mises en avant, urgentes, récentes).
+    """
     serializer_class = AdListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description']
+    filter_backends = [filters.OrderingFilter, AdSearchFilter]
     ordering_fields = ['created_at', 'price', 'views_count', 'favorites_count']
-    ordering = ['-is_featured', '-is_urgent', '-created_at']
+    ordering = ['-is_featured', '-is_urgent', '-created_at', 'id']
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or params.get(AdCursorPagination.cursor_query_param):
+                self._paginator = AdCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
 
     def get_queryset(self):
-        queryset = Ad.objects.filter(
+        queryset = Ad.objects.for_listing(self.request.user).filter(
             status=AdStatus.ACTIVE,
             expires_at__gt=timezone.now()
-        ).select_related('user').prefetch_related('images')
+        )
 
         # Filtres personnalisés
         category = self.request.query_params.get('category', None)
@@ -73,55 +100,40 @@ class AdListView(generics.ListAPIView):
 
 class AdDetailView(generics.RetrieveAPIView):
     """Détail d'une annonce"""
-    queryset = Ad.objects.select_related('user').prefetch_related('images')
     serializer_class = AdDetailSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'pk'
 
+    def get_queryset(self):
+        return Ad.objects.for_listing(self.request.user).prefetch_related('images')
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        # Enregistrer la vue seulement si l'annonce est active
+        # Enregistrer la vue seulement si l'annonce est active. L'écriture
+        # (AdView et views_count) est différée : voir produit.tracking
         if instance.status == AdStatus.ACTIVE:
-            client_ip = self.get_client_ip(request)
-            user_agent = request.META.get('HTTP_USER_AGENT', '')
-
-            # Créer la vue avec get_or_create pour éviter les doublons
-            if request.user.is_authenticated:
-                view_obj, created = AdView.objects.get_or_create(
-                    ad=instance,
-                    user=request.user,
-                    ip_address=client_ip,
-                    defaults={'user_agent': user_agent}
-                )
-            else:
-                view_obj, created = AdView.objects.get_or_create(
-                    ad=instance,
-                    ip_address=client_ip,
-                    user=None,
-                    defaults={'user_agent': user_agent}
-                )
-
-            # Incrémenter le compteur de vues seulement si c'est une nouvelle vue
-            if created:
-                Ad.objects.filter(pk=instance.pk).update(views_count=F('views_count') + 1)
+            track_ad_view(
+                instance,
+                self.get_client_ip(request),
+                user=request.user,
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            )
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
     def get_client_ip(self, request):
         """Obtenir l'adresse IP du client"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+        return get_client_ip(request)
 
 class AdCreateView(generics.CreateAPIView):
     """Créer une annonce"""
     serializer_class = AdCreateUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, FormParser, ImageMultiPartParser]
+    upload_max_file_size = 5 * 1024 * 1024  # 5Mo par image
+    upload_max_files = 3
 
     def perform_create(self, serializer):
         ad = serializer.save(user=self.request.user)
@@ -135,6 +147,9 @@ class AdUpdateView(generics.UpdateAPIView):
     """Modifier une annonce"""
     serializer_class = AdCreateUpdateSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    parser_classes = [JSONParser, FormParser, ImageMultiPartParser]
+    upload_max_file_size = 5 * 1024 * 1024  # 5Mo par image
+    upload_max_files = 3
 
     def get_queryset(self):
         return Ad.objects.filter(user=self.request.user)
@@ -162,9 +177,9 @@ class MyAdsView(generics.ListAPIView):
     search_fields = ['title', 'description']
 
     def get_queryset(self):
-        return Ad.objects.filter(
+        return Ad.objects.for_listing(self.request.user).filter(
             user=self.request.user
-        ).select_related('user').prefetch_related('images')
+        )
 
 class FavoriteListView(generics.ListAPIView):
     """Liste des favoris de l'utilisateur"""
@@ -174,7 +189,9 @@ class FavoriteListView(generics.ListAPIView):
     def get_queryset(self):
         return Favorite.objects.filter(
             user=self.request.user
-        ).select_related('ad__user').order_by('-created_at')
+        ).prefetch_related(
+            Prefetch('ad', queryset=Ad.objects.for_listing(self.request.user))
+        ).order_by('-created_at')
 
 class FavoriteToggleView(APIView):
     """Ajouter/retirer des favoris"""
@@ -206,9 +223,11 @@ class FavoriteToggleView(APIView):
             Ad.objects.filter(pk=ad.pk).update(favorites_count=F('favorites_count') + 1)
             return Response({'favorited': True, 'message': 'Ajouté aux favoris'})
         else:
-            # Retiré des favoris
-            favorite.delete()
-            Ad.objects.filter(pk=ad.pk).update(favorites_count=F('favorites_count') - 1)
+            # Retiré des favoris ; deux retraits simultanés ne décrémentent
+            # qu'une fois (seul celui qui supprime la ligne décompte)
+            deleted, _ = Favorite.objects.filter(pk=favorite.pk).delete()
+            if deleted:
+                Ad.objects.filter(pk=ad.pk, favorites_count__gt=0).update(favorites_count=F('favorites_count') - 1)
             return Response({'favorited': False, 'message': 'Retiré des favoris'})
 
 class AdReportCreateView(generics.CreateAPIView):
@@ -230,59 +249,14 @@ class AdReportCreateView(generics.CreateAPIView):
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def home_data(request):
-    """Données pour la page d'accueil"""
-    now = timezone.now()
-
-    # ========== ANNONCES EN VEDETTE (max 6, affichage aléatoire, NON urgentes) ==========
-    # Afficher TOUTES les annonces actives (sauf urgentes) de façon aléatoire
-    featured_ads = Ad.objects.filter(
-        status=AdStatus.ACTIVE,
-        is_urgent=False,  # ✅ Exclure uniquement les annonces urgentes
-        expires_at__gt=now
-    ).select_related('user').prefetch_related('images').order_by('?')[:4]  # ✅ Ordre aléatoire, max 6
-
-    # ========== ANNONCES RÉCENTES (12 dernières, ordre chronologique) ==========
-    recent_ads = Ad.objects.filter(
-        status=AdStatus.ACTIVE,
-        expires_at__gt=now
-    ).select_related('user').prefetch_related('images').order_by('-created_at')[:12]
-
-    # ========== ANNONCES URGENTES (max 6, affichage aléatoire) ==========
-    urgent_ads = Ad.objects.filter(
-        status=AdStatus.ACTIVE,
-        is_urgent=True,
-        expires_at__gt=now
-    ).select_related('user').prefetch_related('images').order_by('?')[:4]  # ✅ Ordre aléatoire, max 6
-
-    # Statistiques par catégorie
-    categories_stats = []
-    for value, label in CATEGORY_CHOICES:
-        count = Ad.objects.filter(status=AdStatus.ACTIVE, category=value).count()
-        if count > 0:
-            categories_stats.append({
-                'value': value,
-                'label': label,
-                'count': count
-            })
-
-    # Statistiques globales
-    stats = {
-        'total_ads': Ad.objects.filter(status=AdStatus.ACTIVE).count(),
-        'total_users': User.objects.filter(is_active=True).count(),
-        'ads_today': Ad.objects.filter(
-            created_at__date=now.date(),
-            status=AdStatus.ACTIVE
-        ).count(),
-    }
+    """
+    Données pour la page d'accueil
 
-    return Response({
-        'featured_ads': AdListSerializer(featured_ads, many=True, context={'request': request}).data,
-        'recent_ads': AdListSerializer(recent_ads, many=True, context={'request': request}).data,
-        'urgent_ads': AdListSerializer(urgent_ads, many=True, context={'request': request}).data,
-        'categories': categories_stats,
-        'cities': [{'value': v, 'label': l} for v, l in CITY_CHOICES[:10]],  # Top 10 villes
-        'stats': stats
-    })
+    Servies depuis l'instantané en cache (voir produit.home_feed) : aucune
+    requête SQL sur le chemin critique pour un visiteur anonyme, une seule
+    (ses favoris, pour is_favorited) pour un utilisateur connecté.
+    """
+    return Response(with_favorites(get_home_payload(), request.user))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -296,29 +270,49 @@ def ad_statistics(request, pk):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    # Statistiques des vues par jour (7 derniers jours)
-    from datetime import date
+    # Série journalière lue depuis le cumul AdViewDailyStat (une seule plage
+    # indexée) : 7 jours par défaut, ?days=30 ou 90, 365 au maximum
+    try:
+        days = min(max(int(request.query_params.get('days', 7)), 1), 365)
+    except ValueError:
+        days = 7
+    today = timezone.now().date()
+    since = today - timedelta(days=days - 1)
+    week_start = today - timedelta(days=6)
+    daily = {
+        stat['day']: stat
+        for stat in ad.daily_stats.filter(day__gte=min(since, week_start)).values(
+            'day', 'views', 'unique_ips', 'authenticated', 'anonymous'
+        )
+    }
+
     views_by_day = []
-    for i in range(7):
-        day = date.today() - timedelta(days=i)
-        views_count = ad.views.filter(created_at__date=day).count()
+    for i in range(days):
+        day = since + timedelta(days=i)
         views_by_day.append({
             'date': day.isoformat(),
-            'views': views_count
+            'views': daily.get(day, {}).get('views', 0)
         })
 
+    def total(field, start=since):
+        return sum(stat[field] for day, stat in daily.items() if day >= start)
+
     stats = {
         'total_views': ad.views_count,
         'total_favorites': ad.favorites_count,
-        'total_images': ad.images.count(),
-        'views_today': ad.views.filter(created_at__date=timezone.now().date()).count(),
-        'views_this_week': ad.views.filter(
-            created_at__gte=timezone.now() - timedelta(days=7)
-        ).count(),
-        'views_by_day': list(reversed(views_by_day)),
-        'unique_visitors': ad.views.values('ip_address').distinct().count(),
-        'authenticated_views': ad.views.filter(user__isnull=False).count(),
-        'anonymous_views': ad.views.filter(user__isnull=True).count(),
+        'total_images': ad.images_count,
+        'days': days,
+        'views_today': total('views', today),
+        'views_this_week': total('views', week_start),
+        'views_by_day': views_by_day,
+        # Totaux depuis la publication, dénormalisés sur l'annonce
+        'unique_visitors': ad.unique_visitors,
+        'authenticated_views': ad.authenticated_views,
+        'anonymous_views': ad.anonymous_views,
+        # Sur la période : un même visiteur compte une fois par jour
+        'unique_visitors_in_period': total('unique_ips'),
+        'authenticated_views_in_period': total('authenticated'),
+        'anonymous_views_in_period': total('anonymous'),
     }
 
     return Response(stats)
@@ -329,15 +323,12 @@ class AdvertisementListView(generics.ListAPIView):
     """Liste des publicités actives"""
     serializer_class = AdvertisementSerializer
     permission_classes = [permissions.AllowAny]
+    # Le résultat est une liste déjà mélangée : ni filtre ni tri SQL
+    filter_backends = []
 
     def get_queryset(self):
-        now = timezone.now()
-        return Advertisement.objects.filter(
-            is_active=True,
-            is_approved=True,
-            start_date__lte=now,
-            end_date__gte=now
-        ).order_by('?')  # Ordre aléatoire
+        # Ordre aléatoire tiré depuis un pool d'identifiants en cache
+        return advertisements_sampler.sample()
 
 class MyAdvertisementsView(generics.ListAPIView):
     """Mes publicités"""
@@ -351,6 +342,9 @@ class AdvertisementCreateView(generics.CreateAPIView):
     """Créer une publicité"""
     serializer_class = AdvertisementCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, FormParser, ImageMultiPartParser]
+    upload_max_file_size = 2 * 1024 * 1024  # 2Mo pour l'affiche
+    upload_max_files = 1
 
     def perform_create(self, serializer):
         advertisement = serializer.save(user=self.request.user)
@@ -367,26 +361,22 @@ class AdvertisementDetailView(generics.RetrieveAPIView):
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def track_ad_impression(request, pk):
-    """Enregistrer une impression de publicité"""
-    try:
-        ad = Advertisement.objects.get(pk=pk, is_active=True, is_approved=True)
-        ad.impressions += 1
-        ad.save(update_fields=['impressions'])
-        return Response({'success': True})
-    except Advertisement.DoesNotExist:
+    """Enregistrer une impression de publicité (écriture différée)"""
+    ad = get_trackable_advertisement(pk)
+    if ad is None:
         return Response({'error': 'Publicité introuvable'}, status=status.HTTP_404_NOT_FOUND)
+    track_advertisement_event(ad['id'], 'impression')
+    return Response({'success': True})
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def track_ad_click(request, pk):
-    """Enregistrer un clic sur une publicité"""
-    try:
-        ad = Advertisement.objects.get(pk=pk, is_active=True, is_approved=True)
-        ad.clicks += 1
-        ad.save(update_fields=['clicks'])
-        return Response({'success': True, 'redirect_url': ad.link})
-    except Advertisement.DoesNotExist:
+    """Enregistrer un clic sur une publicité (écriture différée)"""
+    ad = get_trackable_advertisement(pk)
+    if ad is None:
         return Response({'error': 'Publicité introuvable'}, status=status.HTTP_404_NOT_FOUND)
+    track_advertisement_event(ad['id'], 'click')
+    return Response({'success': True, 'redirect_url': ad['link']})
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -400,6 +390,27 @@ def advertisement_statistics(request, pk):
             status=status.HTTP_404_NOT_FOUND
         )
 
+    # Série horaire (48 dernières heures par défaut, 31 jours au maximum)
+    try:
+        hours = min(max(int(request.query_params.get('hours', 48)), 1), 24 * 31)
+    except ValueError:
+        hours = 48
+    current_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    since = current_hour - timedelta(hours=hours - 1)
+    hourly = {
+        stat['hour']: stat
+        for stat in ad.hourly_stats.filter(hour__gte=since).values('hour', 'impressions', 'clicks')
+    }
+    timeline = []
+    for i in range(hours):
+        hour = since + timedelta(hours=i)
+        stat = hourly.get(hour, {})
+        timeline.append({
+            'hour': hour.isoformat(),
+            'impressions': stat.get('impressions', 0),
+            'clicks': stat.get('clicks', 0),
+        })
+
     stats = {
         'impressions': ad.impressions,
         'clicks': ad.clicks,
@@ -408,6 +419,7 @@ def advertisement_statistics(request, pk):
         'days_remaining': (ad.end_date - timezone.now()).days if ad.end_date > timezone.now() else 0,
         'total_spent': float(ad.total_price),
         'cost_per_click': float(ad.total_price / ad.clicks) if ad.clicks > 0 else 0,
+        'hourly': timeline,
     }
 
     return Response(stats)
@@ -440,6 +452,7 @@ class MypubliciteView(APIView):
 
 from .models import AdType, AdStatus
 
+@cache_response('reference')
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_ad_types(request):
@@ -447,6 +460,7 @@ def get_ad_types(request):
     ad_types = [{'value': value, 'label': label} for value, label in AdType.choices]
     return Response({'ad_types': ad_types})
 
+@cache_response('reference')
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_ad_statuses(request):
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import CustomUser, UserRating, Conversation, Message, EmailVerification, PhoneVerification
+from .models import (
+    CustomUser, UserRating, Conversation, ConversationParticipant, Message, EmailVerification, PhoneVerification
+)
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -60,13 +62,19 @@ class UserRatingAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('rater', 'rated_user')
 
+class ConversationParticipantInline(admin.TabularInline):
+    model = ConversationParticipant
+    extra = 0
+    raw_id_fields = ('user', 'last_read_message')
+    readonly_fields = ('unread_count',)
+
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     """Administration des conversations"""
     list_display = ('id', 'participants_display', 'created_at', 'updated_at', 'message_count')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('participants__username',)
-    filter_horizontal = ('participants',)
+    inlines = [ConversationParticipantInline]
     
     def participants_display(self, obj):
         return ', '.join([p.username for p in obj.participants.all()])
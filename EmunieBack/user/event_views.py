@@ -0,0 +1,146 @@
+"""
+Diffusion des événements de messagerie (user.events) : vues asynchrones qui
+attendent sans requête en base ni thread bloqué, à la place de
+l'interrogation répétée des conversations et des messages.
+
+Les deux vues sont réservées au service ASGI (EmunieBack.asgi) : sous WSGI,
+chaque connexion immobiliserait un thread de worker gunicorn.
+
+- ``events/`` : flux SSE (EventSource). Refermé après MESSAGE_EVENTS_STREAM_SECONDS : le
+  navigateur se reconnecte avec Last-Event-ID, et un jeton expiré est refusé.
+- ``events/poll/?since=<id>&timeout=<s>`` : long-poll JSON, répond dès le
+  premier événement ou après ``timeout`` secondes ; le client repart du
+  ``last_event_id`` renvoyé.
+
+EventSource ne permet pas d'en-tête Authorization, et un jeton JWT dans
+l'URL finirait en clair dans les journaux d'accès : le client obtient d'abord
+un ticket à usage unique (``POST events/ticket/``, authentifié normalement,
+valable TICKET_TIMEOUT secondes) et le passe dans ``?ticket=``. Le ticket
+étant consommé à l'ouverture, chaque reconnexion en demande un nouveau et
+transmet le dernier identifiant reçu dans ``last_event_id``.
+"""
+import asyncio
+import json
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import permissions
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+
+from .events import get_event_broker
+
+HEARTBEAT_SECONDS = 15
+POLL_TIMEOUT = 25
+RETRY_MILLISECONDS = 3000
+TICKET_KEY = 'user:events:ticket:{ticket}'
+TICKET_TIMEOUT = 30
+
+
+class EventTicketView(APIView):
+    """Ticket à usage unique pour ouvrir un flux SSE sans jeton dans l'URL"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        ticket = secrets.token_urlsafe(32)
+        cache.set(TICKET_KEY.format(ticket=ticket), request.user.pk, TICKET_TIMEOUT)
+        return Response({'ticket': ticket, 'expires_in': TICKET_TIMEOUT})
+
+
+def redeem_ticket(ticket):
+    """Utilisateur du ticket, qui est consommé ; None s'il est inconnu, expiré ou déjà utilisé"""
+    key = TICKET_KEY.format(ticket=ticket)
+    user_id = cache.get(key)
+    if user_id is None or not cache.delete(key):  # une seule suppression réussit
+        return None
+    return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+
+def authenticate(request):
+    """Utilisateur authentifié par ``?ticket=`` ou par les authentifications DRF, sinon None"""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return redeem_ticket(ticket)
+    authenticators = [authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        user = Request(request, authenticators=authenticators).user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+def authentication_required():
+    return JsonResponse({'error': 'Authentification requise'}, status=401)
+
+
+def asgi_required():
+    return JsonResponse({'error': 'Événements disponibles via le service ASGI uniquement'}, status=501)
+
+
+def format_event(event):
+    data = json.dumps(event.data, cls=JSONEncoder)
+    return f'id: {event.id}\nevent: {event.type}\ndata: {data}\n\n'
+
+
+async def stream_events(user_id, last_event_id, duration):
+    loop_time = asyncio.get_running_loop().time
+    deadline = loop_time() + duration
+    async with get_event_broker().subscribe(user_id, last_event_id) as subscription:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while (remaining := deadline - loop_time()) > 0:
+            events = await subscription.get(min(HEARTBEAT_SECONDS, remaining))
+            if not events:
+                yield ': ping\n\n'  # garde la connexion ouverte à travers les proxys
+            for event in events:
+                yield format_event(event)
+
+
+@require_GET
+async def event_stream(request):
+    """Flux SSE des événements de l'utilisateur"""
+    if not isinstance(request, ASGIRequest):
+        # Sous WSGI, Django consommerait en outre le flux entier avant de répondre
+        return asgi_required()
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return authentication_required()
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(
+        stream_events(user.pk, last_event_id, settings.MESSAGE_EVENTS_STREAM_SECONDS),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # pas de mise en tampon nginx
+    return response
+
+
+@require_GET
+async def poll_events(request):
+    """Long-poll : événements postérieurs à ``since``"""
+    if not isinstance(request, ASGIRequest):
+        return asgi_required()
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return authentication_required()
+    try:
+        timeout = min(max(float(request.GET.get('timeout', POLL_TIMEOUT)), 0.1), POLL_TIMEOUT)
+    except ValueError:
+        timeout = POLL_TIMEOUT
+
+    async with get_event_broker().subscribe(user.pk, request.GET.get('since')) as subscription:
+        events = await subscription.get(timeout)
+    return JsonResponse(
+        {'events': [event.as_dict() for event in events], 'last_event_id': subscription.last_id},
+        encoder=JSONEncoder,
+    )
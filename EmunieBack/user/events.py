@@ -0,0 +1,270 @@
+"""
+Événements de messagerie poussés aux clients (nouveaux messages, non lus),
+servis par les vues asynchrones de user.event_views (SSE ou long-poll).
+
+Les vues d'écriture publient (``publish_message``, ``publish_read``) ; chaque
+connexion ouverte s'abonne aux événements de son utilisateur via le broker :
+
+- ``InProcessBroker`` : en mémoire, pour un déploiement à un seul processus
+  (uvicorn sans workers multiples, tests, développement) ;
+- ``RedisStreamBroker`` : un flux Redis par utilisateur, partagé entre les
+  workers gunicorn qui publient et le processus ASGI qui diffuse.
+
+Le broker peut être forcé via ``settings.MESSAGE_EVENTS_BROKER`` (chemin
+pointé) ; par défaut Redis si REDIS_URL est défini. Interface d'un broker :
+``publish(user_id, event_type, data)`` (synchrone) et
+``subscribe(user_id, last_event_id=None)``, contexte asynchrone qui fournit
+un abonnement (``last_id``, ``await get(timeout)`` -> liste d'événements).
+
+Chaque événement porte un identifiant : un client qui se reconnecte avec le
+dernier reçu (Last-Event-ID) reçoit ceux qu'il a manqués, dans la limite de
+l'historique conservé ; au-delà, il se resynchronise par l'API des messages.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 50
+
+
+@dataclass
+class Event:
+    id: str
+    type: str
+    data: dict
+
+    def as_dict(self):
+        return {'id': self.id, 'type': self.type, 'data': self.data}
+
+
+class InProcessSubscription:
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def push(self, event):
+        """Appelé depuis n'importe quel thread"""
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:  # boucle fermée : la connexion est partie
+            pass
+
+    async def get(self, timeout):
+        """Événements disponibles, en attendant le premier au plus ``timeout`` secondes"""
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        self.last_id = events[-1].id
+        return events
+
+
+class InProcessBroker:
+    """
+    Broker en mémoire du processus. Les identifiants sont préfixés par une
+    marque de démarrage : après un redémarrage, un ancien Last-Event-ID ne
+    rejoue rien au lieu de masquer les nouveaux événements.
+    """
+    history_size = HISTORY_SIZE
+    max_history_users = 10000
+
+    def __init__(self):
+        self.boot = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._history = OrderedDict()
+
+    def parse_id(self, event_id):
+        boot, _, number = (event_id or '').partition('-')
+        if boot != self.boot or not number.isdigit():
+            return None
+        return int(number)
+
+    def publish(self, user_id, event_type, data):
+        with self._lock:
+            event = Event(f'{self.boot}-{next(self._ids)}', event_type, data)
+            history = self._history.pop(user_id, None) or deque(maxlen=self.history_size)
+            history.append(event)
+            self._history[user_id] = history
+            if len(self._history) > self.max_history_users:
+                self._history.popitem(last=False)
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+        return event
+
+    @asynccontextmanager
+    async def subscribe(self, user_id, last_event_id=None):
+        with self._lock:
+            history = list(self._history.get(user_id, ()))
+            after = self.parse_id(last_event_id)
+            if after is not None:
+                missed = [event for event in history if self.parse_id(event.id) > after]
+                subscription = InProcessSubscription(last_event_id)
+            else:
+                missed = []
+                subscription = InProcessSubscription(history[-1].id if history else f'{self.boot}-0')
+            for event in missed:
+                subscription.queue.put_nowait(event)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._subscriptions.get(user_id)
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[user_id]
+
+
+class RedisStreamSubscription:
+    def __init__(self, client, key, last_id):
+        self.client = client
+        self.key = key
+        self.last_id = last_id
+
+    async def get(self, timeout):
+        # BLOCK 0 attendrait indéfiniment : au moins 1 ms
+        block = max(1, int(timeout * 1000))
+        response = await self.client.xread({self.key: self.last_id}, count=100, block=block)
+        events = []
+        for _, entries in response or ():
+            for entry_id, fields in entries:
+                entry_id = entry_id.decode()
+                events.append(Event(entry_id, fields[b'type'].decode(), json.loads(fields[b'data'])))
+                self.last_id = entry_id
+        return events
+
+
+class RedisStreamBroker:
+    """
+    Un flux Redis par utilisateur (XADD borné à ``history_size`` entrées,
+    expiré après ``ttl`` secondes d'inactivité) ; les identifiants de flux
+    servent directement de Last-Event-ID.
+    """
+    history_size = HISTORY_SIZE
+    ttl = 86400
+
+    def __init__(self, url=None):
+        self.url = url or settings.REDIS_URL
+        self.client = self.connect()
+
+    def connect(self):
+        import redis
+
+        return redis.Redis.from_url(self.url)
+
+    def connect_async(self):
+        import redis.asyncio
+
+        return redis.asyncio.Redis.from_url(self.url)
+
+    def key(self, user_id):
+        return f'emunie:events:{user_id}'
+
+    def publish(self, user_id, event_type, data):
+        key = self.key(user_id)
+        pipe = self.client.pipeline()
+        pipe.xadd(
+            key, {'type': event_type, 'data': json.dumps(data, cls=JSONEncoder)},
+            maxlen=self.history_size, approximate=True,
+        )
+        pipe.expire(key, self.ttl)
+        entry_id, _ = pipe.execute()
+        return Event(entry_id.decode(), event_type, data)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id, last_event_id=None):
+        client = self.connect_async()
+        key = self.key(user_id)
+        try:
+            if not last_event_id:
+                latest = await client.xrevrange(key, count=1)
+                last_event_id = latest[0][0].decode() if latest else '0-0'
+            yield RedisStreamSubscription(client, key, last_event_id)
+        finally:
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_event_broker():
+    """Broker configuré, ou Redis si REDIS_URL est défini, sinon en mémoire"""
+    global _broker
+    if _broker is None:
+        path = getattr(settings, 'MESSAGE_EVENTS_BROKER', None)
+        if path:
+            _broker = import_string(path)()
+        elif getattr(settings, 'REDIS_URL', None):
+            _broker = RedisStreamBroker()
+        else:
+            _broker = InProcessBroker()
+    return _broker
+
+
+def unread_totals(user_ids):
+    from .models import ConversationParticipant
+
+    totals = ConversationParticipant.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+        total=Sum('unread_count')
+    )
+    return {row['user_id']: row['total'] or 0 for row in totals}
+
+
+def publish(user_id, event_type, data):
+    """Publier sans jamais faire échouer la requête qui publie"""
+    try:
+        get_event_broker().publish(user_id, event_type, data)
+    except Exception as e:
+        logger.warning("Publication de l'événement %s pour %s impossible: %s", event_type, user_id, e)
+
+
+def publish_message(conversation, message_data):
+    """
+    Nouveau message (``message_data`` : MessageSerializer) pour chaque
+    participant, avec ses non lus dans la conversation et au total. Publié
+    après validation de la transaction.
+    """
+    def send():
+        memberships = dict(conversation.memberships.values_list('user_id', 'unread_count'))
+        totals = unread_totals(memberships)
+        for user_id, unread_count in memberships.items():
+            publish(user_id, 'message', {
+                'conversation': conversation.pk,
+                'message': message_data,
+                'unread_count': unread_count,
+                'total_unread': totals.get(user_id, 0),
+            })
+
+    transaction.on_commit(send)
+
+
+def publish_read(conversation, user, unread_count):
+    """Non lus de ``user`` après lecture, pour ses autres appareils"""
+    def send():
+        publish(user.pk, 'unread', {
+            'conversation': conversation.pk,
+            'unread_count': unread_count,
+            'total_unread': unread_totals([user.pk]).get(user.pk, 0),
+        })
+
+    transaction.on_commit(send)
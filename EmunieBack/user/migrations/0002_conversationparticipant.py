@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_read_state(apps, schema_editor):
+    """
+    État de lecture initial d'après Message.is_read : non lus = messages des
+    autres participants non lus, dernier lu = dernier message lu ou envoyé.
+    """
+    ConversationParticipant = apps.get_model('user', 'ConversationParticipant')
+    Message = apps.get_model('user', 'Message')
+    conversation, user = models.OuterRef('conversation'), models.OuterRef('user')
+    unread = Message.objects.filter(conversation=conversation, is_read=False).exclude(sender=user)
+    read = Message.objects.filter(models.Q(is_read=True) | models.Q(sender=user), conversation=conversation)
+    ConversationParticipant.objects.update(
+        unread_count=Coalesce(
+            models.Subquery(unread.values('conversation').annotate(count=models.Count('pk')).values('count')), 0
+        ),
+        last_read_message=models.Subquery(read.order_by('-pk').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        # La table de liaison existante devient le modèle ConversationParticipant
+        # (mêmes table et colonnes) : changement d'état seulement
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='user.conversation')),
+                        ('user', models.ForeignKey(db_column='customuser_id', on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'user_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='user.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='user.message'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_read_state, migrations.RunPython.noop),
+    ]
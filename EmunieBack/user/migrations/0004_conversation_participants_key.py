@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:58
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+
+def backfill_participants_key(apps, schema_editor):
+    """
+    Clé des conversations existantes à exactement deux participants. Si une
+    paire a plusieurs conversations (doublons créés avant l'unicité), la plus
+    ancienne reçoit la clé et redevient celle que l'on retrouve ; les autres
+    restent consultables, sans clé.
+    """
+    Conversation = apps.get_model('user', 'Conversation')
+    ConversationParticipant = apps.get_model('user', 'ConversationParticipant')
+    memberships = ConversationParticipant.objects.order_by('conversation_id').values_list('conversation_id', 'user_id')
+
+    keyed, seen = [], set()
+    for conversation_id, rows in groupby(memberships.iterator(chunk_size=5000), key=lambda row: row[0]):
+        user_ids = sorted(user_id for _, user_id in rows)
+        if len(user_ids) != 2:
+            continue
+        key = '%s:%s' % tuple(user_ids)
+        if key not in seen:
+            seen.add(key)
+            keyed.append(Conversation(pk=conversation_id, participants_key=key))
+    Conversation.objects.bulk_update(keyed, ['participants_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participants_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_participants_key, migrations.RunPython.noop),
+    ]
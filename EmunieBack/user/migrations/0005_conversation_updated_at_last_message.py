@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:18
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_updated_at(apps, schema_editor):
+    """
+    Date des conversations existantes = date de leur dernier message, que
+    message_sent maintient désormais : la boîte de réception les trie ainsi
+    par activité.
+    """
+    Conversation = apps.get_model('user', 'Conversation')
+    Message = apps.get_model('user', 'Message')
+    last_at = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    Conversation.objects.filter(pk__in=Message.objects.values('conversation_id')).update(
+        updated_at=Subquery(last_at)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_conversation_participants_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
@@ -77,6 +78,9 @@ class CustomUser(AbstractUser):
 
     @property
     def average_rating(self):
+        annotated = getattr(self, 'rating_average', None)  # voir ConversationQuerySet.inbox
+        if annotated is not None:
+            return annotated
         ratings = self.received_ratings.all()
         if ratings:
             return ratings.aggregate(models.Avg('rating'))['rating__avg']
@@ -130,17 +134,134 @@ class UserRating(models.Model):
         return f"{self.rater.username} rated {self.rated_user.username}: {self.rating}/5"
 
 
+class ConversationQuerySet(models.QuerySet):
+    def inbox(self, user):
+        """
+        Conversations de ``user`` avec tout ce qu'affiche ConversationSerializer,
+        en un nombre de requêtes fixe quel que soit le nombre de fils :
+        - nombre de messages non lus (compteur de ConversationParticipant)
+          annoté (sous-requête corrélée) ;
+        - dernier message et son expéditeur préchargés en une requête
+          (prefetch découpé : ROW_NUMBER() par conversation) ;
+        - participants et leur note moyenne (sous-requête annotée) en une requête.
+        """
+        unread = ConversationParticipant.objects.filter(
+            conversation=models.OuterRef('pk'), user=user
+        ).values('unread_count')
+        rating = UserRating.objects.filter(rated_user=models.OuterRef('pk')).values('rated_user').annotate(
+            average=models.Avg('rating')
+        ).values('average')
+
+        return self.filter(participants=user).annotate(
+            unread_count=Coalesce(models.Subquery(unread), 0),
+        ).prefetch_related(
+            models.Prefetch(
+                'participants',
+                queryset=CustomUser.objects.annotate(
+                    rating_average=Coalesce(
+                        models.Subquery(rating), 0, output_field=models.FloatField()
+                    )
+                ),
+            ),
+            models.Prefetch(
+                'messages',
+                queryset=Message.objects.select_related('sender').order_by('-created_at', '-pk')[:1],
+                to_attr='latest_messages',
+            ),
+        )
+
+    def between(self, user, other):
+        """
+        Conversation à deux entre ``user`` et ``other``, créée au besoin ;
+        renvoie (conversation, created). Une lecture sur l'index unique de
+        participants_key ; deux créations simultanées se départagent sur ce
+        même index, la perdante relit la conversation de la gagnante.
+        """
+        key = Conversation.pair_key(user.pk, other.pk)
+        conversation = self.filter(participants_key=key).first()
+        if conversation is not None:
+            return conversation, False
+        try:
+            with transaction.atomic():
+                conversation = self.create(participants_key=key)
+                conversation.participants.add(user, other)
+        except IntegrityError:
+            # Relue hors transaction : visible une fois la création concurrente validée
+            return self.get(participants_key=key), False
+        return conversation, True
+
+
 class Conversation(models.Model):
     """Conversations entre utilisateurs"""
-    participants = models.ManyToManyField(CustomUser, related_name='conversations')
+    participants = models.ManyToManyField(
+        CustomUser, related_name='conversations', through='ConversationParticipant'
+    )
+    # Paire de participants (identifiants triés) d'une conversation à deux,
+    # unique : une seule conversation par paire (voir ConversationQuerySet.between)
+    participants_key = models.CharField(max_length=41, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConversationQuerySet.as_manager()
+
     def __str__(self):
         return f"Conversation {self.id}"
 
+    @staticmethod
+    def pair_key(first_id, second_id):
+        return '%s:%s' % tuple(sorted((first_id, second_id)))
+
+    def message_sent(self, message):
+        """
+        Mettre à jour l'état de lecture après l'envoi de ``message`` : un non lu
+        de plus pour les autres participants, l'expéditeur a tout lu jusqu'à
+        son propre message. La conversation prend la date du message
+        (updated_at) : la boîte de réception la remonte en tête.
+
+        À appeler dans la transaction qui insère le message : un mark_read
+        concurrent voit alors le message et son compteur ensemble, ou aucun
+        des deux. Un seul UPDATE, qui verrouille les participations toujours
+        dans le même ordre (pas d'interblocage entre deux envois).
+        """
+        is_sender = models.Q(user_id=message.sender_id)
+        self.memberships.update(
+            unread_count=models.Case(
+                models.When(is_sender, then=0), default=models.F('unread_count') + 1,
+            ),
+            last_read_message=models.Case(
+                models.When(is_sender, then=models.Value(message.pk)), default=models.F('last_read_message'),
+                output_field=models.BigIntegerField(),
+            ),
+        )
+        Conversation.objects.filter(pk=self.pk).update(updated_at=message.created_at)
+        self.updated_at = message.created_at
+
+    def mark_read(self, user, up_to=None):
+        """
+        Marquer comme lus les messages reçus par ``user`` jusqu'à ``up_to``
+        (dernier message par défaut) ; renvoie le nombre de non lus restants.
+        Le dernier message est déterminé une fois la participation verrouillée,
+        et les non lus recomptés au-delà de cet identifiant précis.
+        """
+        messages = self.messages.all()
+        received = messages.exclude(sender=user)
+        with transaction.atomic():
+            membership = self.memberships.select_for_update().get(user=user)
+            up_to_id = up_to.pk if up_to is not None else messages.order_by('-pk').values_list('pk', flat=True).first()
+            if up_to_id is None:
+                return membership.unread_count  # aucun message
+            if membership.last_read_message_id and membership.last_read_message_id >= up_to_id:
+                return membership.unread_count  # déjà lu plus loin
+            received.filter(pk__lte=up_to_id, is_read=False).update(is_read=True)
+            membership.last_read_message_id = up_to_id
+            membership.unread_count = received.filter(pk__gt=up_to_id).count()
+            membership.save(update_fields=['last_read_message', 'unread_count'])
+        return membership.unread_count
+
     @property
     def last_message(self):
+        if hasattr(self, 'latest_messages'):  # préchargé par inbox()
+            return self.latest_messages[0] if self.latest_messages else None
         return self.messages.order_by('-created_at').first()
 
 
@@ -155,11 +276,42 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Historique par curseurs (user.pagination) : conversation puis (created_at, id)
+            models.Index(fields=['conversation', 'created_at', 'id'], name='message_history_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.created_at}"
 
 
+
+class ConversationParticipant(models.Model):
+    """
+    Participation à une conversation et état de lecture propre à chaque
+    participant : dernier message lu et nombre de non lus maintenu à l'envoi
+    (Conversation.message_sent) et à la lecture (Conversation.mark_read), pour
+    des badges de non lus sans parcourir les messages.
+
+    Reprend la table de liaison créée automatiquement pour
+    Conversation.participants (mêmes table et colonnes).
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='conversation_memberships', db_column='customuser_id'
+    )
+    last_read_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'user_conversation_participants'
+        unique_together = ('conversation', 'user')
+
+    def __str__(self):
+        return f"{self.user} dans {self.conversation}"
+
 class EmailVerification(models.Model):
     """Vérification d'email"""
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -0,0 +1,71 @@
+"""
+Historique des messages d'une conversation par curseurs sur (created_at, id).
+
+- sans paramètre : les messages les plus récents ;
+- ``before=<curseur>`` : messages plus anciens que le curseur (remontée de
+  l'historique, lien ``next``) ;
+- ``after=<curseur>`` : messages plus récents que le curseur (interrogation
+  périodique, lien ``poll``).
+
+Les résultats sont toujours du plus récent au plus ancien. Un appel ``after``
+renvoie au plus ``page_size`` nouveaux messages, les plus anciens d'abord
+servis : tant qu'une page est pleine, le lien ``poll`` en renvoie la suite.
+"""
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from produit.pagination import KeysetPagination
+
+
+class MessageHistoryPagination(KeysetPagination):
+    ordering = ('-created_at', '-pk')
+    newer_ordering = ('created_at', 'pk')
+    page_size = 30
+    cursor_query_param = 'before'
+    after_query_param = 'after'
+    cursor_salt = 'user.pagination.messages'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        raw_after = request.query_params.get(self.after_query_param)
+        if not raw_after:
+            rows = super().paginate_queryset(queryset, request, view)
+            self.poll_position = self.get_position(rows[0]) if rows else None
+            return rows
+
+        self.page_size = self.get_page_size(request)
+        self.total = None
+        position = self.load_cursor(raw_after)
+        rows = list(
+            queryset.order_by(*self.newer_ordering)
+            .filter(self.build_position_filter(queryset.model, position, self.newer_ordering))[:self.page_size]
+        )
+        rows.reverse()
+        self.next_position = None
+        # Sans nouveau message, le client garde le même curseur
+        self.poll_position = self.get_position(rows[0]) if rows else position
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'poll': self.get_poll_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri', 'description': 'Messages plus anciens'},
+                'poll': {'type': 'string', 'nullable': True, 'format': 'uri', 'description': 'Nouveaux messages'},
+                'results': schema,
+            },
+        }
+
+    def get_poll_link(self):
+        if self.poll_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return replace_query_param(url, self.after_query_param, self.encode_cursor(self.poll_position))
+
+    def get_next_link(self):
+        url = super().get_next_link()
+        return remove_query_param(url, self.after_query_param) if url else None
@@ -110,6 +110,9 @@ class ConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at')
 
     def get_unread_count(self, obj):
+        annotated = getattr(obj, 'unread_count', None)  # Conversation.objects.inbox()
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
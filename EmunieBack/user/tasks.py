@@ -0,0 +1,97 @@
+from django.conf import settings
+
+from jobs.registry import task
+from jobs.tasks import send_email
+
+
+@task('user.send_password_reset_email', max_attempts=5)
+def send_password_reset_email(user_id, token_id):
+    """
+    Envoyer le lien de réinitialisation du jeton ``token_id``, reconstruit
+    ici : ni le jeton ni le lien ne sont stockés dans la tâche. Rien n'est
+    envoyé si le jeton a été utilisé, remplacé ou a expiré entre-temps.
+    """
+    from .models import PasswordResetToken
+
+    reset_token = PasswordResetToken.objects.select_related('user').filter(pk=token_id, user_id=user_id).first()
+    if reset_token is None or not reset_token.is_valid:
+        return
+    user = reset_token.user
+
+    # Construire l'URL de réinitialisation
+    frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:4200')
+    reset_url = f"{frontend_url}/reset-password?token={reset_token.token}"
+
+    subject = "Réinitialisation de votre mot de passe - Emunie Market"
+    message = f"""
+Bonjour {user.first_name or user.username},
+
+Vous avez demandé la réinitialisation de votre mot de passe sur Emunie Market.
+
+Cliquez sur le lien ci-dessous pour réinitialiser votre mot de passe :
+{reset_url}
+
+Ce lien est valide pendant 24 heures.
+
+Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email.
+
+Cordialement,
+L'équipe Emunie Market
+"""
+
+    html_message = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #f97316 0%, #fb923c 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
+        .button {{ display: inline-block; background: #f97316; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold; margin: 20px 0; }}
+        .button:hover {{ background: #ea580c; }}
+        .footer {{ text-align: center; margin-top: 20px; color: #6b7280; font-size: 14px; }}
+        .warning {{ background: #fef3c7; border-left: 4px solid #f59e0b; padding: 15px; margin: 20px 0; border-radius: 4px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🔐 Réinitialisation de mot de passe</h1>
+        </div>
+        <div class="content">
+            <p>Bonjour <strong>{user.first_name or user.username}</strong>,</p>
+
+            <p>Vous avez demandé la réinitialisation de votre mot de passe sur <strong>Emunie Market</strong>.</p>
+
+            <p style="text-align: center;">
+                <a href="{reset_url}" class="button">Réinitialiser mon mot de passe</a>
+            </p>
+
+            <p>Ou copiez ce lien dans votre navigateur :</p>
+            <p style="background: white; padding: 10px; border-radius: 4px; word-break: break-all;">
+                {reset_url}
+            </p>
+
+            <div class="warning">
+                <strong>⏱️ Important :</strong> Ce lien est valide pendant <strong>24 heures</strong>.
+            </div>
+
+            <p>Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email. Votre mot de passe restera inchangé.</p>
+
+            <div class="footer">
+                <p>Cordialement,<br>L'équipe <strong>Emunie Market</strong></p>
+                <p style="font-size: 12px; color: #9ca3af;">Cet email a été envoyé automatiquement, merci de ne pas y répondre.</p>
+            </div>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+    send_email(
+        subject=subject,
+        message=message,
+        recipient_list=[user.email],
+        html_message=html_message,
+    )
@@ -1,3 +1,467 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import event_views, events
+from .models import Conversation, Message, UserRating
+
+User = get_user_model()
+
+
+def send(conversation, sender, content):
+    message = Message.objects.create(conversation=conversation, sender=sender, content=content)
+    conversation.message_sent(message)
+    return message
+
+
+class InboxTests(TestCase):
+    """Boîte de réception : nombre de requêtes indépendant du nombre de conversations"""
+    url = '/api/user/conversations/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='acheteur', password='x')
+        self.client.force_authenticate(self.user)
+
+    def add_conversations(self, count):
+        for i in range(count):
+            other = User.objects.create_user(username=f'vendeur{Conversation.objects.count()}', password='x')
+            UserRating.objects.create(rater=self.user, rated_user=other, rating=4)
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user, other)
+            send(conversation, self.user, 'Bonjour')
+            send(conversation, other, f'Réponse {i}')
+            send(conversation, other, f'Dernier {i}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_nombre_de_requetes_constant(self):
+        self.add_conversations(2)
+        few, _ = self.count_queries()
+        self.add_conversations(8)
+        many, results = self.count_queries()
+        self.assertEqual(len(results), 10)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 4)  # COUNT, conversations, participants, derniers messages
+
+    def test_contenu_de_la_boite(self):
+        self.add_conversations(1)
+        conversation = Conversation.objects.get()
+        conversation.mark_read(self.user, Message.objects.get(content='Réponse 0'))
+
+        _, results = self.count_queries()
+        entry = results[0]
+        self.assertEqual(entry['unread_count'], 1)  # ses propres messages ne comptent pas
+        self.assertEqual(entry['last_message']['content'], 'Dernier 0')
+        self.assertEqual(entry['last_message']['sender_name'], 'vendeur0')
+        ratings = {participant['username']: participant['average_rating'] for participant in entry['participants']}
+        self.assertEqual(ratings, {'acheteur': 0, 'vendeur0': 4})
+
+        # Le détail s'appuie sur la même requête
+        response = self.client.get(f'{self.url}{conversation.pk}/')
+        self.assertEqual(response.data['unread_count'], 1)
+
+    def test_conversation_active_en_tete(self):
+        self.add_conversations(2)
+        first = Conversation.objects.order_by('pk').first()
+        send(first, self.user, 'Relance')
+
+        _, results = self.count_queries()
+        self.assertEqual(results[0]['id'], first.pk)
+        self.assertEqual(results[0]['last_message']['content'], 'Relance')
+
+    def test_conversation_sans_message(self):
+        other = User.objects.create_user(username='muet', password='x')
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.user, other)
+
+        _, results = self.count_queries()
+        self.assertIsNone(results[0]['last_message'])
+        self.assertEqual(results[0]['unread_count'], 0)
+
+
+class ReadStateTests(TestCase):
+    """Non lus par participant, maintenus à l'envoi et à la lecture"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='acheteur', password='x')
+        self.seller = User.objects.create_user(username='vendeur', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.buyer, self.seller)
+
+    def membership(self, user):
+        return self.conversation.memberships.get(user=user)
+
+    def test_envoi_via_l_api(self):
+        self.client.force_authenticate(self.seller)
+        url = f'/api/user/conversations/{self.conversation.pk}/messages/'
+        for content in ('Bonjour', 'Toujours disponible'):
+            self.assertEqual(self.client.post(url, {'content': content}).status_code, 201)
+
+        self.assertEqual(self.membership(self.buyer).unread_count, 2)
+        seller = self.membership(self.seller)
+        self.assertEqual(seller.unread_count, 0)
+        self.assertEqual(seller.last_read_message, Message.objects.order_by('-pk').first())
+
+    def test_message_et_compteurs_dans_la_meme_transaction(self):
+        self.client.force_authenticate(self.seller)
+        url = f'/api/user/conversations/{self.conversation.pk}/messages/'
+        with mock.patch.object(Conversation, 'message_sent', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(url, {'content': 'Bonjour'})
+        # Pas de message sans son compteur de non lus
+        self.assertFalse(Message.objects.exists())
+
+        with self.assertNumQueries(1):
+            message = Message.objects.create(conversation=self.conversation, sender=self.seller, content='Un')
+        with self.assertNumQueries(2):  # participations, date de la conversation
+            self.conversation.message_sent(message)
+        self.assertEqual(self.membership(self.buyer).unread_count, 1)
+        self.assertEqual(self.membership(self.seller).last_read_message, message)
+
+    def test_marquer_comme_lu(self):
+        first = send(self.conversation, self.seller, 'Un')
+        send(self.conversation, self.seller, 'Deux')
+        send(self.conversation, self.seller, 'Trois')
+        self.client.force_authenticate(self.buyer)
+        url = f'/api/user/conversations/{self.conversation.pk}/read/'
+
+        response = self.client.post(url, {'message_id': first.pk})
+        self.assertEqual(response.data, {'unread_count': 2})
+        self.assertEqual(self.client.get('/api/user/profile/stats/').data['unread_messages'], 2)
+
+        response = self.client.post(url)
+        self.assertEqual(response.data, {'unread_count': 0})
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+        self.assertEqual(self.client.get('/api/user/profile/stats/').data['unread_messages'], 0)
+
+        # Relire un message plus ancien ne fait pas reculer l'état de lecture
+        self.assertEqual(self.client.post(url, {'message_id': first.pk}).data, {'unread_count': 0})
+
+    def test_conversation_d_un_autre_utilisateur(self):
+        intruder = User.objects.create_user(username='intrus', password='x')
+        self.client.force_authenticate(intruder)
+        response = self.client.post(f'/api/user/conversations/{self.conversation.pk}/read/')
+        self.assertEqual(response.status_code, 404)
+
+
+class MessageHistoryTests(TestCase):
+    """Historique par curseurs before/after et interrogation conditionnelle"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='acheteur', password='x')
+        self.seller = User.objects.create_user(username='vendeur', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.buyer, self.seller)
+        self.client.force_authenticate(self.buyer)
+        self.url = f'/api/user/conversations/{self.conversation.pk}/messages/'
+
+    def contents(self, response):
+        return [message['content'] for message in response.data['results']]
+
+    def test_remontee_et_interrogation(self):
+        for i in range(5):
+            send(self.conversation, self.seller, f'm{i}')
+
+        first = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(self.contents(first), ['m4', 'm3'])
+        older = self.client.get(first.data['next'])
+        self.assertEqual(self.contents(older), ['m2', 'm1'])
+        self.assertEqual(self.contents(self.client.get(older.data['next'])), ['m0'])
+
+        # Rien de nouveau : même curseur de poll
+        idle = self.client.get(first.data['poll'])
+        self.assertEqual(self.contents(idle), [])
+        self.assertEqual(idle.data['poll'], first.data['poll'])
+
+        send(self.conversation, self.seller, 'm5')
+        send(self.conversation, self.seller, 'm6')
+        send(self.conversation, self.seller, 'm7')
+        fresh = self.client.get(first.data['poll'])
+        self.assertEqual(self.contents(fresh), ['m6', 'm5'])  # les plus anciens d'abord servis
+        self.assertEqual(self.contents(self.client.get(fresh.data['poll'])), ['m7'])
+
+    def test_304_sans_nouveaute(self):
+        send(self.conversation, self.seller, 'Bonjour')
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 2)
+
+        # Nouveau message ou changement de l'état de lecture : nouvel ETag
+        send(self.conversation, self.seller, 'Toujours là ?')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.conversation.mark_read(self.buyer)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_par_participant(self):
+        first = send(self.conversation, self.seller, 'Bonjour')
+        second = send(self.conversation, self.buyer, 'Oui ?')
+        memberships = self.conversation.memberships
+        memberships.filter(user=self.buyer).update(last_read_message=first)
+        memberships.filter(user=self.seller).update(last_read_message=second)
+        etag = self.client.get(self.url)['ETag']
+
+        # États de lecture échangés : même somme, mais pas le même état
+        memberships.filter(user=self.buyer).update(last_read_message=second)
+        memberships.filter(user=self.seller).update(last_read_message=first)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_curseur_invalide(self):
+        self.assertEqual(self.client.get(self.url, {'after': 'falsifie'}).status_code, 404)
+
+
+class InProcessBrokerTests(TestCase):
+    """Broker en mémoire : diffusion aux abonnés et reprise après Last-Event-ID"""
+
+    async def test_diffusion_et_reprise(self):
+        broker = events.InProcessBroker()
+        async with broker.subscribe(1) as subscription, broker.subscribe(2) as other:
+            first = broker.publish(1, 'message', {'n': 1})
+            broker.publish(1, 'message', {'n': 2})
+            self.assertEqual([event.data for event in await subscription.get(1)], [{'n': 1}, {'n': 2}])
+            self.assertEqual(await other.get(0.01), [])
+        self.assertEqual(broker._subscriptions, {})
+
+        async with broker.subscribe(1, first.id) as subscription:
+            self.assertEqual([event.data for event in await subscription.get(1)], [{'n': 2}])
+        # Identifiant d'un processus précédent : rien à rejouer
+        async with broker.subscribe(1, 'ancien-12') as subscription:
+            self.assertEqual(await subscription.get(0.01), [])
+
+
+class FakeRedis:
+    """Flux Redis en mémoire (XADD, XREVRANGE, XREAD) : RedisStreamBroker sans serveur"""
+
+    def __init__(self):
+        self.streams = {}
+        self.blocks = []
+        self.sequence = 0
+
+    def pipeline(self):
+        redis, results = self, []
+
+        class Pipeline:
+            def xadd(self, *args, **kwargs):
+                results.append(redis.xadd(*args, **kwargs))
+
+            def expire(self, key, ttl):
+                results.append(True)
+
+            def execute(self):
+                return results
+
+        return Pipeline()
+
+    def xadd(self, key, fields, maxlen, approximate=True):
+        self.sequence += 1
+        entry_id = f'{self.sequence}-0'.encode()
+        stream = self.streams.setdefault(key, [])
+        stream.append((entry_id, {name.encode(): value.encode() for name, value in fields.items()}))
+        del stream[:-maxlen]
+        return entry_id
+
+    async def xrevrange(self, key, count):
+        return self.streams.get(key, [])[::-1][:count]
+
+    async def xread(self, streams, count, block):
+        self.blocks.append(block)
+        (key, last_id), = streams.items()
+        after = int(last_id.split('-')[0])
+        entries = [entry for entry in self.streams.get(key, []) if int(entry[0].split(b'-')[0]) > after]
+        return [(key.encode(), entries[:count])] if entries else []
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedisBroker(events.RedisStreamBroker):
+    def connect(self):
+        return FakeRedis()
+
+    def connect_async(self):
+        return self.client
+
+
+class RedisStreamBrokerTests(TestCase):
+    """Broker Redis : flux par utilisateur, reprise et attente bornée"""
+
+    async def test_publication_et_reprise(self):
+        broker = FakeRedisBroker(url='redis://test')
+        first = broker.publish(1, 'message', {'n': 1})
+        broker.publish(1, 'message', {'n': 2})
+        broker.publish(2, 'message', {'n': 3})
+
+        async with broker.subscribe(1, first.id) as subscription:
+            received = await subscription.get(1)
+            self.assertEqual([(event.type, event.data) for event in received], [('message', {'n': 2})])
+            self.assertEqual(subscription.last_id, received[-1].id)
+            self.assertEqual(await subscription.get(1), [])
+
+        # Sans Last-Event-ID : à partir du dernier événement existant
+        async with broker.subscribe(1) as subscription:
+            self.assertEqual(await subscription.get(1), [])
+
+    async def test_attente_jamais_infinie(self):
+        broker = FakeRedisBroker(url='redis://test')
+        async with broker.subscribe(1) as subscription:
+            await subscription.get(0.0004)
+            await subscription.get(0)
+        self.assertEqual(broker.client.blocks, [1, 1])  # BLOCK 0 attendrait indéfiniment
+
+    def test_historique_borne(self):
+        broker = FakeRedisBroker(url='redis://test')
+        for n in range(broker.history_size + 5):
+            broker.publish(1, 'message', {'n': n})
+        self.assertEqual(len(broker.client.streams[broker.key(1)]), broker.history_size)
+
+
+class MessageEventTests(TestCase):
+    """Événements poussés à l'envoi et à la lecture, via long-poll et SSE"""
+
+    def setUp(self):
+        self.broker = events.InProcessBroker()
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buyer = User.objects.create_user(username='acheteur', password='x')
+        self.seller = User.objects.create_user(username='vendeur', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.buyer, self.seller)
+        self.token = str(AccessToken.for_user(self.buyer))
+        self.start = f'{self.broker.boot}-0'
+
+    def send_via_api(self, content):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/user/conversations/{self.conversation.pk}/messages/', {'content': content})
+        self.assertEqual(response.status_code, 201)
+
+    async def async_send(self, content):
+        await sync_to_async(self.send_via_api)(content)
+
+    async def test_long_poll(self):
+        await self.async_send('Bonjour')
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {self.token}'}
+        response = await client.get('/api/user/events/poll/', {'since': self.start, 'timeout': 1}, headers=headers)
+        payload = response.json()
+        event = payload['events'][0]
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['data']['message']['content'], 'Bonjour')
+        self.assertEqual((event['data']['unread_count'], event['data']['total_unread']), (1, 1))
+        self.assertEqual(payload['last_event_id'], event['id'])
+
+        # Rien de nouveau : réponse vide après le délai, même position
+        response = await client.get('/api/user/events/poll/', {'since': event['id'], 'timeout': 0.1}, headers=headers)
+        self.assertEqual(response.json(), {'events': [], 'last_event_id': event['id']})
+
+    def issue_ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        return client.post('/api/user/events/ticket/').data['ticket']
+
+    async def test_flux_sse(self):
+        await self.async_send('Bonjour')
+        ticket = await sync_to_async(self.issue_ticket)()
+        response = await AsyncClient().get('/api/user/events/', {'ticket': ticket, 'last_event_id': self.start})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        chunk = (await anext(chunks)).decode()
+        self.assertIn('event: message', chunk)
+        data = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual(data['conversation'], self.conversation.pk)
+
+        # Ticket à usage unique : une seconde ouverture est refusée
+        response = await AsyncClient().get('/api/user/events/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_fin_du_flux(self):
+        stream = event_views.stream_events(self.buyer.pk, None, duration=0.05)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        self.assertEqual(await anext(stream), ': ping\n\n')
+        self.assertEqual(len(self.broker._subscriptions), 1)
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(self.broker._subscriptions, {})
+
+    def test_lecture_publiee(self):
+        send(self.conversation, self.seller, 'Un')
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/user/conversations/{self.conversation.pk}/read/')
+        event = self.broker._history[self.buyer.pk][-1]
+        self.assertEqual(event.type, 'unread')
+        self.assertEqual(event.data, {'conversation': self.conversation.pk, 'unread_count': 0, 'total_unread': 0})
+
+    async def test_authentification_requise(self):
+        self.assertEqual((await self.async_client.get('/api/user/events/poll/')).status_code, 401)
+        response = await self.async_client.get('/api/user/events/poll/', {'ticket': 'invalide'})
+        self.assertEqual(response.status_code, 401)
+        # Le jeton JWT n'est plus accepté dans l'URL
+        response = await self.async_client.get('/api/user/events/poll/', {'token': self.token})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refuse_sous_wsgi(self):
+        # Un worker gunicorn ne doit pas rester bloqué sur une connexion longue
+        self.client.force_login(self.buyer)
+        self.assertEqual(self.client.get('/api/user/events/poll/').status_code, 501)
+        self.assertEqual(self.client.get('/api/user/events/').status_code, 501)
+
+
+class StartConversationTests(TestCase):
+    """Une seule conversation par paire, retrouvée par participants_key"""
+    url = '/api/user/conversations/start/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='acheteur', password='x')
+        self.seller = User.objects.create_user(username='vendeur', password='x')
+
+    def start(self, user, recipient):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url, {'recipient_id': recipient.pk})
+
+    def test_meme_conversation_dans_les_deux_sens(self):
+        first = self.start(self.buyer, self.seller)
+        again = self.start(self.buyer, self.seller)
+        reverse = self.start(self.seller, self.buyer)
+        self.assertEqual({first.data['id'], again.data['id'], reverse.data['id']}, {first.data['id']})
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.participants_key, Conversation.pair_key(self.seller.pk, self.buyer.pk))
+        self.assertEqual(set(conversation.participants.all()), {self.buyer, self.seller})
+
+    def test_creation_concurrente(self):
+        existing, _ = Conversation.objects.between(self.seller, self.buyer)
+        # L'autre requête a créé la conversation juste après notre lecture
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            conversation, created = Conversation.objects.between(self.buyer, self.seller)
+        self.assertEqual((conversation, created), (existing, False))
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_avec_soi_meme(self):
+        self.assertEqual(self.start(self.buyer, self.buyer).status_code, 400)
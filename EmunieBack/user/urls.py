@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views, password_reset_views
+from . import views, password_reset_views, event_views
 
 app_name = 'user'
 
@@ -28,6 +28,10 @@ urlpatterns = [
     path('conversations/start/', views.StartConversationView.as_view(), name='start_conversation'),
     path('conversations/<int:pk>/', views.ConversationDetailView.as_view(), name='conversation_detail'),
     path('conversations/<int:conversation_id>/messages/', views.MessageListCreateView.as_view(), name='conversation_messages'),
+    path('conversations/<int:pk>/read/', views.ConversationMarkReadView.as_view(), name='conversation_mark_read'),
+    path('events/', event_views.event_stream, name='event_stream'),
+    path('events/poll/', event_views.poll_events, name='event_poll'),
+    path('events/ticket/', event_views.EventTicketView.as_view(), name='event_ticket'),
 
 
     path('password/reset/request/', password_reset_views.request_password_reset, name='password_reset_request'),
@@ -1,13 +1,20 @@
+import hashlib
+
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
 
-from produit import models
+from EmunieBack.response_cache import etag_matches
+from . import events
 from .models import UserRating, Conversation, Message
+from .pagination import MessageHistoryPagination
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer, UserListSerializer,
     UserRatingSerializer, ConversationSerializer, MessageSerializer,
@@ -77,9 +84,7 @@ class ConversationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Conversation.objects.filter(
-            participants=self.request.user
-        ).order_by('-updated_at')
+        return Conversation.objects.inbox(self.request.user).order_by('-updated_at')
 
 class ConversationDetailView(generics.RetrieveAPIView):
     """Détail d'une conversation"""
@@ -87,28 +92,82 @@ class ConversationDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Conversation.objects.filter(participants=self.request.user)
+        return Conversation.objects.inbox(self.request.user)
 
 class MessageListCreateView(generics.ListCreateAPIView):
-    """Messages d'une conversation"""
+    """
+    Messages d'une conversation, par curseurs before/after (voir
+    user.pagination). La liste porte un ETag dérivé du dernier message et de
+    l'état de lecture des participants : une interrogation sans nouveauté
+    (If-None-Match) reçoit un 304 après deux requêtes courtes, sans
+    sérialisation.
+    """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+    pagination_class = MessageHistoryPagination
+
+    def get_conversation(self):
+        if not hasattr(self, '_conversation'):
+            latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+            self._conversation = get_object_or_404(
+                Conversation.objects.filter(participants=self.request.user).annotate(
+                    latest_message_id=Subquery(latest)
+                ),
+                id=self.kwargs.get('conversation_id'),
+            )
+        return self._conversation
+
     def get_queryset(self):
-        conversation_id = self.kwargs.get('conversation_id')
-        conversation = get_object_or_404(
-            Conversation.objects.filter(participants=self.request.user),
-            id=conversation_id
+        return Message.objects.filter(conversation=self.get_conversation()).select_related('sender')
+
+    def get_etag(self):
+        conversation = self.get_conversation()
+        # Dernier message lu de chaque participant, et non une somme : deux
+        # états de lecture différents ne doivent jamais donner le même ETag
+        read_state = list(
+            conversation.memberships.order_by('user_id').values_list('user_id', 'last_read_message_id')
         )
-        return Message.objects.filter(conversation=conversation)
-    
-    def perform_create(self, serializer):
-        conversation_id = self.kwargs.get('conversation_id')
-        conversation = get_object_or_404(
-            Conversation.objects.filter(participants=self.request.user),
-            id=conversation_id
+        state = (
+            f'{conversation.pk}:{conversation.latest_message_id}:{read_state}:'
+            f'{self.request.get_full_path()}'
         )
-        serializer.save(sender=self.request.user, conversation=conversation)
+        return '"%s"' % hashlib.sha1(state.encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def perform_create(self, serializer):
+        conversation = self.get_conversation()
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user, conversation=conversation)
+            conversation.message_sent(message)
+        events.publish_message(conversation, serializer.data)
+
+class ConversationMarkReadView(APIView):
+    """
+    Marquer une conversation comme lue, jusqu'au message ``message_id`` s'il
+    est fourni (sinon jusqu'au dernier message)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        conversation = get_object_or_404(Conversation.objects.filter(participants=request.user), pk=pk)
+        up_to = None
+        message_id = request.data.get('message_id')
+        if message_id:
+            up_to = conversation.messages.filter(pk=message_id).first()
+            if up_to is None:
+                return Response({'error': 'Message introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        unread_count = conversation.mark_read(request.user, up_to)
+        events.publish_read(conversation, request.user, unread_count)
+        return Response({'unread_count': unread_count})
 
 class StartConversationView(APIView):
     """Démarrer une conversation avec un utilisateur"""
@@ -120,15 +179,12 @@ class StartConversationView(APIView):
             return Response({'error': 'recipient_id requis'}, status=status.HTTP_400_BAD_REQUEST)
         
         recipient = get_object_or_404(User, id=recipient_id)
-        
-        # Vérifier si une conversation existe déjà
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(participants=recipient).first()
-        
-        if not conversation:
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, recipient)
+        if recipient.pk == request.user.pk:
+            return Response({'error': 'Impossible de démarrer une conversation avec soi-même'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Conversation existante de la paire, ou nouvelle (sans doublon concurrent)
+        conversation, _ = Conversation.objects.between(request.user, recipient)
         
         serializer = ConversationSerializer(conversation, context={'request': request})
         return Response(serializer.data)
@@ -206,14 +262,13 @@ def user_stats(request):
         'active_ads': user.ads.filter(status='active').count(),
         'total_views': user.total_views,
         'total_favorites': user.ads.aggregate(
-            total=models.Sum('favorites_count')
+            total=Sum('favorites_count')
         )['total'] or 0,
         'average_rating': user.average_rating,
         'total_ratings': user.received_ratings.count(),
-        'unread_messages': Message.objects.filter(
-            conversation__participants=user,
-            is_read=False
-        ).exclude(sender=user).count(),
+        'unread_messages': user.conversation_memberships.aggregate(
+            total=Sum('unread_count')
+        )['total'] or 0,
     }
     return Response(stats)
 